@@ -0,0 +1,298 @@
+"""Workspace-wide admission control for agent runs.
+
+The Telegram bot, Slack bot and scheduler are separate processes that all
+spawn ``claude``. They share a counting semaphore made of slot lock files
+under data/admission/: a run holds an exclusive ``flock`` on one slot file
+for as long as it runs, and the kernel releases it even if the process
+dies. Runs that find no free slot wait in a bounded queue (queue.json)
+ordered by priority class, then by arrival; only the head of the queue may
+take a freed slot, so interactive messages overtake queued cron jobs.
+
+Usage:
+  python admission.py status [--workspace PATH]
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import load_workspace_env, resolve_workspace
+from core_tools._utils import atomic_write_json, file_lock, iso_now, load_json
+from telemetry import append_record, metrics_enabled
+
+
+PRIORITIES = {"interactive": 0, "scheduled": 1}
+SCHEDULED_CALLERS = ("scheduler",)
+POLL_INTERVAL_S = 0.2
+
+
+class AdmissionError(RuntimeError):
+    """The wait queue is full or the wait timed out."""
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return default
+
+
+def priority_for(caller: Optional[str]) -> str:
+    return "scheduled" if caller in SCHEDULED_CALLERS else "interactive"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Ticket:
+    """A held slot; ``release`` frees it for the next waiter."""
+
+    def __init__(self, fd: Optional[int], slot: Optional[int], wait_ms: int, queue_depth: int) -> None:
+        self._fd = fd
+        self.slot = slot
+        self.wait_ms = wait_ms
+        self.queue_depth = queue_depth
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        workspace: Path,
+        max_concurrent: Optional[int] = None,
+        queue_max: Optional[int] = None,
+        timeout_s: Optional[int] = None,
+    ) -> None:
+        self.workspace = workspace
+        self.max_concurrent = (
+            max_concurrent if max_concurrent is not None else _env_int("AIDE_AGENT_MAX_CONCURRENT", 3)
+        )
+        self.queue_max = queue_max if queue_max is not None else _env_int("AIDE_AGENT_QUEUE_MAX", 20)
+        self.timeout_s = timeout_s if timeout_s is not None else _env_int("AIDE_AGENT_QUEUE_TIMEOUT_S", 600)
+        self.dir = workspace / "data" / "admission"
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    @property
+    def _queue_path(self) -> Path:
+        return self.dir / "queue.json"
+
+    @property
+    def _queue_lock(self) -> Path:
+        # Separate from queue.json: atomic_write_json swaps that file's inode
+        return self.dir / "queue.lock"
+
+    def _slot_path(self, slot: int) -> Path:
+        return self.dir / f"slot-{slot}.lock"
+
+    # --- slots ---
+
+    def _try_slot(self) -> Tuple[Optional[int], Optional[int]]:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for slot in range(self.max_concurrent):
+            fd = os.open(self._slot_path(slot), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd, slot
+        return None, None
+
+    def _running(self) -> int:
+        running = 0
+        for slot in range(self.max_concurrent):
+            path = self._slot_path(slot)
+            if not path.exists():
+                continue
+            fd = os.open(path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except BlockingIOError:
+                running += 1
+            finally:
+                os.close(fd)
+        return running
+
+    # --- queue (callers hold the queue lock) ---
+
+    def _load_queue(self) -> List[Dict[str, Any]]:
+        waiters = load_json(self._queue_path, [])
+        return [w for w in waiters if isinstance(w, dict) and _pid_alive(int(w.get("pid", 0)))]
+
+    @staticmethod
+    def _order(waiters: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return sorted(waiters, key=lambda w: (PRIORITIES.get(w.get("priority"), 0), w.get("enqueued", 0)))
+
+    def _enter(self, priority: str, caller: Optional[str]) -> Tuple[Optional[Ticket], Optional[str], int]:
+        """Take a slot straight away if nobody waits, otherwise join the queue."""
+        with file_lock(self._queue_lock):
+            waiters = self._load_queue()
+            if not waiters:
+                fd, slot = self._try_slot()
+                if fd is not None:
+                    return Ticket(fd, slot, 0, 0), None, 0
+            if len(waiters) >= self.queue_max:
+                raise AdmissionError(f"Too many agent runs waiting ({len(waiters)}), try again later.")
+            waiter_id = uuid.uuid4().hex
+            waiters.append(
+                {
+                    "id": waiter_id,
+                    "pid": os.getpid(),
+                    "priority": priority,
+                    "caller": caller,
+                    "enqueued": time.time(),
+                    "since": iso_now(),
+                }
+            )
+            atomic_write_json(self._queue_path, waiters)
+            return None, waiter_id, len(waiters)
+
+    def _try_admit(self, waiter_id: str, started: float, depth: int) -> Optional[Ticket]:
+        with file_lock(self._queue_lock):
+            waiters = self._order(self._load_queue())
+            if not waiters or waiters[0]["id"] != waiter_id:
+                return None
+            fd, slot = self._try_slot()
+            if fd is None:
+                return None
+            atomic_write_json(self._queue_path, waiters[1:])
+        return Ticket(fd, slot, int((time.monotonic() - started) * 1000), depth)
+
+    def _leave(self, waiter_id: str) -> None:
+        with file_lock(self._queue_lock):
+            waiters = [w for w in self._load_queue() if w["id"] != waiter_id]
+            atomic_write_json(self._queue_path, waiters)
+
+    def _record(self, caller: Optional[str], priority: str, outcome: str, wait_ms: int, depth: int) -> None:
+        if not metrics_enabled():
+            return
+        record = {
+            "ts": iso_now(),
+            "caller": caller,
+            "priority": priority,
+            "outcome": outcome,
+            "wait_ms": wait_ms,
+            "queue_depth": depth,
+        }
+        try:
+            append_record(self.workspace, "admission", record)
+        except OSError:
+            pass
+
+    # --- public ---
+
+    def acquire(self, caller: Optional[str] = None) -> Ticket:
+        """Block until a slot is free; raises AdmissionError when it cannot be."""
+        if not self.enabled:
+            return Ticket(None, None, 0, 0)
+        priority = priority_for(caller)
+        ticket, waiter_id, depth = self._enter(priority, caller)
+        if ticket is not None:
+            return ticket
+        started = time.monotonic()
+        outcome = "timeout"
+        try:
+            while not self.timeout_s or time.monotonic() - started < self.timeout_s:
+                ticket = self._try_admit(waiter_id, started, depth)
+                if ticket is not None:
+                    outcome = "admitted"
+                    return ticket
+                time.sleep(POLL_INTERVAL_S)
+        except BaseException:
+            outcome = "abandoned"
+            raise
+        finally:
+            if outcome != "admitted":
+                self._leave(waiter_id)
+            self._record(caller, priority, outcome, int((time.monotonic() - started) * 1000), depth)
+        raise AdmissionError(f"No free agent slot after {self.timeout_s}s in queue.")
+
+    async def acquire_async(self, caller: Optional[str] = None) -> Ticket:
+        """Same as ``acquire`` but sleeps on the event loop between polls."""
+        if not self.enabled:
+            return Ticket(None, None, 0, 0)
+        priority = priority_for(caller)
+        ticket, waiter_id, depth = self._enter(priority, caller)
+        if ticket is not None:
+            return ticket
+        started = time.monotonic()
+        outcome = "timeout"
+        try:
+            while not self.timeout_s or time.monotonic() - started < self.timeout_s:
+                ticket = self._try_admit(waiter_id, started, depth)
+                if ticket is not None:
+                    outcome = "admitted"
+                    return ticket
+                await asyncio.sleep(POLL_INTERVAL_S)
+        except BaseException:
+            outcome = "abandoned"
+            raise
+        finally:
+            if outcome != "admitted":
+                self._leave(waiter_id)
+            self._record(caller, priority, outcome, int((time.monotonic() - started) * 1000), depth)
+        raise AdmissionError(f"No free agent slot after {self.timeout_s}s in queue.")
+
+    def status(self) -> Dict[str, Any]:
+        """Running runs, queue depth and how long each waiter has waited."""
+        now = time.time()
+        with file_lock(self._queue_lock):
+            waiters = self._order(self._load_queue())
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": self._running() if self.enabled else None,
+            "queue_depth": len(waiters),
+            "queue_max": self.queue_max,
+            "waiting": [
+                {
+                    "caller": w.get("caller"),
+                    "priority": w.get("priority"),
+                    "pid": w.get("pid"),
+                    "wait_s": round(now - w.get("enqueued", now), 1),
+                }
+                for w in waiters
+            ],
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent admission control")
+    parser.add_argument("command", choices=["status"])
+    parser.add_argument("--workspace", help="Workspace path")
+    args = parser.parse_args()
+
+    workspace = Path(args.workspace).expanduser().resolve() if args.workspace else resolve_workspace()
+    load_workspace_env(workspace)
+    print(json.dumps(AdmissionController(workspace).status(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
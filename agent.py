@@ -1,135 +1,93 @@
 import argparse
+import asyncio
 import json
 import os
+import re
 import subprocess
+import threading
 import time
+import uuid
+from contextlib import aclosing, closing, contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Callable, Dict, List, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
+from admission import AdmissionController
 from config import load_workspace_env, resolve_workspace
+from process_tree import kill_tree, spawn
+from session_usage import context_stats, get_usage, record_usage
+from stream_io import LineBuffer, aread_lines, read_lines
+from stream_parser import Event, parse_line
+from telemetry import RunMetrics, append_record, metrics_enabled
+from worker_pool import ClaudeWorker, WorkerPool
 
 
-Event = Dict[str, object]
+def _skip_permissions() -> bool:
+    skip_perms = os.environ.get("AIDE_CLAUDE_SKIP_PERMISSIONS", "1").strip().lower()
+    return skip_perms in ("1", "true", "yes", "on")
 
 
-def _parse_json_line(line: str) -> Optional[Event]:
-    line = line.strip()
-    if not line:
-        return None
-    try:
-        return json.loads(line)
-    except json.JSONDecodeError:
-        return None
+def _claude_cmd(session_id: Optional[str], prompt: Optional[str] = None) -> List[str]:
+    """Build the stream-json CLI command.
 
+    Without a prompt the command reads user messages from stdin
+    (``--input-format stream-json``), which is what pooled workers use.
+    """
+    cmd = ["claude", "-p", "--output-format", "stream-json", "--verbose"]
+    if prompt is None:
+        cmd.extend(["--input-format", "stream-json"])
+    if _skip_permissions():
+        cmd.append("--dangerously-skip-permissions")
+    if session_id:
+        cmd.extend(["--resume", session_id])
+    if prompt is not None:
+        cmd.append(prompt)
+    return cmd
 
-def _event_type(evt: Event) -> Optional[str]:
-    for key in ("type", "event"):
-        if key in evt and isinstance(evt[key], str):
-            return evt[key]
-    return None
-
-
-def _extract_text(evt: Event) -> Optional[str]:
-    # Common fields
-    text = evt.get("text")
-    if isinstance(text, str):
-        return text
-
-    # Result field (Claude CLI result event)
-    result = evt.get("result")
-    if isinstance(result, str):
-        return result
-
-    # Delta-based streaming
-    delta = evt.get("delta")
-    if isinstance(delta, dict):
-        dt = delta.get("text")
-        if isinstance(dt, str):
-            return dt
-        if isinstance(delta.get("text_delta"), str):
-            return delta.get("text_delta")
-        if isinstance(delta.get("value"), str):
-            return delta.get("value")
-
-    # Content arrays
-    content = evt.get("content")
-    if isinstance(content, list):
-        parts = []
-        for item in content:
-            if isinstance(item, dict) and item.get("type") == "text" and isinstance(item.get("text"), str):
-                parts.append(item["text"])
-        if parts:
-            return "".join(parts)
-
-    # Message wrapper
-    message = evt.get("message")
-    if isinstance(message, dict):
-        content = message.get("content")
-        if isinstance(content, list):
-            parts = []
-            for item in content:
-                if isinstance(item, dict) and item.get("type") == "text" and isinstance(item.get("text"), str):
-                    parts.append(item["text"])
-            if parts:
-                return "".join(parts)
-
-    return None
-
-
-ToolInfo = Dict[str, object]
-
-
-def _extract_tool_info(block: Dict) -> Optional[ToolInfo]:
-    """Extract tool name and input from a tool_use block."""
-    name = block.get("name") or block.get("tool_name") or block.get("tool")
-    if not isinstance(name, str):
-        return None
-    return {"name": name, "input": block.get("input", {})}
-
-
-def _extract_tools_from_event(evt: Event) -> List[ToolInfo]:
-    """Extract all tool info from an event."""
-    tools: List[ToolInfo] = []
-    seen_names: set = set()
-
-    # Check message.content for tool_use blocks (Claude CLI format)
-    message = evt.get("message")
-    if isinstance(message, dict):
-        content = message.get("content")
-        if isinstance(content, list):
-            for block in content:
-                if isinstance(block, dict) and block.get("type") == "tool_use":
-                    info = _extract_tool_info(block)
-                    if info and info["name"] not in seen_names:
-                        tools.append(info)
-                        seen_names.add(info["name"])
-
-    # Check for tool_use key directly
-    tool_use = evt.get("tool_use")
-    if isinstance(tool_use, dict):
-        info = _extract_tool_info(tool_use)
-        if info and info["name"] not in seen_names:
-            tools.append(info)
-            seen_names.add(info["name"])
-    elif isinstance(tool_use, list):
-        for item in tool_use:
-            if isinstance(item, dict):
-                info = _extract_tool_info(item)
-                if info and info["name"] not in seen_names:
-                    tools.append(info)
-                    seen_names.add(info["name"])
-
-    # Check for content blocks with tool_use type at top level
-    content = evt.get("content")
-    if isinstance(content, list):
-        for block in content:
-            if isinstance(block, dict) and block.get("type") == "tool_use":
-                info = _extract_tool_info(block)
-                if info and info["name"] not in seen_names:
-                    tools.append(info)
-                    seen_names.add(info["name"])
-
-    return tools
+
+def _pool_enabled() -> bool:
+    raw = os.environ.get("AIDE_AGENT_POOL", "0").strip().lower()
+    return raw in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    raw = os.environ.get(name, str(default)).strip()
+    try:
+        value = int(raw)
+    except ValueError:
+        value = default
+    return max(minimum, value)
+
+
+_POOLS: Dict[str, WorkerPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_worker_pool(working_dir: Path) -> WorkerPool:
+    """Return the process-wide worker pool for a workspace (created on first use)."""
+    key = str(working_dir)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = WorkerPool(
+                working_dir,
+                spawn_cmd=lambda sid: _claude_cmd(sid),
+                max_size=_env_int("AIDE_AGENT_POOL_MAX", 4, minimum=1),
+                warm=_env_int("AIDE_AGENT_POOL_WARM", 1),
+                idle_s=_env_int("AIDE_AGENT_POOL_IDLE_S", 600, minimum=1),
+            )
+            _POOLS[key] = pool
+        return pool
+
+
+def warm_worker_pool(working_dir: Optional[Path] = None) -> None:
+    """Pre-spawn idle workers so the first message skips CLI startup."""
+    if working_dir is None:
+        working_dir = resolve_workspace()
+    load_workspace_env(working_dir)
+    if not _pool_enabled():
+        return
+    get_worker_pool(working_dir).warm_up()
 
 
 def get_session_usage(
@@ -137,15 +95,18 @@ def get_session_usage(
     working_dir: Optional[Path] = None,
     timeout_s: int = 30,
 ) -> Optional[Dict]:
-    """Get usage info for a session by sending a minimal prompt."""
+    """Get usage info for a session by sending a minimal prompt.
+
+    Costs a model call; status commands read ``session_usage.get_usage``
+    and only call this on an explicit refresh. The answer is stored too.
+    """
     if working_dir is None:
         working_dir = resolve_workspace()
 
     load_workspace_env(working_dir)
 
     cmd = ["claude", "-p", "--output-format", "json", "--resume", session_id, "Reply only: ok"]
-    skip_perms = os.environ.get("AIDE_CLAUDE_SKIP_PERMISSIONS", "1").strip().lower()
-    if skip_perms in ("1", "true", "yes", "on"):
+    if _skip_permissions():
         cmd.append("--dangerously-skip-permissions")
 
     try:
@@ -160,131 +121,698 @@ def get_session_usage(
         if result.returncode != 0:
             return None
         data = json.loads(result.stdout)
-        return {
+        usage_info = {
             "session_id": session_id,
             "usage": data.get("usage", {}),
             "model_usage": data.get("modelUsage", {}),
             "cost_usd": data.get("total_cost_usd", 0),
         }
+        record_usage(working_dir, session_id, usage_info)
+        return usage_info
     except (subprocess.TimeoutExpired, json.JSONDecodeError, Exception):
         return None
 
 
-def run_agent(
-    prompt: str,
-    session_id: Optional[str] = None,
-    working_dir: Optional[Path] = None,
-    timeout_s: int = 300,
-    process_cb: Optional[Callable[[subprocess.Popen], None]] = None,
-    tool_cb: Optional[Callable[[str, Dict], None]] = None,
-) -> Tuple[str, Optional[str], List[Event]]:
+AgentEvent = Dict[str, object]
+
+# Bounded-memory mode limits (AIDE_AGENT_BOUNDED_MEMORY=1)
+MAX_TEXT_CHARS = 256 * 1024
+MAX_RAW_LINES = 50
+RAW_LINE_CHARS = 2000
+MAX_TOOL_LOG = 500
+COMPACT_VALUE_CHARS = 200
+
+
+def _compact(value: object) -> object:
+    """Shrink a tool input to something cheap to keep in RAM."""
+    if isinstance(value, str):
+        return value if len(value) <= COMPACT_VALUE_CHARS else value[:COMPACT_VALUE_CHARS] + "…"
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in list(value.items())[:20]}
+    if isinstance(value, list):
+        return [_compact(v) for v in value[:20]]
+    return value
+
+
+class _RunState:
+    """Turns stream-json lines of one agent turn into typed ``AgentEvent`` dicts.
+
+    Event kinds: ``session``, ``text``, ``tool_start``, ``tool_end``,
+    ``result`` (the CLI result event with usage/cost) and finally ``done``
+    carrying the answer the caller should show.
+    """
+
+    def __init__(self, keep_log: bool = True, bounded: bool = False) -> None:
+        self.keep_log = keep_log
+        self.bounded = bounded
+        self.transcript: Optional[Path] = None
+        self.tool_log: List[Event] = []
+        self.assistant_chunks: List[str] = []
+        self.post_tool_chunks: List[str] = []
+        self.saw_tool_use = False
+        self.final_text: Optional[str] = None
+        self.session_id: Optional[str] = None
+        self.raw_lines: List[str] = []
+        self.open_tools: Dict[object, str] = {}
+        self.finished = False
+        # Usage of the latest model call = how full the context window is
+        self.context_usage: Dict[str, object] = {}
+        # A pooled worker's total_cost_usd covers all its turns: subtract what it had reported before
+        self.cost_base = 0.0
+        self.total_cost_usd = 0.0
+
+    def feed(self, line: str) -> List[AgentEvent]:
+        """Process one stdout line into zero or more events."""
+        parsed = parse_line(line)
+        if not parsed:
+            if line.strip():
+                self.raw_lines.append(line.rstrip("\n")[:RAW_LINE_CHARS] if self.bounded else line.rstrip("\n"))
+                if self.bounded and len(self.raw_lines) > MAX_RAW_LINES:
+                    del self.raw_lines[0]
+            return []
+
+        events: List[AgentEvent] = []
+        etype = parsed["type"]
+        evt = parsed["event"]
+        is_final = etype in ("result", "final", "message_stop")
+
+        # Debug: log all events to see what Claude CLI sends
+        if os.environ.get("AIDE_DEBUG_EVENTS"):
+            keys = list(evt.keys()) if isinstance(evt, dict) else "(not decoded)"
+            print(f"[DEBUG] Event type={etype}, keys={keys}")
+
+        if etype in ("system", "session") or (etype == "result" and not self.session_id):
+            sid = parsed["session_id"]
+            if sid and sid != self.session_id:
+                self.session_id = sid
+                events.append({"kind": "session", "session_id": sid})
+
+        text = parsed["text"]
+        if text:
+            self._add_text(text)
+            if not is_final:
+                events.append({"kind": "text", "text": text})
+
+        if etype == "assistant" and isinstance(evt, dict):
+            message = evt.get("message")
+            if isinstance(message, dict) and isinstance(message.get("usage"), dict):
+                self.context_usage = message["usage"]
+
+        tools_found = parsed["tools"]
+
+        if tools_found:
+            self.saw_tool_use = True
+            self.post_tool_chunks.clear()
+            if self.keep_log:
+                self._log_tools(evt, tools_found)
+            for tool_info in tools_found:
+                self.open_tools[tool_info.get("id")] = str(tool_info["name"])
+                events.append({"kind": "tool_start", **tool_info})
+
+        for res in parsed["tool_results"]:
+            name = self.open_tools.pop(res["id"], None)
+            events.append({"kind": "tool_end", "name": name, **res})
+
+        if is_final:
+            if text:
+                self.final_text = text
+            if etype == "result":
+                self.finished = True
+                self.total_cost_usd = evt.get("total_cost_usd") or 0
+                events.append(
+                    {
+                        "kind": "result",
+                        "text": text,
+                        "session_id": self.session_id,
+                        "is_error": bool(evt.get("is_error")),
+                        "usage": evt.get("usage", {}),
+                        "model_usage": evt.get("modelUsage", {}),
+                        "context_usage": self.context_usage,
+                        "cost_usd": max(0, round(self.total_cost_usd - self.cost_base, 6)),
+                        "duration_ms": evt.get("duration_ms"),
+                        "num_turns": evt.get("num_turns"),
+                    }
+                )
+
+        return events
+
+    def _add_text(self, text: str) -> None:
+        for chunks in (self.assistant_chunks, self.post_tool_chunks):
+            chunks.append(text)
+            if not self.bounded:
+                continue
+            # Only the tail can end up in the fallback answer
+            total = sum(map(len, chunks))
+            while len(chunks) > 1 and total > MAX_TEXT_CHARS:
+                total -= len(chunks.pop(0))
+
+    def _log_tools(self, evt: Optional[Event], tools: List[Dict]) -> None:
+        if not self.bounded:
+            if evt is not None:
+                self.tool_log.append(evt)
+            return
+        # Compact summaries only; the full events live in the transcript file
+        for info in tools:
+            self.tool_log.append({"id": info.get("id"), "name": info["name"], "input": _compact(info.get("input"))})
+        if len(self.tool_log) > MAX_TOOL_LOG:
+            del self.tool_log[: len(self.tool_log) - MAX_TOOL_LOG]
+
+    def answer(self, returncode: Optional[int], stderr: str) -> str:
+        final_text = self.final_text
+        if final_text is None:
+            if self.saw_tool_use and self.post_tool_chunks:
+                final_text = "".join(self.post_tool_chunks).strip()
+            else:
+                final_text = "".join(self.assistant_chunks).strip()
+
+        if not final_text:
+            stderr = stderr.strip()
+            if stderr:
+                final_text = f"(no output)\n{stderr}"
+            elif self.raw_lines:
+                final_text = "\n".join(self.raw_lines).strip()
+            else:
+                final_text = "(no output)"
+                if returncode and returncode != 0:
+                    final_text = f"(no output) (exit {returncode})"
+        return final_text
+
+    def done(self, returncode: Optional[int], stderr: str) -> AgentEvent:
+        return {
+            "kind": "done",
+            "text": self.answer(returncode, stderr),
+            "session_id": self.session_id,
+            "returncode": returncode,
+            "transcript": str(self.transcript) if self.transcript else None,
+        }
+
+
+def _idle_timeout_s() -> int:
+    return _env_int("AIDE_AGENT_IDLE_TIMEOUT_S", 0)
+
+
+def _bounded_enabled() -> bool:
+    raw = os.environ.get("AIDE_AGENT_BOUNDED_MEMORY", "0").strip().lower()
+    return raw in ("1", "true", "yes", "on")
+
+
+def _transcript_path(working_dir: Path, session_key: Optional[str]) -> Path:
+    now = datetime.now()
+    label = re.sub(r"[^A-Za-z0-9_.-]+", "-", session_key or "run").strip("-") or "run"
+    day_dir = working_dir / "data" / "transcripts" / now.date().isoformat()
+    day_dir.mkdir(parents=True, exist_ok=True)
+    return day_dir / f"{now:%H%M%S}_{label}_{uuid.uuid4().hex[:8]}.jsonl"
+
+
+@contextmanager
+def _transcript(state: "_RunState", buf: LineBuffer, working_dir: Path, session_key: Optional[str]) -> Iterator[None]:
+    """Bounded mode: spill raw stdout to data/transcripts and cap in-memory lines."""
+    if not state.bounded:
+        yield
+        return
+    path = _transcript_path(working_dir, session_key)
+    buf.max_line_bytes = _env_int("AIDE_AGENT_MAX_LINE_KB", 256, minimum=1) * 1024
+    with path.open("ab") as sink:
+        buf.sink = sink
+        state.transcript = path
+        try:
+            yield
+        finally:
+            buf.sink = None
+
+
+def _prepare_run(working_dir: Optional[Path], idle_timeout_s: Optional[int]) -> Tuple[Path, int]:
     if working_dir is None:
         working_dir = resolve_workspace()
-
     load_workspace_env(working_dir)
+    if idle_timeout_s is None:
+        idle_timeout_s = _idle_timeout_s()
+    return working_dir, idle_timeout_s
 
-    cmd = ["claude", "-p", "--output-format", "stream-json", "--verbose"]
-    skip_perms = os.environ.get("AIDE_CLAUDE_SKIP_PERMISSIONS", "1").strip().lower()
-    if skip_perms in ("1", "true", "yes", "on"):
-        cmd.append("--dangerously-skip-permissions")
-    if session_id:
-        cmd.extend(["--resume", session_id])
-    cmd.append(prompt)
 
-    proc = subprocess.Popen(
+def _spawn(cmd: List[str], working_dir: Path) -> subprocess.Popen:
+    # Binary pipes: stream_io reads raw fds and decodes lines itself
+    return spawn(
         cmd,
         cwd=str(working_dir),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
         env=os.environ.copy(),
     )
 
-    if process_cb:
-        process_cb(proc)
 
-    tool_log: List[Event] = []
-    assistant_chunks: List[str] = []
-    post_tool_chunks: List[str] = []
-    saw_tool_use = False
-    final_text: Optional[str] = None
-    new_session_id: Optional[str] = None
-    raw_lines: List[str] = []
-
-    start = time.time()
-    while True:
-        if timeout_s and (time.time() - start) > timeout_s:
-            proc.terminate()
-            raise TimeoutError("Claude Code CLI timed out.")
-
-        line = proc.stdout.readline() if proc.stdout else ""
-        if line == "":
-            if proc.poll() is not None:
-                break
-            time.sleep(0.05)
-            continue
-
-        evt = _parse_json_line(line)
-        if not evt:
-            if line.strip():
-                raw_lines.append(line.rstrip("\n"))
-            continue
+def _acquire_worker(
+    working_dir: Path, session_key: Optional[str], session_id: Optional[str]
+) -> Tuple[Optional[WorkerPool], Optional[ClaudeWorker]]:
+    """Pool mode: reserve a long-lived CLI process bound to the session key."""
+    if not session_key or not _pool_enabled():
+        return None, None
+    pool = get_worker_pool(working_dir)
+    return pool, pool.acquire(session_key, session_id)
 
-        etype = _event_type(evt)
 
-        # Debug: log all events to see what Claude CLI sends
-        if os.environ.get("AIDE_DEBUG_EVENTS"):
-            print(f"[DEBUG] Event type={etype}, keys={list(evt.keys())}")
+def _finish_worker_turn(worker: ClaudeWorker, state: _RunState) -> AgentEvent:
+    if not state.finished:
+        # Worker died mid-turn (crash, /stop) or the consumer gave up early;
+        # either way its stdout is no longer aligned with turn boundaries.
+        worker.close()
+    else:
+        worker.cost_usd = state.total_cost_usd
+        if state.session_id:
+            worker.session_id = state.session_id
+    return state.done(worker.proc.poll(), worker.buf.stderr_text())
 
-        if etype in ("system", "session"):
-            sid = evt.get("session_id") or evt.get("session")
-            if isinstance(sid, str):
-                new_session_id = sid
 
-        text = _extract_text(evt)
-        if text:
-            assistant_chunks.append(text)
-            post_tool_chunks.append(text)
+def _iter_run(
+    prompt: str,
+    session_id: Optional[str],
+    working_dir: Path,
+    timeout_s: int,
+    idle_timeout_s: int,
+    process_cb: Optional[Callable[[subprocess.Popen], None]],
+    session_key: Optional[str],
+    state: _RunState,
+    metrics: RunMetrics,
+) -> Iterator[AgentEvent]:
+    pool, worker = _acquire_worker(working_dir, session_key, session_id)
+    if pool and worker:
+        metrics.spawned(pooled=True)
+        if process_cb:
+            process_cb(worker.proc)
+        state.cost_base = worker.cost_usd
+        try:
+            worker.send(prompt)
+            # The worker's stdout outlives this turn: close the reader explicitly
+            with _transcript(state, worker.buf, working_dir, session_key), closing(
+                read_lines(worker.proc, worker.buf, timeout_s, idle_timeout_s, drain_stderr=False)
+            ) as lines:
+                for line in lines:
+                    yield from state.feed(line)
+                    if state.finished:
+                        break
+        finally:
+            done = _finish_worker_turn(worker, state)
+            pool.release(worker)
+        yield done
+        return
+
+    proc = _spawn(_claude_cmd(session_id, prompt), working_dir)
+    metrics.spawned(pooled=False)
 
-        # Detect and extract tool use info
-        tools_found = _extract_tools_from_event(evt)
+    if process_cb:
+        process_cb(proc)
 
-        if tools_found:
-            saw_tool_use = True
-            post_tool_chunks.clear()
-            tool_log.append(evt)
-            if tool_cb:
-                for tool_info in tools_found:
-                    tool_cb(tool_info["name"], tool_info.get("input", {}))
-
-        if etype in ("result", "final", "message_stop"):
-            text = _extract_text(evt)
-            if text:
-                final_text = text
+    buf = LineBuffer()
+    try:
+        with _transcript(state, buf, working_dir, session_key), closing(
+            read_lines(proc, buf, timeout_s, idle_timeout_s)
+        ) as lines:
+            for line in lines:
+                yield from state.feed(line)
+    except (TimeoutError, GeneratorExit):
+        kill_tree(proc)
+        raise
 
     if proc.poll() is None:
         proc.wait(timeout=5)
 
-    if final_text is None:
-        if saw_tool_use and post_tool_chunks:
-            final_text = "".join(post_tool_chunks).strip()
-        else:
-            final_text = "".join(assistant_chunks).strip()
+    yield state.done(proc.returncode, buf.stderr_text())
+
+
+async def _aiter_run(
+    prompt: str,
+    session_id: Optional[str],
+    working_dir: Path,
+    timeout_s: int,
+    idle_timeout_s: int,
+    process_cb: Optional[Callable[[subprocess.Popen], None]],
+    session_key: Optional[str],
+    state: _RunState,
+    metrics: RunMetrics,
+) -> AsyncIterator[AgentEvent]:
+    pool, worker = _acquire_worker(working_dir, session_key, session_id)
+    if pool and worker:
+        metrics.spawned(pooled=True)
+        if process_cb:
+            process_cb(worker.proc)
+        state.cost_base = worker.cost_usd
+        try:
+            worker.send(prompt)
+            # The worker's stdout outlives this turn: remove the fd reader explicitly
+            with _transcript(state, worker.buf, working_dir, session_key):
+                async with aclosing(
+                    aread_lines(worker.proc, worker.buf, timeout_s, idle_timeout_s, drain_stderr=False)
+                ) as lines:
+                    async for line in lines:
+                        for evt in state.feed(line):
+                            yield evt
+                        if state.finished:
+                            break
+        finally:
+            done = _finish_worker_turn(worker, state)
+            pool.release(worker)
+        yield done
+        return
+
+    proc = _spawn(_claude_cmd(session_id, prompt), working_dir)
+    metrics.spawned(pooled=False)
+
+    if process_cb:
+        process_cb(proc)
+
+    buf = LineBuffer()
+    try:
+        with _transcript(state, buf, working_dir, session_key):
+            async with aclosing(aread_lines(proc, buf, timeout_s, idle_timeout_s)) as lines:
+                async for line in lines:
+                    for evt in state.feed(line):
+                        yield evt
+    except (TimeoutError, GeneratorExit, asyncio.CancelledError):
+        kill_tree(proc)
+        raise
+
+    # Both pipes hit EOF; the exit status follows almost immediately
+    deadline = time.monotonic() + 5
+    while proc.poll() is None and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    yield state.done(proc.returncode, buf.stderr_text())
+
+
+def _record_result(evt: AgentEvent, working_dir: Path, session_key: Optional[str]) -> None:
+    if evt["kind"] != "result" or not evt.get("session_id"):
+        return
+    try:
+        record_usage(working_dir, str(evt["session_id"]), evt, session_key)
+    except OSError:
+        pass
+
+
+def _metered(
+    events: Iterator[AgentEvent],
+    metrics: RunMetrics,
+    working_dir: Path,
+    session_key: Optional[str],
+    caller: Optional[str],
+) -> Iterator[AgentEvent]:
+    error: Optional[BaseException] = None
+    ticket = None
+    try:
+        # Wait for a workspace-wide slot before the CLI is spawned
+        ticket = AdmissionController(working_dir).acquire(caller)
+        metrics.admitted(ticket.wait_ms, ticket.queue_depth)
+        with closing(events):
+            for evt in events:
+                metrics.observe(evt)
+                _record_result(evt, working_dir, session_key)
+                yield evt
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        if ticket is not None:
+            ticket.release()
+        metrics.finish(working_dir, error)
+
+
+async def _ametered(
+    events: AsyncIterator[AgentEvent],
+    metrics: RunMetrics,
+    working_dir: Path,
+    session_key: Optional[str],
+    caller: Optional[str],
+) -> AsyncIterator[AgentEvent]:
+    error: Optional[BaseException] = None
+    ticket = None
+    try:
+        ticket = await AdmissionController(working_dir).acquire_async(caller)
+        metrics.admitted(ticket.wait_ms, ticket.queue_depth)
+        async with aclosing(events):
+            async for evt in events:
+                metrics.observe(evt)
+                _record_result(evt, working_dir, session_key)
+                yield evt
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        if ticket is not None:
+            ticket.release()
+        metrics.finish(working_dir, error)
+
+
+def _run_events(
+    prompt: str,
+    session_id: Optional[str],
+    working_dir: Path,
+    timeout_s: int,
+    idle_timeout_s: int,
+    process_cb: Optional[Callable[[subprocess.Popen], None]],
+    session_key: Optional[str],
+    caller: Optional[str],
+    state: _RunState,
+) -> Iterator[AgentEvent]:
+    metrics = RunMetrics(caller, session_key, session_id)
+    events = _iter_run(
+        prompt, session_id, working_dir, timeout_s, idle_timeout_s, process_cb, session_key, state, metrics
+    )
+    return _metered(events, metrics, working_dir, session_key, caller)
+
+
+def _arun_events(
+    prompt: str,
+    session_id: Optional[str],
+    working_dir: Path,
+    timeout_s: int,
+    idle_timeout_s: int,
+    process_cb: Optional[Callable[[subprocess.Popen], None]],
+    session_key: Optional[str],
+    caller: Optional[str],
+    state: _RunState,
+) -> AsyncIterator[AgentEvent]:
+    metrics = RunMetrics(caller, session_key, session_id)
+    events = _aiter_run(
+        prompt, session_id, working_dir, timeout_s, idle_timeout_s, process_cb, session_key, state, metrics
+    )
+    return _ametered(events, metrics, working_dir, session_key, caller)
+
+
+def stream_agent(
+    prompt: str,
+    session_id: Optional[str] = None,
+    working_dir: Optional[Path] = None,
+    timeout_s: int = 300,
+    process_cb: Optional[Callable[[subprocess.Popen], None]] = None,
+    session_key: Optional[str] = None,
+    idle_timeout_s: Optional[int] = None,
+    caller: Optional[str] = None,
+) -> Iterator[AgentEvent]:
+    """Yield typed events as the CLI produces them; the last one is ``done``.
+
+    Nothing is accumulated besides the text needed for the final answer,
+    so long runs stay cheap. Stopping iteration early terminates the run.
+    """
+    working_dir, idle_timeout_s = _prepare_run(working_dir, idle_timeout_s)
+    state = _RunState(keep_log=False, bounded=_bounded_enabled())
+    yield from _run_events(
+        prompt, session_id, working_dir, timeout_s, idle_timeout_s, process_cb, session_key, caller, state
+    )
+
+
+async def stream_agent_async(
+    prompt: str,
+    session_id: Optional[str] = None,
+    working_dir: Optional[Path] = None,
+    timeout_s: int = 300,
+    process_cb: Optional[Callable[[subprocess.Popen], None]] = None,
+    session_key: Optional[str] = None,
+    idle_timeout_s: Optional[int] = None,
+    caller: Optional[str] = None,
+) -> AsyncIterator[AgentEvent]:
+    """Async iterator version of ``stream_agent``."""
+    working_dir, idle_timeout_s = _prepare_run(working_dir, idle_timeout_s)
+    state = _RunState(keep_log=False, bounded=_bounded_enabled())
+    async with aclosing(
+        _arun_events(prompt, session_id, working_dir, timeout_s, idle_timeout_s, process_cb, session_key, caller, state)
+    ) as events:
+        async for evt in events:
+            yield evt
+
+
+def _dispatch_tool_cb(evt: AgentEvent, tool_cb: Optional[Callable[[str, Dict], None]]) -> None:
+    if tool_cb and evt["kind"] == "tool_start":
+        tool_cb(evt["name"], evt.get("input", {}))
 
-    if not final_text:
-        stderr = proc.stderr.read().strip() if proc.stderr else ""
-        if stderr:
-            final_text = f"(no output)\n{stderr}"
-        elif raw_lines:
-            final_text = "\n".join(raw_lines).strip()
-        else:
-            rc = proc.returncode
-            final_text = "(no output)"
-            if rc and rc != 0:
-                final_text = f"(no output) (exit {rc})"
 
-    return final_text, new_session_id, tool_log
+def run_agent(
+    prompt: str,
+    session_id: Optional[str] = None,
+    working_dir: Optional[Path] = None,
+    timeout_s: int = 300,
+    process_cb: Optional[Callable[[subprocess.Popen], None]] = None,
+    tool_cb: Optional[Callable[[str, Dict], None]] = None,
+    session_key: Optional[str] = None,
+    idle_timeout_s: Optional[int] = None,
+    caller: Optional[str] = None,
+) -> Tuple[str, Optional[str], List[Event]]:
+    working_dir, idle_timeout_s = _prepare_run(working_dir, idle_timeout_s)
+    state = _RunState(bounded=_bounded_enabled())
+    answer = ""
+    for evt in _run_events(
+        prompt, session_id, working_dir, timeout_s, idle_timeout_s, process_cb, session_key, caller, state
+    ):
+        _dispatch_tool_cb(evt, tool_cb)
+        if evt["kind"] == "done":
+            answer = str(evt["text"])
+    return answer, state.session_id, state.tool_log
+
+
+async def run_agent_async(
+    prompt: str,
+    session_id: Optional[str] = None,
+    working_dir: Optional[Path] = None,
+    timeout_s: int = 300,
+    process_cb: Optional[Callable[[subprocess.Popen], None]] = None,
+    tool_cb: Optional[Callable[[str, Dict], None]] = None,
+    session_key: Optional[str] = None,
+    idle_timeout_s: Optional[int] = None,
+    caller: Optional[str] = None,
+) -> Tuple[str, Optional[str], List[Event]]:
+    """Same as ``run_agent`` but reads the CLI pipes on the running event loop.
+
+    Callbacks are invoked on the event loop thread.
+    """
+    working_dir, idle_timeout_s = _prepare_run(working_dir, idle_timeout_s)
+    state = _RunState(bounded=_bounded_enabled())
+    answer = ""
+    async with aclosing(
+        _arun_events(prompt, session_id, working_dir, timeout_s, idle_timeout_s, process_cb, session_key, caller, state)
+    ) as events:
+        async for evt in events:
+            _dispatch_tool_cb(evt, tool_cb)
+            if evt["kind"] == "done":
+                answer = str(evt["text"])
+    return answer, state.session_id, state.tool_log
+
+
+ROLLOVER_SUMMARY_PROMPT = (
+    "This conversation is about to continue in a fresh session. Write a compact summary "
+    "for your future self: the user's goals, decisions made, facts and preferences learned, "
+    "files or tasks touched and anything still open. Use short bullet points, no preamble, "
+    "at most 400 words, in the language of the conversation."
+)
+ROLLOVER_SEED_PROMPT = (
+    "[Previous session summary]\n{summary}\n\n"
+    "This session continues the conversation above. Reply only: ok"
+)
+
+
+def _rollover_threshold() -> float:
+    """Context fill (percent) that triggers a rollover; 0 disables it."""
+    raw = os.environ.get("AIDE_SESSION_ROLLOVER_PCT", "70").strip()
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return 70.0
+
+
+def needs_rollover(session_id: Optional[str], working_dir: Path) -> bool:
+    """True when the stored usage of the session's last turn is past the threshold."""
+    threshold = _rollover_threshold()
+    if not session_id or not threshold:
+        return False
+    usage_info = get_usage(working_dir, session_id)
+    if not usage_info:
+        return False
+    return context_stats(usage_info)["usage_percent"] >= threshold
+
+
+def _rollover_result(events: List[AgentEvent]) -> Tuple[Optional[str], Optional[str]]:
+    """(text, session id) of a successful turn, else (None, None)."""
+    for evt in events:
+        if evt["kind"] == "result" and not evt.get("is_error") and str(evt.get("text") or "").strip():
+            return str(evt["text"]).strip(), evt.get("session_id")
+    return None, None
+
+
+def _record_rollover(working_dir: Path, session_key: Optional[str], old_id: str, new_id: str, summary: str) -> None:
+    if not metrics_enabled():
+        return
+    usage_info = get_usage(working_dir, old_id) or {}
+    record = {
+        "ts": datetime.now().isoformat(),
+        "session_key": session_key,
+        "old_session_id": old_id,
+        "new_session_id": new_id,
+        "old_context_tokens": context_stats(usage_info)["total_context"] if usage_info else None,
+        "summary_chars": len(summary),
+    }
+    try:
+        append_record(working_dir, "session_rollovers", record)
+    except OSError:
+        pass
+
+
+def rollover_session(
+    session_id: str,
+    working_dir: Optional[Path] = None,
+    session_key: Optional[str] = None,
+    caller: Optional[str] = None,
+    timeout_s: int = 300,
+    process_cb: Optional[Callable[[subprocess.Popen], None]] = None,
+) -> Optional[str]:
+    """Summarize a session and start a fresh one seeded with the summary.
+
+    Returns the new session id, or None when either step failed (the caller
+    then simply keeps the old session).
+    """
+    working_dir, _idle = _prepare_run(working_dir, None)
+    kwargs = {
+        "working_dir": working_dir,
+        "timeout_s": timeout_s,
+        "process_cb": process_cb,
+        "session_key": session_key,
+        "caller": caller,
+    }
+    summary, _sid = _rollover_result(list(stream_agent(ROLLOVER_SUMMARY_PROMPT, session_id=session_id, **kwargs)))
+    if not summary:
+        return None
+    seed = ROLLOVER_SEED_PROMPT.format(summary=summary)
+    _text, new_id = _rollover_result(list(stream_agent(seed, **kwargs)))
+    if not new_id or new_id == session_id:
+        return None
+    _record_rollover(working_dir, session_key, session_id, new_id, summary)
+    return new_id
+
+
+async def rollover_session_async(
+    session_id: str,
+    working_dir: Optional[Path] = None,
+    session_key: Optional[str] = None,
+    caller: Optional[str] = None,
+    timeout_s: int = 300,
+    process_cb: Optional[Callable[[subprocess.Popen], None]] = None,
+) -> Optional[str]:
+    """Async version of ``rollover_session``."""
+    working_dir, _idle = _prepare_run(working_dir, None)
+    kwargs = {
+        "working_dir": working_dir,
+        "timeout_s": timeout_s,
+        "process_cb": process_cb,
+        "session_key": session_key,
+        "caller": caller,
+    }
+    summary, _sid = _rollover_result(
+        [evt async for evt in stream_agent_async(ROLLOVER_SUMMARY_PROMPT, session_id=session_id, **kwargs)]
+    )
+    if not summary:
+        return None
+    seed = ROLLOVER_SEED_PROMPT.format(summary=summary)
+    _text, new_id = _rollover_result([evt async for evt in stream_agent_async(seed, **kwargs)])
+    if not new_id or new_id == session_id:
+        return None
+    _record_rollover(working_dir, session_key, session_id, new_id, summary)
+    return new_id
 
 
 def main() -> None:
@@ -292,10 +820,15 @@ def main() -> None:
     parser.add_argument("prompt", help="Prompt to send")
     parser.add_argument("--session", dest="session_id", default=None)
     parser.add_argument("--workspace", dest="workspace", default=None)
+    parser.add_argument("--events", action="store_true", help="Print typed events as JSON lines")
     args = parser.parse_args()
 
     working_dir = resolve_workspace(args.workspace)
-    answer, sid, _tool_log = run_agent(args.prompt, session_id=args.session_id, working_dir=working_dir)
+    if args.events:
+        for evt in stream_agent(args.prompt, session_id=args.session_id, working_dir=working_dir, caller="cli"):
+            print(json.dumps(evt, ensure_ascii=False), flush=True)
+        return
+    answer, sid, _tool_log = run_agent(args.prompt, session_id=args.session_id, working_dir=working_dir, caller="cli")
     if sid:
         print(f"[session_id] {sid}")
     print(answer)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cold-start import time of the core_tools CLIs, checked against a budget.
+
+Usage:
+  python benchmarks/bench_import_time.py [--repeat 5] [--budget-ms 80] [tool ...]
+
+Each tool module is imported in a fresh interpreter under ``-X importtime``;
+the best of ``--repeat`` runs is compared with its budget (interpreter
+startup itself is not counted). Exits 1 when a tool is over budget or pulls
+in a module that must stay lazy, so it can gate a change.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Set
+
+ROOT = Path(__file__).resolve().parent.parent
+CORE_TOOLS = ROOT / "core_tools"
+
+# Budget per tool in ms of cumulative import time under -X importtime (which
+# inflates it): about 1.5x what a small VPS measures, numpy alone adds ~100
+BUDGETS_MS = {
+    "memory_manage": 100.0,
+    "task_manage": 80.0,
+    "cron_manage": 80.0,
+    "project_manage": 80.0,
+    "send_message": 60.0,
+    "storage_manage": 80.0,
+}
+# Only the code paths that need these may import them
+LAZY_MODULES = ("croniter", "dotenv", "slack_sdk", "numpy", "urllib.request", "sqlite3")
+
+
+def _import_once(tool: str) -> Dict[str, object]:
+    code = f"import sys; sys.path.insert(0, {str(CORE_TOOLS)!r}); import {tool}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=str(ROOT),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{tool}: import failed\n{proc.stderr}")
+    total_us = 0
+    modules: Set[str] = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        modules.add(name.strip())
+        if name.strip() == tool:
+            total_us = int(cumulative)
+    return {"ms": total_us / 1000, "modules": modules}
+
+
+def measure(tool: str, repeat: int) -> Dict[str, object]:
+    runs = [_import_once(tool) for _ in range(max(1, repeat))]
+    best = min(runs, key=lambda run: run["ms"])
+    eager = sorted(m for m in LAZY_MODULES if m in best["modules"])
+    return {"tool": tool, "ms": best["ms"], "modules": len(best["modules"]), "eager": eager}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark core_tools cold-start import time")
+    parser.add_argument("tools", nargs="*", help=f"Tools to measure (default: {', '.join(BUDGETS_MS)})")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="One budget for every tool")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results: List[Dict[str, object]] = []
+    for tool in args.tools or list(BUDGETS_MS):
+        row = measure(tool, args.repeat)
+        row["budget_ms"] = args.budget_ms if args.budget_ms is not None else BUDGETS_MS.get(tool, 80.0)
+        row["ok"] = row["ms"] <= row["budget_ms"] and not row["eager"]
+        results.append(row)
+
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0], "repeat": args.repeat, "tools": results}, indent=2))
+    else:
+        print(f"Python {sys.version.split()[0]}, best of {args.repeat}\n")
+        print(f"  {'tool':<16}{'import ms':>10}{'budget':>9}{'modules':>9}  eager lazy modules")
+        for row in results:
+            mark = "" if row["ok"] else "  <-- FAIL"
+            eager = ", ".join(row["eager"]) or "-"
+            print(f"  {row['tool']:<16}{row['ms']:>10.1f}{row['budget_ms']:>9.0f}{row['modules']:>9}  {eager}{mark}")
+    if not all(row["ok"] for row in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Per-event parse cost of stream-json transcripts: legacy multi-pass vs parse_line.
+
+Usage:
+  python benchmarks/bench_stream_parser.py [--repeat 200] [fixtures/*.jsonl ...]
+
+Drop recorded transcripts (``claude -p --output-format stream-json --verbose``
+stdout) into benchmarks/fixtures/ to include them.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import stream_parser  # noqa: E402
+from stream_parser import (  # noqa: E402
+    _event_type,
+    _extract_text,
+    _extract_tools_from_event,
+    _parse_json_line,
+    parse_line,
+)
+
+
+def _legacy(line: str) -> None:
+    """The per-line work run_agent did before parse_line."""
+    evt = _parse_json_line(line)
+    if not evt:
+        return
+    _event_type(evt)
+    _extract_text(evt)
+    _extract_tools_from_event(evt)
+
+
+def _line_type(line: str) -> str:
+    evt = _parse_json_line(line)
+    return (_event_type(evt) if evt else None) or "(raw)"
+
+
+def _bench(lines: List[str], fn, repeat: int) -> Dict[str, int]:
+    """Total nanoseconds spent per event type."""
+    types = [_line_type(line) for line in lines]
+    totals: Dict[str, int] = {t: 0 for t in types}
+    clock = time.perf_counter_ns
+    for _ in range(repeat):
+        for etype, line in zip(types, lines):
+            start = clock()
+            fn(line)
+            totals[etype] += clock() - start
+    return totals
+
+
+def run_fixture(path: Path, repeat: int) -> Dict[str, object]:
+    lines = [line for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    legacy = _bench(lines, _legacy, repeat)
+    fast = _bench(lines, parse_line, repeat)
+
+    rows = []
+    for etype in sorted(legacy):
+        members = [line for line in lines if _line_type(line) == etype]
+        runs = len(members) * repeat
+        rows.append(
+            {
+                "type": etype,
+                "events": len(members),
+                "avg_bytes": sum(len(m) for m in members) // len(members),
+                "legacy_us": legacy[etype] / runs / 1000,
+                "fast_us": fast[etype] / runs / 1000,
+            }
+        )
+    total_runs = len(lines) * repeat
+    return {
+        "fixture": path.name,
+        "events": len(lines),
+        "bytes": sum(len(line) for line in lines),
+        "legacy_us": sum(legacy.values()) / total_runs / 1000,
+        "fast_us": sum(fast.values()) / total_runs / 1000,
+        "by_type": rows,
+    }
+
+
+def _print_report(report: Dict[str, object]) -> None:
+    print(f"{report['fixture']}: {report['events']} events, {report['bytes']:,} bytes")
+    print(f"  {'type':<12}{'n':>5}{'avg bytes':>12}{'legacy us':>12}{'fast us':>12}{'speedup':>9}")
+    for row in report["by_type"]:
+        speedup = row["legacy_us"] / row["fast_us"] if row["fast_us"] else 0.0
+        print(
+            f"  {row['type']:<12}{row['events']:>5}{row['avg_bytes']:>12,}"
+            f"{row['legacy_us']:>12.2f}{row['fast_us']:>12.2f}{speedup:>8.1f}x"
+        )
+    speedup = report["legacy_us"] / report["fast_us"] if report["fast_us"] else 0.0
+    print(f"  {'all':<12}{report['events']:>5}{'':>12}{report['legacy_us']:>12.2f}{report['fast_us']:>12.2f}{speedup:>8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark stream-json parsing")
+    parser.add_argument("fixtures", nargs="*", help="Transcript files (default: benchmarks/fixtures/*.jsonl)")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    paths = [Path(p) for p in args.fixtures] or sorted((ROOT / "benchmarks" / "fixtures").glob("*.jsonl"))
+    reports = [run_fixture(path, args.repeat) for path in paths]
+
+    backend = "orjson" if stream_parser.orjson is not None else "json"
+    if args.json:
+        print(json.dumps({"backend": backend, "repeat": args.repeat, "fixtures": reports}, indent=2))
+        return
+    print(f"JSON backend: {backend}, repeat: {args.repeat}\n")
+    for report in reports:
+        _print_report(report)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,250 @@
-"""Context aggregation: auto-recall relevant memory before agent runs."""
+"""Context aggregation: build the prompt for an agent run within a token budget.
 
-import re
+Candidate blocks (thread history, open tasks, recalled memory) are split
+into items, each with an estimated token count and a priority. ``pack``
+keeps the highest priority items that fit the budget left after the user's
+own message and the paths of files they sent; ``build_prompt`` renders them in a fixed
+layout, most stable block first, so identical context produces
+byte-identical prompt prefixes the model-side prompt cache can reuse.
+"""
+
+import os
+from datetime import datetime
 from pathlib import Path
-from typing import List
-
-from core_tools._utils import load_json
-
-# Stop words for keyword extraction (English + Czech)
-_STOP_WORDS = {
-    # English
-    "the", "is", "it", "to", "and", "of", "in", "for", "on", "with",
-    "this", "that", "are", "was", "not", "but", "what", "how", "can",
-    "have", "has", "had", "will", "would", "could", "should", "been",
-    "from", "they", "them", "their", "there", "then", "than", "when",
-    "where", "which", "who", "whom", "whose", "some", "any", "all",
-    "each", "every", "both", "more", "most", "other", "into", "over",
-    "such", "only", "also", "just", "about", "very", "much", "many",
-    # Czech
-    "a", "ale", "ani", "asi", "bez", "bude", "budu", "by", "byl", "byla",
-    "byli", "bylo", "být", "co", "jak", "jako", "je", "jeho", "jej", "její",
-    "jejich", "jen", "ještě", "jí", "jiné", "jsou", "jsem", "jsi", "jsme",
-    "jste", "kam", "kde", "kdo", "když", "která", "které", "který",
-    "mají", "mám", "máš", "máte", "mně", "moc", "moje", "moji",
-    "mohou", "možná", "můj", "musí", "může", "nad", "nam", "nám",
-    "naše", "nebo", "než", "nic", "ona", "oni", "ono", "pak", "pod",
-    "podle", "pro", "proč", "proto", "protože", "před", "přes", "při",
-    "snad", "tak", "také", "taky", "tam", "toho", "tohle", "tom",
-    "tomu", "tuto", "tvoje", "tvůj", "tyto", "už", "velmi", "ze", "že",
-}
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core_tools._memory_index import load_memory
+from core_tools._ranking import rank
+from core_tools._storage import collection
+from core_tools._utils import parse_dt
+from core_tools._vectors import recall_mode, vector_rank
+from telemetry import append_record, metrics_enabled
 
 MAX_RESULTS = 10
-MAX_CONTEXT_CHARS = 2000
+# Chat messages are noisy: ignore words shorter than this when recalling
+MIN_KEYWORD_LEN = 4
+# Vector recall: weight against the best keyword hit, and the cosine a
+# vector-only hit needs to count (below that n-gram overlap is noise)
+VECTOR_WEIGHT = 1.0
+MIN_VECTOR_SCORE = 0.15
 
+# Rough estimate without a tokenizer; Czech runs a little denser than English
+CHARS_PER_TOKEN = 4
+DEFAULT_BUDGET_TOKENS = 3000
+# A single thread message, fact or task is cut to this many tokens
+MAX_ITEM_TOKENS = 150
+MAX_OPEN_TASKS = 20
+TASK_SOON_DAYS = 7
 
-def _extract_keywords(text: str) -> set:
-    """Extract meaningful keywords from text (>3 chars, not stop words)."""
-    words = set()
-    for word in re.findall(r"\w+", text.lower()):
-        if len(word) > 3 and word not in _STOP_WORDS:
-            words.add(word)
-    return words
+# Rendering order, most stable first (open tasks do not depend on the message, recalled
+# memory does) and base priorities; the user's message always goes last
+BLOCKS = ("history", "tasks", "memory")
+HEADERS = {
+    "history": "[Thread history]",
+    "tasks": "[Open tasks]",
+    "memory": "[Memory context]",
+}
+MESSAGE_HEADER = "[Current message]"
+HISTORY_PRIORITY = 1.0
+MEMORY_PRIORITY = 0.5
+TASK_PRIORITY = 0.25
 
 
-def recall_memory(workspace: Path, text: str) -> str:
-    """Search memory.json for facts relevant to the user's message.
+class Candidate:
+    """One line of context competing for a place in the prompt."""
 
-    Returns a formatted context string to prepend to the prompt,
-    or empty string if nothing relevant found.
-    """
-    memory_path = workspace / "data" / "memory.json"
-    items: List[dict] = load_json(memory_path, [])
+    __slots__ = ("block", "text", "priority", "order", "tokens")
+
+    def __init__(self, block: str, text: str, priority: float, order: int) -> None:
+        self.block = block
+        self.text = text
+        self.priority = priority
+        self.order = order
+        self.tokens = estimate_tokens(text)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def budget_tokens() -> int:
+    raw = os.environ.get("AIDE_PROMPT_BUDGET_TOKENS", "").strip()
+    try:
+        return max(0, int(raw)) if raw else DEFAULT_BUDGET_TOKENS
+    except ValueError:
+        return DEFAULT_BUDGET_TOKENS
+
+
+def tasks_enabled() -> bool:
+    raw = os.environ.get("AIDE_CONTEXT_TASKS", "1").strip().lower()
+    return raw not in ("0", "false", "no", "off")
+
+
+def _clip(text: str, max_tokens: int = MAX_ITEM_TOKENS) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def _combine(keyword: List[Tuple[str, float]], vector: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    """Keyword scores scaled to 0..1 plus weighted cosine similarity."""
+    top = keyword[0][1] if keyword else 0.0
+    scores: Dict[str, float] = {mem_id: score / top for mem_id, score in keyword} if top else {}
+    for mem_id, similarity in vector:
+        scores[mem_id] = scores.get(mem_id, 0.0) + VECTOR_WEIGHT * similarity
+    return sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+
+
+def recall_facts(workspace: Path, text: str, limit: int = MAX_RESULTS) -> List[Tuple[str, float]]:
+    """Texts of the memory facts most relevant to ``text`` with scores, best first."""
+    items, index = load_memory(workspace)
     if not items:
-        return ""
-
-    keywords = _extract_keywords(text)
-    if not keywords:
-        return ""
-
-    seen_ids: set = set()
-    results: list = []
-
-    for keyword in keywords:
-        for item in items:
-            item_id = item.get("id", "")
-            if item_id in seen_ids:
-                continue
-            if keyword in str(item.get("text", "")).lower():
-                results.append(item)
-                seen_ids.add(item_id)
-                if len(results) >= MAX_RESULTS:
-                    break
-        if len(results) >= MAX_RESULTS:
-            break
-
-    if not results:
-        return ""
-
-    lines = ["[Memory context]"]
-    total = 0
-    for r in results:
-        entry = f"- {r.get('text', '')}"
-        total += len(entry)
-        if total > MAX_CONTEXT_CHARS:
-            break
-        lines.append(entry)
-
-    return "\n".join(lines)
+        return []
+
+    # Best facts first (BM25 + recency); only items sharing a term are scored
+    mode = recall_mode()
+    ranked = rank(index, text, limit=limit, min_len=MIN_KEYWORD_LEN) if mode != "vector" else []
+    if mode != "keyword":
+        nearest = vector_rank(workspace, items, index["memory_stamp"], text, limit, MIN_VECTOR_SCORE)
+        ranked = _combine(ranked, nearest)
+
+    facts = []
+    for item_id, score in ranked[:limit]:
+        if item_id in items:
+            facts.append((str(items[item_id].get("text", "")), score))
+    return facts
+
+
+def open_tasks(workspace: Path, now: Optional[datetime] = None) -> List[Tuple[str, float]]:
+    """Open tasks as display lines with an urgency in 0..1, most urgent first."""
+    now = now or datetime.now()
+    lines = []
+    for task in collection(workspace, "tasks").find(status="open"):
+        line = f"- {task.get('title', '')}"
+        urgency = 0.0
+        due = parse_dt(task.get("due"))
+        if due is not None:
+            line += f" (due {task['due']})"
+            if due.tzinfo is not None:
+                due = due.replace(tzinfo=None)
+            if (due - now).days < TASK_SOON_DAYS:
+                urgency += 0.5
+        if task.get("priority"):
+            line += f" [{task['priority']}]"
+            if str(task["priority"]).lower() in ("high", "urgent", "1"):
+                urgency += 0.5
+        if task.get("project"):
+            line += f" #{task['project']}"
+        lines.append((line, urgency))
+    lines.sort(key=lambda pair: (-pair[1], pair[0]))
+    return lines[:MAX_OPEN_TASKS]
+
+
+def message_text(text: Optional[str], attachments: Sequence[str] = ()) -> str:
+    """The user's message followed by the paths of files they sent."""
+    base = text.strip() if text else ""
+    if not attachments:
+        return base
+    listing = "\n".join(f"- {p}" for p in attachments)
+    if base:
+        return f"{base}\n\nAttachments:\n{listing}"
+    return f"Attachment received:\n{listing}"
+
+
+def candidates(
+    history: Sequence[Dict[str, str]] = (),
+    facts: Sequence[Tuple[str, float]] = (),
+    tasks: Sequence[Tuple[str, float]] = (),
+) -> List[Candidate]:
+    """Score every item: newer thread messages first, then memory and tasks."""
+    out = []
+    for i, msg in enumerate(history):
+        role_label = "User" if msg.get("role") == "user" else "Aide"
+        recency = (i + 1) / len(history)
+        line = f"{role_label}: {_clip(msg.get('content', ''))}"
+        out.append(Candidate("history", line, HISTORY_PRIORITY + recency, i))
+    top = max((score for _, score in facts), default=0.0) or 1.0
+    for i, (fact, score) in enumerate(facts):
+        out.append(Candidate("memory", f"- {_clip(fact)}", MEMORY_PRIORITY + score / top, i))
+    for i, (line, urgency) in enumerate(tasks):
+        out.append(Candidate("tasks", _clip(line), TASK_PRIORITY + urgency * TASK_PRIORITY, i))
+    return out
+
+
+def pack(items: Sequence[Candidate], budget: int) -> Tuple[List[Candidate], List[Candidate]]:
+    """Greedy by priority: (kept in original order, dropped).
+
+    An item that does not fit is skipped, a smaller lower-priority one may
+    still fit.
+    """
+    kept: List[Candidate] = []
+    dropped: List[Candidate] = []
+    used = 0
+    for item in sorted(items, key=lambda c: (-c.priority, c.block, c.order)):
+        if used + item.tokens <= budget:
+            kept.append(item)
+            used += item.tokens
+        else:
+            dropped.append(item)
+    kept.sort(key=lambda c: (c.block, c.order))
+    return kept, dropped
+
+
+def _log_dropped(workspace: Path, budget: int, kept: List[Candidate], dropped: List[Candidate]) -> None:
+    counts: Dict[str, int] = {}
+    for item in dropped:
+        counts[item.block] = counts.get(item.block, 0) + 1
+    summary = ", ".join(f"{block}={n}" for block, n in sorted(counts.items()))
+    print(f"[INFO] Prompt budget {budget} tokens: dropped {summary}")
+    if not metrics_enabled():
+        return
+    try:
+        append_record(
+            workspace,
+            "prompt_budget",
+            {
+                "ts": datetime.now().isoformat(),
+                "budget": budget,
+                "kept_tokens": sum(item.tokens for item in kept),
+                "dropped_tokens": sum(item.tokens for item in dropped),
+                "dropped": counts,
+            },
+        )
+    except OSError:
+        pass
+
+
+def build_prompt(
+    workspace: Path,
+    text: Optional[str],
+    attachments: Sequence[str] = (),
+    history: Sequence[Dict[str, str]] = (),
+    recall: bool = False,
+) -> str:
+    """The prompt for one user message, with as much context as the budget allows.
+
+    ``history`` is the earlier thread conversation as {role, content} dicts,
+    oldest first. Memory and open tasks are added only when ``recall`` is
+    set (new sessions; a resumed one already has them).
+    """
+    facts = recall_facts(workspace, text or "") if recall and text else []
+    tasks = open_tasks(workspace) if recall and tasks_enabled() else []
+    items = candidates(history, facts, tasks)
+
+    # The message and its attachment paths are never dropped (the agent must be
+    # able to open what was just sent); context gets what remains
+    message = message_text(text, attachments)
+    budget = budget_tokens()
+    remaining = max(0, budget - estimate_tokens(message))
+    kept, dropped = pack(items, remaining)
+    if dropped:
+        _log_dropped(workspace, budget, kept, dropped)
+
+    by_block: Dict[str, List[str]] = {}
+    for item in kept:
+        by_block.setdefault(item.block, []).append(item.text)
+
+    blocks = [HEADERS[block] + "\n" + "\n".join(by_block[block]) for block in BLOCKS if by_block.get(block)]
+    if not blocks:
+        return message
+    blocks.append(f"{MESSAGE_HEADER}\n{message}")
+    return "\n\n".join(blocks)
@@ -0,0 +1,70 @@
+"""Shared options of the tools' ``list`` subcommands.
+
+Each tool narrows the rows with its own filters (equality filters go to
+the store, where SQLite can use an index); ``select`` then applies the
+common ones: ``--match`` text search, ``--sort``, ``--offset``/``--limit``
+paging and ``--fields`` projection, or ``--count`` for just the number.
+Without any of them the output is the full list, exactly as before.
+"""
+
+import argparse
+from typing import Any, Dict, List, Sequence, Tuple
+
+try:
+    from ._ranking import fold
+except ImportError:  # loaded by a script run from core_tools/
+    from _ranking import fold
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--match", default=None, help="Text search, ignores case and diacritics")
+    parser.add_argument("--sort", default=None, help="Field to sort by")
+    parser.add_argument("--desc", action="store_true", help="Sort descending")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--offset", type=int, default=0, help="Skip this many rows (next_offset of a previous page)")
+    parser.add_argument("--fields", default=None, help="Comma-separated fields to return, e.g. id,title,due")
+    parser.add_argument("--count", action="store_true", help="Return only the number of matching rows")
+
+
+def _sort_key(value: Any) -> Tuple[int, float, str]:
+    # Numbers before text, each in natural order (ISO dates sort as text)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, float(value), "")
+    return (1, 0.0, str(value))
+
+
+def sort_items(items: List[Dict[str, Any]], field: str, desc: bool = False) -> List[Dict[str, Any]]:
+    """Stable sort by one field; rows without it go last in either direction."""
+    present = [item for item in items if item.get(field) is not None]
+    missing = [item for item in items if item.get(field) is None]
+    present.sort(key=lambda item: _sort_key(item[field]), reverse=desc)
+    return present + missing
+
+
+def select(items: List[Dict[str, Any]], args: argparse.Namespace, text_fields: Sequence[str]) -> Dict[str, Any]:
+    """The tool result for ``items`` after the common list options."""
+    if args.match:
+        query = fold(args.match)
+        items = [
+            item
+            for item in items
+            if query in fold(" ".join(str(item.get(field) or "") for field in text_fields))
+        ]
+    total = len(items)
+    if args.count:
+        return {"success": True, "data": {"count": total}}
+    if args.sort:
+        items = sort_items(items, args.sort, args.desc)
+
+    offset = max(0, args.offset or 0)
+    end = total if args.limit is None else offset + max(0, args.limit)
+    page = items[offset:end]
+    if args.fields:
+        fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+        page = [{field: item.get(field) for field in fields} for item in page]
+
+    result: Dict[str, Any] = {"success": True, "data": page}
+    if args.limit is not None or offset:
+        result["total"] = total
+        result["next_offset"] = offset + len(page) if offset + len(page) < total else None
+    return result
@@ -0,0 +1,172 @@
+"""Inverted index over memory.json: term -> {memory id: term frequency}.
+
+Terms come from ``_ranking.analyze`` (folded, stemmed, no stop words), and
+per-item lengths and created dates are kept for BM25 and recency scoring.
+
+Persisted as data/memory_index.json together with the stamp of the memory
+store it describes (mtime and size of memory.json, or the revision in
+aide.db). ``memory_manage.py add/forget`` patch it in place; any other
+change to the memory (hand edits, older tools) shows up as a stamp
+mismatch and triggers a rebuild on the next load. Long-running bot
+processes keep items and index in RAM and only re-read them when they
+change.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+try:
+    from ._ranking import analyze
+    from ._storage import Stamp, collection, file_stamp
+    from ._utils import atomic_write_json, load_json
+except ImportError:  # loaded by a script run from core_tools/
+    from _ranking import analyze
+    from _storage import Stamp, collection, file_stamp
+    from _utils import atomic_write_json, load_json
+
+
+# Bump whenever analyze() changes: older indexes are then rebuilt
+INDEX_VERSION = 3
+
+# path -> (stamp, value): parsed files reused while unchanged on disk
+_CACHE: Dict[str, Tuple[Stamp, Any]] = {}
+
+
+def index_path(workspace: Path) -> Path:
+    return workspace / "data" / "memory_index.json"
+
+
+def tokenize(text: str) -> Dict[str, int]:
+    """Term frequencies of the analyzed text."""
+    freqs: Dict[str, int] = {}
+    for term in analyze(text):
+        freqs[term] = freqs.get(term, 0) + 1
+    return freqs
+
+
+def _cached(path: Path, default: Any) -> Any:
+    stamp = file_stamp(path)
+    hit = _CACHE.get(str(path))
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    value = load_json(path, default)
+    _CACHE[str(path)] = (stamp, value)
+    return value
+
+
+def _empty() -> Dict[str, Any]:
+    return {
+        "version": INDEX_VERSION,
+        "memory_stamp": None,
+        "postings": {},
+        "docs": {},
+        "total_len": 0,
+        "newest": None,
+    }
+
+
+def _add_doc(index: Dict[str, Any], item: Dict[str, Any]) -> None:
+    mem_id = str(item.get("id", ""))
+    if not mem_id:
+        return
+    freqs = tokenize(str(item.get("text", "")))
+    postings = index["postings"]
+    for token, tf in freqs.items():
+        postings.setdefault(token, {})[mem_id] = tf
+    previous = index["docs"].get(mem_id)
+    if previous:
+        index["total_len"] -= previous.get("len", 0)
+    index["docs"][mem_id] = {"len": sum(freqs.values()), "created": item.get("created")}
+    index["total_len"] += index["docs"][mem_id]["len"]
+    created = item.get("created")
+    # Upper bound for the recency boost; not lowered on forget
+    if created and str(created) > str(index.get("newest") or ""):
+        index["newest"] = str(created)
+
+
+def _remove_doc(index: Dict[str, Any], item: Dict[str, Any]) -> None:
+    mem_id = str(item.get("id", ""))
+    postings = index["postings"]
+    for token in tokenize(str(item.get("text", ""))):
+        ids = postings.get(token)
+        if ids is None:
+            continue
+        ids.pop(mem_id, None)
+        if not ids:
+            del postings[token]
+    doc = index["docs"].pop(mem_id, None)
+    if doc:
+        index["total_len"] -= doc.get("len", 0)
+
+
+def build_index(items: Iterable[Dict[str, Any]], stamp: Stamp) -> Dict[str, Any]:
+    index = _empty()
+    for item in items:
+        _add_doc(index, item)
+    index["memory_stamp"] = stamp
+    return index
+
+
+def _valid(index: Any, stamp: Stamp) -> bool:
+    return (
+        isinstance(index, dict)
+        and index.get("version") == INDEX_VERSION
+        and stamp is not None
+        and index.get("memory_stamp") == stamp
+    )
+
+
+def update_index(
+    workspace: Path,
+    before: Stamp,
+    after: Stamp,
+    store: Any,
+    added: Iterable[Dict[str, Any]] = (),
+    removed: Iterable[Dict[str, Any]] = (),
+) -> None:
+    """Apply an add/forget that just changed the memory store.
+
+    ``before`` and ``after`` are the memory store stamps around the write;
+    when the index did not match ``before``, it is rebuilt from ``store``.
+    """
+    path = index_path(workspace)
+    index = load_json(path, None)
+    if _valid(index, before):
+        for item in removed:
+            _remove_doc(index, item)
+        for item in added:
+            _add_doc(index, item)
+        index["memory_stamp"] = after
+    else:
+        index = build_index(store.all(), after)
+    atomic_write_json(path, index)
+
+
+def _items_by_id(workspace: Path, store: Any, stamp: Stamp) -> Dict[str, Dict[str, Any]]:
+    key = f"{workspace}#memory"
+    hit = _CACHE.get(key)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    by_id = {str(item.get("id", "")): item for item in store.all()}
+    _CACHE[key] = (stamp, by_id)
+    return by_id
+
+
+def load_memory(workspace: Path) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Any]]:
+    """Memory items by id plus a matching index, rebuilding a stale one."""
+    store = collection(workspace, "memory")
+    stamp = store.stamp()
+    if stamp is None:
+        return {}, _empty()
+    items = _items_by_id(workspace, store, stamp)
+    index = _cached(index_path(workspace), None)
+    if not _valid(index, stamp):
+        index = build_index(items.values(), stamp)
+        path = index_path(workspace)
+        try:
+            atomic_write_json(path, index)
+            _CACHE[str(path)] = (file_stamp(path), index)
+        except OSError:
+            pass
+    return items, index
+
@@ -0,0 +1,176 @@
+"""Tool output formats: ``json`` (default) and ``compact``.
+
+``compact`` is for the model's context, where every token of a list is
+read: a ``#`` header line, then one tab-separated row per item under a
+column line. Columns that are empty in every row are dropped, and so is
+bookkeeping (``created``, ``remind_sent_at``) unless asked for with
+``--fields``. A value shared by every row is stated once in the header.
+UUIDs are cut to ``ID_PREFIX_LEN`` characters (more where another id in
+the store shares the prefix), which the tools accept back wherever an id
+is expected, and timestamps lose zero seconds and
+microseconds. ``AIDE_TOOL_FORMAT`` sets the default.
+"""
+
+import argparse
+import bisect
+import json
+import os
+import re
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+FORMATS = ("json", "compact")
+ID_PREFIX_LEN = 8
+# Dropped from compact rows unless listed in --fields
+BOOKKEEPING_FIELDS = ("created", "remind_sent_at")
+
+# Ids in the store starting with any of the given prefixes (Collection.ids_starting_with)
+IdLookup = Callable[[Tuple[str, ...]], Iterable[str]]
+
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+_TIMESTAMP = re.compile(r"^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2})(?::(\d{2})(?:\.\d+)?)?(.*)$")
+
+
+def default_format() -> str:
+    raw = os.environ.get("AIDE_TOOL_FORMAT", "json").strip().lower()
+    return raw if raw in FORMATS else "json"
+
+
+def add_format_argument(parser: argparse.ArgumentParser, subparsers: Any) -> None:
+    """``--format`` before or after the subcommand (call once all subcommands exist)."""
+    parser.add_argument(
+        "--format", choices=FORMATS, default=None, help="Output format (default: AIDE_TOOL_FORMAT or json)"
+    )
+    for sub in subparsers.choices.values():
+        sub.add_argument("--format", choices=FORMATS, default=argparse.SUPPRESS)
+
+
+def chosen_format(args: argparse.Namespace) -> str:
+    return getattr(args, "format", None) or default_format()
+
+
+def _short_ids(ids: Iterable[str], lookup: Optional[IdLookup] = None) -> Dict[str, str]:
+    """UUID -> its first ``ID_PREFIX_LEN`` characters, longer where it would match another id.
+
+    ``lookup`` finds the store's ids sharing those first characters: a
+    prefix unique among the printed rows only could still name an item a
+    filter or page left out. Only ids that share them can collide.
+    """
+    shown = {i for i in ids if _UUID.match(i)}
+    prefixes = tuple({i[:ID_PREFIX_LEN] for i in shown})
+    uuids = sorted(shown.union(lookup(prefixes) if lookup and prefixes else ()))
+    out: Dict[str, str] = {}
+    for full in shown:
+        pos = bisect.bisect_left(uuids, full)
+        length = ID_PREFIX_LEN
+        # Sorted order: the longest shared prefix is with a neighbour
+        for other in uuids[max(0, pos - 1) : pos + 2]:
+            if other != full:
+                while length < len(full) and other[:length] == full[:length]:
+                    length += 1
+        out[full] = full[:length]
+    return out
+
+
+def _cell(value: Any, short: Dict[str, str]) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, (list, tuple)):
+        return ",".join(_cell(v, short) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    text = str(value)
+    if text in short:
+        return short[text]
+    match = _TIMESTAMP.match(text)
+    if match:
+        date, hm, seconds, rest = match.groups()
+        text = f"{date} {hm}" + (f":{seconds}" if seconds and seconds != "00" else "") + rest
+    # Keep one row per line and one column per tab
+    return text.replace("\t", " ").replace("\r", "").replace("\n", "\\n")
+
+
+def _table(
+    rows: List[Dict[str, Any]], header: List[str], fields: Optional[List[str]], lookup: Optional[IdLookup]
+) -> str:
+    short = _short_ids((str(row.get("id")) for row in rows), lookup)
+    columns: List[str] = []
+    for row in rows:
+        for key in row:
+            if key not in columns and (fields or key not in BOOKKEEPING_FIELDS):
+                columns.append(key)
+    columns = [c for c in columns if any(row.get(c) not in (None, "") for row in rows)]
+
+    # A value every row shares goes into the header once (ids never do)
+    if len(rows) > 1:
+        for column in list(columns):
+            values = {json.dumps(row.get(column), sort_keys=True) for row in rows}
+            if column != "id" and len(values) == 1:
+                header.append(f"{column}={_cell(rows[0].get(column), short)}")
+                columns.remove(column)
+
+    lines = ["# " + "; ".join(header)]
+    if columns:
+        lines.append("\t".join(columns))
+        lines.extend("\t".join(_cell(row.get(c), short) for c in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def _fields(value: Dict[str, Any], lookup: Optional[IdLookup]) -> str:
+    short = _short_ids((str(v) for v in value.values()), lookup)
+    return " ".join(f"{key}={_cell(v, short)}" for key, v in value.items() if v is not None)
+
+
+def render_compact(
+    result: Dict[str, Any], fields: Optional[List[str]] = None, lookup: Optional[IdLookup] = None
+) -> str:
+    if not result.get("success") and "data" not in result:
+        return f"error: {result.get('error', 'failed')}"
+    data = result.get("data")
+
+    if isinstance(data, list):
+        header = [f"{len(data)} rows"]
+        if "total" in result:
+            header[0] = f"{len(data)} of {result['total']} rows"
+            if result.get("next_offset") is not None:
+                header.append(f"next_offset={result['next_offset']}")
+        return _table([row for row in data if isinstance(row, dict)], header, fields, lookup)
+
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        # batch: one line per operation, in input order
+        lines = [f"# {'ok' if result.get('success') else 'error: ' + str(result.get('error'))}"]
+        for n, item in enumerate(data["results"], 1):
+            if item.get("success"):
+                lines.append(f"{n}\tok\t{_fields(item.get('data') or {}, lookup)}".rstrip())
+            else:
+                lines.append(f"{n}\terror\t{item.get('error', '')}")
+        return "\n".join(lines)
+
+    if isinstance(data, dict):
+        return f"ok {_fields(data, lookup)}".rstrip()
+    return "ok"
+
+
+def render(
+    result: Dict[str, Any], fmt: str = "json", fields: Optional[List[str]] = None, lookup: Optional[IdLookup] = None
+) -> str:
+    if fmt == "compact":
+        return render_compact(result, fields, lookup)
+    return json.dumps(result, ensure_ascii=False)
+
+
+def emit(result: Dict[str, Any], args: Optional[argparse.Namespace] = None, store: Any = None) -> None:
+    """Print a tool result in the chosen format; a failed one exits with status 1.
+
+    ``store`` is the collection the result came from; compact output looks
+    up the ids sharing a printed prefix so every short id is unique in it.
+    """
+    fmt = chosen_format(args) if args is not None else default_format()
+    raw_fields = getattr(args, "fields", None)
+    fields = [f.strip() for f in raw_fields.split(",") if f.strip()] if raw_fields else None
+    lookup = store.ids_starting_with if fmt == "compact" and store is not None else None
+    print(render(result, fmt, fields, lookup))
+    if not result.get("success"):
+        sys.exit(1)
@@ -0,0 +1,195 @@
+"""Text analysis and BM25 + recency ranking for memory search.
+
+Shared by ``memory_manage.py search`` and ``context.recall_facts`` so the
+CLI and the auto-recall agree on what "most relevant" means. Terms are
+lowercased, stripped of diacritics (``přes`` == ``pres``) and lightly
+stemmed, which is enough to match most Czech and English inflections
+without a dictionary.
+"""
+
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from ._utils import parse_dt
+except ImportError:  # loaded by a script run from core_tools/
+    from _utils import parse_dt
+
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Partial-word matches ("deploy" -> "deployment") count this much of a full hit
+PREFIX_WEIGHT = 0.5
+MIN_PREFIX_LEN = 4
+# Fresh facts get up to +30 %, halving every 90 days
+RECENCY_WEIGHT = 0.3
+RECENCY_HALF_LIFE_DAYS = 90.0
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+# Stop words (English + Czech), stored folded
+STOP_WORDS = {
+    fold(word)
+    for word in (
+        # English
+        "the", "is", "it", "to", "and", "of", "in", "for", "on", "with",
+        "this", "that", "are", "was", "not", "but", "what", "how", "can",
+        "have", "has", "had", "will", "would", "could", "should", "been",
+        "from", "they", "them", "their", "there", "then", "than", "when",
+        "where", "which", "who", "whom", "whose", "some", "any", "all",
+        "each", "every", "both", "more", "most", "other", "into", "over",
+        "such", "only", "also", "just", "about", "very", "much", "many",
+        # Czech
+        "a", "i", "k", "o", "s", "u", "v", "z", "do", "ke", "na", "od", "po", "se", "si",
+        "ta", "to", "ty", "ve", "za", "ten", "ale", "ani", "asi", "bez", "bude", "budu", "by", "byl", "byla",
+        "byli", "bylo", "být", "co", "jak", "jako", "je", "jeho", "jej", "její",
+        "jejich", "jen", "ještě", "jí", "jiné", "jsou", "jsem", "jsi", "jsme",
+        "jste", "kam", "kde", "kdo", "když", "která", "které", "který",
+        "mají", "mám", "máš", "máte", "mně", "moc", "moje", "moji",
+        "mohou", "možná", "můj", "musí", "může", "nad", "nam", "nám",
+        "naše", "nebo", "než", "nic", "ona", "oni", "ono", "pak", "pod",
+        "podle", "pro", "proč", "proto", "protože", "před", "přes", "při",
+        "snad", "tak", "také", "taky", "tam", "toho", "tohle", "tom",
+        "tomu", "tuto", "tvoje", "tvůj", "tyto", "už", "velmi", "ze", "že",
+    )
+}
+
+# Longest first; applied to folded tokens, at most one suffix per token
+_SUFFIXES = sorted(
+    {
+        # English
+        "ingly", "edly", "ings", "ing", "ies", "ied", "ed", "es", "ly", "s",
+        # Czech noun/adjective/verb endings (folded)
+        "ovani", "ovat", "oval", "ovala", "ovali", "ovany", "ovana", "ovane",
+        "ujeme", "ujete", "ujes", "ujou", "uje", "uji", "uju",
+        "ovy", "ova", "ove", "ovi", "ovo",
+        "ami", "emi", "ach", "ech", "ich", "ych", "ymi", "imi", "ata", "aty",
+        "eho", "emu", "imu", "ymu", "ou", "em", "om", "ho", "mu", "at", "et", "it",
+        "a", "e", "i", "o", "u", "y",
+    },
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LEN = 3
+
+
+def stem(token: str) -> str:
+    """Strip one common inflectional suffix, keeping at least MIN_STEM_LEN chars."""
+    if token.isdigit():
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LEN:
+            return token[: -len(suffix)]
+    return token
+
+
+def analyze(text: str, min_len: int = 2) -> List[str]:
+    """Folded, stemmed terms of ``text`` without stop words (repeats kept)."""
+    terms = []
+    for word in re.findall(r"\w+", fold(text)):
+        if len(word) < min_len or word in STOP_WORDS:
+            continue
+        terms.append(stem(word))
+    return terms
+
+
+def _age_days(created: Optional[str], now: datetime) -> Optional[float]:
+    dt = parse_dt(created)
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None)
+    return max(0.0, (now - dt).total_seconds() / 86400)
+
+
+def recency_boost(created: Optional[str], now: Optional[datetime] = None) -> float:
+    age = _age_days(created, now or datetime.now())
+    if age is None:
+        return 1.0
+    return 1.0 + RECENCY_WEIGHT * 0.5 ** (age / RECENCY_HALF_LIFE_DAYS)
+
+
+def prefix_terms(index: Dict[str, Any], prefix: str) -> List[str]:
+    """Index terms starting with ``prefix`` (bisect over the sorted vocabulary)."""
+    vocab = index.get("_vocab")
+    if vocab is None:
+        # Not persisted: built once per loaded index
+        vocab = index["_vocab"] = sorted(index["postings"])
+    terms = []
+    pos = bisect.bisect_left(vocab, prefix)
+    while pos < len(vocab) and vocab[pos].startswith(prefix):
+        terms.append(vocab[pos])
+        pos += 1
+    return terms
+
+
+def _expand(index: Dict[str, Any], term: str) -> List[Tuple[str, float]]:
+    """The term itself plus, for longer terms, vocabulary entries it prefixes."""
+    expanded = [(term, 1.0)] if term in index["postings"] else []
+    if len(term) >= MIN_PREFIX_LEN:
+        expanded.extend((other, PREFIX_WEIGHT) for other in prefix_terms(index, term) if other != term)
+    return expanded
+
+
+def rank(
+    index: Dict[str, Any],
+    query: str,
+    limit: Optional[int] = None,
+    min_len: int = 2,
+    now: Optional[datetime] = None,
+) -> List[Tuple[str, float]]:
+    """(memory id, score) pairs best first, scored by BM25 times a recency boost.
+
+    Only ids that appear in the postings of the query terms are scored.
+    """
+    docs = index["docs"]
+    if not docs:
+        return []
+    n_docs = len(docs)
+    avg_len = index.get("total_len", 0) / n_docs or 1.0
+
+    scores: Dict[str, float] = {}
+    for term in dict.fromkeys(analyze(query, min_len)):
+        for vocab_term, weight in _expand(index, term):
+            postings = index["postings"][vocab_term]
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for mem_id, tf in postings.items():
+                doc_len = docs.get(mem_id, {}).get("len", 0)
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)
+                scores[mem_id] = scores.get(mem_id, 0.0) + weight * idf * tf * (BM25_K1 + 1) / norm
+
+    now = now or datetime.now()
+    # No item can get more than the newest one's boost
+    max_boost = recency_boost(index.get("newest"), now) if index.get("newest") else 1 + RECENCY_WEIGHT
+    boosts: Dict[Optional[str], float] = {}
+    ranked: List[Tuple[str, float]] = []
+    best: List[float] = []  # min-heap of the top ``limit`` boosted scores
+    for mem_id, score in sorted(scores.items(), key=lambda pair: -pair[1]):
+        # Once even the largest boost cannot lift a score above the current
+        # limit-th result, nothing further down can either
+        if limit is not None and len(best) >= limit and score * max_boost <= best[0]:
+            break
+        created = docs.get(mem_id, {}).get("created")
+        if created not in boosts:
+            boosts[created] = recency_boost(created, now)
+        boosted = score * boosts[created]
+        ranked.append((mem_id, boosted))
+        if limit is not None:
+            if len(best) < limit:
+                heapq.heappush(best, boosted)
+            elif boosted > best[0]:
+                heapq.heapreplace(best, boosted)
+    # Ties: newer first, then id, so the order is stable across runs
+    ranked.sort(key=lambda pair: (str(docs.get(pair[0], {}).get("created") or ""), pair[0]), reverse=True)
+    ranked.sort(key=lambda pair: -pair[1])
+    return ranked[:limit] if limit is not None else ranked
@@ -0,0 +1,773 @@
+"""Storage for workspace records: JSON files, a JSON journal or a SQLite (WAL) database.
+
+Two kinds of stores:
+
+- collections (memory, tasks, cron, projects): lists of dicts with an ``id``
+- maps (sessions, sessions_slack, slack_thread_seen): key -> JSON value
+
+The ``json`` backend keeps the historical data/<name>.json files, each write
+rewriting the whole file under ``file_lock``. The ``sqlite`` backend keeps
+everything in data/aide.db: one row per record (the record itself stored as
+JSON, so output stays byte-for-byte the same), point lookups and updates by
+primary key, readers never blocked by writers thanks to WAL.
+
+The ``journal`` backend is the light middle ground: the same JSON files
+serve as snapshots, every mutation is appended as one line to
+data/<name>.journal.jsonl, and readers replay the journal over the
+snapshot (incrementally, in long-running processes). Once a journal
+passes ``AIDE_JOURNAL_COMPACT_KB`` it is folded back into the snapshot,
+by the scheduler in the background or, well past the threshold, by the
+writer itself. Replay is idempotent, so a crash mid-compaction is safe.
+
+``AIDE_STORAGE`` picks the backend; unset (``auto``) means sqlite once
+data/aide.db exists, i.e. after ``storage_manage.py migrate``, else json.
+Switching json -> journal needs nothing; journal -> json needs
+``storage_manage.py compact`` first.
+
+Read-modify-write sequences go in ``with store.transaction():`` — an
+exclusive lock on the file, or ``BEGIN IMMEDIATE`` on the database. Single
+calls outside a transaction run in their own.
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from ._utils import atomic_write_json, file_lock, load_json
+except ImportError:  # loaded by a script run from core_tools/
+    from _utils import atomic_write_json, file_lock, load_json
+
+if TYPE_CHECKING:  # imported on first connection: json-backed tools never need it
+    import sqlite3
+
+
+COLLECTIONS = ("memory", "tasks", "cron", "projects")
+MAPS = ("sessions", "sessions_slack", "slack_thread_seen")
+# Fields looked up with find() often enough to deserve an index
+INDEXED_FIELDS = {"tasks": ("status",)}
+BUSY_TIMEOUT_S = 10.0
+# Shorter id prefixes are not looked up (too easy to hit the wrong item)
+MIN_ID_PREFIX = 4
+DEFAULT_COMPACT_KB = 256
+# Writers compact themselves only this far past the threshold (the scheduler does it earlier)
+INLINE_COMPACT_FACTOR = 4
+
+Stamp = Optional[List[int]]
+Collection = Any  # JsonCollection | SqliteCollection
+Mapping = Any  # JsonMapping | SqliteMapping
+
+
+def data_dir(workspace: Path) -> Path:
+    return workspace / "data"
+
+
+def db_path(workspace: Path) -> Path:
+    return data_dir(workspace) / "aide.db"
+
+
+def json_path(workspace: Path, name: str) -> Path:
+    return data_dir(workspace) / f"{name}.json"
+
+
+def file_stamp(path: Path) -> Stamp:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def backend(workspace: Path) -> str:
+    raw = os.environ.get("AIDE_STORAGE", "auto").strip().lower()
+    if raw in ("json", "journal", "sqlite"):
+        return raw
+    return "sqlite" if db_path(workspace).exists() else "json"
+
+
+def collection(workspace: Path, name: str) -> Collection:
+    if name not in COLLECTIONS:
+        raise ValueError(f"Unknown collection: {name}")
+    kind = backend(workspace)
+    if kind == "sqlite":
+        return SqliteCollection(_database(db_path(workspace)), name)
+    if kind == "journal":
+        return JournalCollection(workspace, name)
+    return JsonCollection(json_path(workspace, name))
+
+
+def mapping(workspace: Path, name: str) -> Mapping:
+    if name not in MAPS:
+        raise ValueError(f"Unknown map: {name}")
+    kind = backend(workspace)
+    if kind == "sqlite":
+        return SqliteMapping(_database(db_path(workspace)), name)
+    if kind == "journal":
+        return JournalMapping(workspace, name)
+    return JsonMapping(json_path(workspace, name))
+
+
+def resolve_id(store: Collection, ref: Optional[str]) -> Optional[str]:
+    """The full id ``ref`` names: the id itself or a unique prefix (as compact output prints them)."""
+    if not ref:
+        return None
+    if store.get(ref) is not None:
+        return ref
+    if len(ref) < MIN_ID_PREFIX:
+        return None
+    matches = store.ids_starting_with((ref,))
+    if len(matches) > 1:
+        raise ValueError(f"Ambiguous id prefix: {ref}")
+    return matches[0] if matches else None
+
+
+# --- JSON files ---------------------------------------------------------------
+
+
+class _JsonFile:
+    """Whole-file load/store; inside a transaction changes are written once at the end."""
+
+    empty: Any = None
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._data: Any = None
+        self._dirty = False
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if self._data is not None:
+            yield
+            return
+        with file_lock(self.path):
+            self._data = load_json(self.path, self.empty())
+            self._dirty = False
+            try:
+                yield
+                if self._dirty:
+                    atomic_write_json(self.path, self._data)
+            finally:
+                self._data = None
+
+    def _read(self) -> Any:
+        return self._data if self._data is not None else load_json(self.path, self.empty())
+
+    def stamp(self) -> Stamp:
+        return file_stamp(self.path)
+
+
+class JsonCollection(_JsonFile):
+    empty = list
+
+    def all(self) -> List[Dict[str, Any]]:
+        return [item for item in self._read() if isinstance(item, dict)]
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return next((item for item in self.all() if item.get("id") == item_id), None)
+
+    def find(self, **fields: Any) -> List[Dict[str, Any]]:
+        return [item for item in self.all() if all(item.get(k) == v for k, v in fields.items())]
+
+    def ids_starting_with(self, prefixes: Tuple[str, ...]) -> List[str]:
+        return [str(item["id"]) for item in self.all() if str(item.get("id", "")).startswith(prefixes)]
+
+    def insert(self, item: Dict[str, Any]) -> None:
+        with self.transaction():
+            self._data.append(item)
+            self._dirty = True
+
+    def update(self, item_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge ``changes`` into the item (a None value removes the field)."""
+        with self.transaction():
+            for item in self._data:
+                if isinstance(item, dict) and item.get("id") == item_id:
+                    _apply(item, changes)
+                    self._dirty = True
+                    return item
+        return None
+
+    def delete(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self.transaction():
+            for pos, item in enumerate(self._data):
+                if isinstance(item, dict) and item.get("id") == item_id:
+                    del self._data[pos]
+                    self._dirty = True
+                    return item
+        return None
+
+
+class JsonMapping(_JsonFile):
+    empty = dict
+
+    def get(self, key: str) -> Any:
+        return self._read().get(key)
+
+    def items(self, prefix: str = "") -> Dict[str, Any]:
+        return {k: v for k, v in self._read().items() if k.startswith(prefix)}
+
+    def set(self, key: str, value: Any) -> None:
+        """Store ``value``; None removes the key."""
+        with self.transaction():
+            if value is None:
+                self._dirty = self._data.pop(key, None) is not None or self._dirty
+            else:
+                self._data[key] = value
+                self._dirty = True
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self.transaction():
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                del self._data[k]
+            self._dirty = self._dirty or bool(keys)
+        return len(keys)
+
+
+def _apply(item: Dict[str, Any], changes: Dict[str, Any]) -> None:
+    for field, value in changes.items():
+        if value is None:
+            item.pop(field, None)
+        else:
+            item[field] = value
+
+
+# --- JSON snapshot + journal ----------------------------------------------------
+
+
+def compact_threshold() -> int:
+    raw = os.environ.get("AIDE_JOURNAL_COMPACT_KB", "").strip()
+    try:
+        kb = int(raw) if raw else DEFAULT_COMPACT_KB
+    except ValueError:
+        kb = DEFAULT_COMPACT_KB
+    return max(1, kb) * 1024
+
+
+class _Replayed:
+    """Snapshot plus the journal up to ``offset`` bytes, for one journal file."""
+
+    __slots__ = ("snapshot", "journal_ino", "offset", "data")
+
+    def __init__(self, snapshot: Stamp, journal_ino: int, offset: int, data: Any) -> None:
+        self.snapshot = snapshot
+        self.journal_ino = journal_ino
+        self.offset = offset
+        self.data = data
+
+
+# journal path -> replayed state, extended with new lines while the snapshot is unchanged
+_REPLAYED: Dict[str, _Replayed] = {}
+_REPLAYED_LOCK = threading.Lock()
+
+
+class _JournalFile(ABC):
+    """Snapshot JSON file plus an append-only JSONL journal of mutations.
+
+    Each mutation is one appended line; a transaction only serializes
+    writers (it is not atomic across several mutations).
+    """
+
+    def __init__(self, workspace: Path, name: str) -> None:
+        self.path = json_path(workspace, name)
+        self.journal = data_dir(workspace) / f"{name}.journal.jsonl"
+        self.lock = data_dir(workspace) / f"{name}.journal.lock"
+        self._locked = False
+
+    # Subclasses: state shape and how one record changes it
+    @abstractmethod
+    def _from_snapshot(self, raw: Any) -> Any:
+        """The in-memory state for the snapshot file's parsed content."""
+
+    @abstractmethod
+    def _replay(self, data: Any, record: Dict[str, Any]) -> None:
+        """Apply one journal record to ``data`` in place."""
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if self._locked:
+            yield
+            return
+        with file_lock(self.lock):
+            self._locked = True
+            try:
+                yield
+            finally:
+                self._locked = False
+        if self._journal_size() > compact_threshold() * INLINE_COMPACT_FACTOR:
+            self.compact()
+
+    def _journal_size(self) -> int:
+        try:
+            return self.journal.stat().st_size
+        except OSError:
+            return 0
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        self.journal.parent.mkdir(parents=True, exist_ok=True)
+        with self.journal.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _state(self) -> Any:
+        """Current state (shared, do not mutate); replays only what is new."""
+        with _REPLAYED_LOCK:
+            cached = _REPLAYED.get(str(self.journal))
+            if cached is not None and cached.snapshot == file_stamp(self.path):
+                ino, lines, size = self._read_journal(cached.offset)
+                if ino == cached.journal_ino:
+                    self._apply_lines(cached.data, lines)
+                    cached.offset += size
+                    return cached.data
+            while True:
+                # Compaction replaces the snapshot before the journal: an
+                # unchanged snapshot stamp means the two reads belong together
+                snapshot = file_stamp(self.path)
+                data = self._from_snapshot(load_json(self.path, None))
+                ino, lines, size = self._read_journal(0)
+                if file_stamp(self.path) == snapshot:
+                    break
+            self._apply_lines(data, lines)
+            cached = _REPLAYED[str(self.journal)] = _Replayed(snapshot, ino, size, data)
+            return cached.data
+
+    def _apply_lines(self, data: Any, lines: List[bytes]) -> None:
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                self._replay(data, record)
+
+    def _read_journal(self, start: int) -> Tuple[int, List[bytes], int]:
+        """(inode, complete lines from ``start``, bytes they span) of the journal."""
+        try:
+            with self.journal.open("rb") as f:
+                ino = os.fstat(f.fileno()).st_ino
+                f.seek(start)
+                chunk = f.read()
+        except OSError:
+            return 0, [], 0
+        end = chunk.rfind(b"\n") + 1  # a line still being written is left for later
+        return ino, chunk[:end].splitlines(), end
+
+    def compact(self, force: bool = False) -> bool:
+        """Fold the journal into the snapshot once past the threshold (or ``force``)."""
+        if not self._journal_size():
+            return False
+        with file_lock(self.lock):
+            return self._fold(force)
+
+    def _fold(self, force: bool) -> bool:
+        # Caller holds self.lock
+        size = self._journal_size()
+        if not size or (not force and size < compact_threshold()):
+            return False
+        atomic_write_json(self.path, self._snapshot_data(self._state()))
+        tmp = self.journal.with_suffix(".tmp")
+        tmp.write_bytes(b"")
+        tmp.replace(self.journal)
+        return True
+
+    def _snapshot_data(self, data: Any) -> Any:
+        return data
+
+    def stamp(self) -> Stamp:
+        snapshot = file_stamp(self.path) or [0, 0]
+        try:
+            st = self.journal.stat()
+        except OSError:
+            return snapshot if snapshot != [0, 0] else None
+        return snapshot + [st.st_ino, st.st_size]
+
+
+class JournalCollection(_JournalFile):
+    def _from_snapshot(self, raw: Any) -> Dict[str, Dict[str, Any]]:
+        # id -> item; dict order keeps the file order, replaced items keep their place
+        items = raw if isinstance(raw, list) else []
+        return {_item_key(item, pos): item for pos, item in enumerate(items) if isinstance(item, dict)}
+
+    def _replay(self, data: Dict[str, Dict[str, Any]], record: Dict[str, Any]) -> None:
+        op = record.get("op")
+        if op == "insert" and isinstance(record.get("item"), dict):
+            data[str(record["item"].get("id"))] = record["item"]
+        elif op == "update" and str(record.get("id")) in data:
+            _apply(data[str(record["id"])], record.get("changes") or {})
+        elif op == "delete":
+            data.pop(str(record.get("id")), None)
+
+    def _snapshot_data(self, data: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return list(data.values())
+
+    def all(self) -> List[Dict[str, Any]]:
+        return _clone(list(self._state().values()))
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return _clone(self._state().get(str(item_id)))
+
+    def find(self, **fields: Any) -> List[Dict[str, Any]]:
+        return _clone([item for item in self._state().values() if all(item.get(k) == v for k, v in fields.items())])
+
+    def ids_starting_with(self, prefixes: Tuple[str, ...]) -> List[str]:
+        return [item_id for item_id in self._state() if item_id.startswith(prefixes)]
+
+    def insert(self, item: Dict[str, Any]) -> None:
+        with self.transaction():
+            self._append({"op": "insert", "item": item})
+
+    def update(self, item_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.transaction():
+            item = self.get(item_id)
+            if item is None:
+                return None
+            self._append({"op": "update", "id": item_id, "changes": changes})
+        _apply(item, changes)
+        return item
+
+    def delete(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self.transaction():
+            item = self.get(item_id)
+            if item is None:
+                return None
+            self._append({"op": "delete", "id": item_id})
+        return item
+
+
+class JournalMapping(_JournalFile):
+    def _from_snapshot(self, raw: Any) -> Dict[str, Any]:
+        return dict(raw) if isinstance(raw, dict) else {}
+
+    def _replay(self, data: Dict[str, Any], record: Dict[str, Any]) -> None:
+        op = record.get("op")
+        if op == "set":
+            if record.get("value") is None:
+                data.pop(str(record.get("key")), None)
+            else:
+                data[str(record.get("key"))] = record["value"]
+        elif op == "delete_prefix":
+            prefix = str(record.get("prefix") or "")
+            for key in [k for k in data if k.startswith(prefix)]:
+                del data[key]
+
+    def get(self, key: str) -> Any:
+        return _clone(self._state().get(key))
+
+    def items(self, prefix: str = "") -> Dict[str, Any]:
+        return _clone({k: v for k, v in self._state().items() if k.startswith(prefix)})
+
+    def set(self, key: str, value: Any) -> None:
+        with self.transaction():
+            self._append({"op": "set", "key": key, "value": value})
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self.transaction():
+            count = len(self.items(prefix))
+            if count:
+                self._append({"op": "delete_prefix", "prefix": prefix})
+        return count
+
+
+def _clone(value: Any) -> Any:
+    # Callers get their own objects, never the shared replayed state; everything
+    # in it came from JSON, and one dumps/loads beats deepcopy by about 2x
+    return json.loads(json.dumps(value, ensure_ascii=False))
+
+
+def _item_key(item: Dict[str, Any], pos: int) -> str:
+    # Items without an id (hand edits) are kept, under a key no id can have
+    return str(item["id"]) if item.get("id") is not None else f"\0{pos}"
+
+
+def _journal(workspace: Path, name: str) -> _JournalFile:
+    return JournalCollection(workspace, name) if name in COLLECTIONS else JournalMapping(workspace, name)
+
+
+@contextmanager
+def _journal_held(workspace: Path, name: str) -> Iterator[None]:
+    """Hold ``name``'s journal lock, if it has a journal, with the journal folded into the snapshot.
+
+    Migration and export rewrite the snapshot wholesale: the journal goes
+    first so none of it is lost or replayed over the rewritten file later.
+    """
+    journal = _journal(workspace, name)
+    if not journal.journal.exists():
+        yield
+        return
+    with file_lock(journal.lock):
+        journal._fold(force=True)
+        yield
+        journal.journal.unlink(missing_ok=True)
+
+
+def compact_journals(workspace: Path, force: bool = False) -> List[str]:
+    """Compact every journal past the threshold; returns the stores compacted."""
+    compacted = []
+    for name in COLLECTIONS:
+        if JournalCollection(workspace, name).compact(force):
+            compacted.append(name)
+    for name in MAPS:
+        if JournalMapping(workspace, name).compact(force):
+            compacted.append(name)
+    return compacted
+
+
+# --- SQLite -------------------------------------------------------------------
+
+
+class _Database:
+    """One connection per thread to a WAL database; schema created on first use."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._ready: set = set()
+        self._lock = threading.Lock()
+
+    def conn(self) -> "sqlite3.Connection":
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit; transactions are opened explicitly
+            conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_S, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS _revisions (name TEXT PRIMARY KEY, revision INTEGER NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def ensure(self, name: str, ddl: List[str]) -> None:
+        with self._lock:
+            if name in self._ready:
+                return
+        conn = self.conn()
+        for statement in ddl:
+            conn.execute(statement)
+        with self._lock:
+            self._ready.add(name)
+
+    @contextmanager
+    def transaction(self) -> Iterator["sqlite3.Connection"]:
+        conn = self.conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def bump(self, conn: "sqlite3.Connection", name: str) -> None:
+        conn.execute(
+            "INSERT INTO _revisions (name, revision) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET revision = revision + 1",
+            (name,),
+        )
+
+
+_DATABASES: Dict[str, _Database] = {}
+_DATABASES_LOCK = threading.Lock()
+
+
+def _database(path: Path) -> _Database:
+    with _DATABASES_LOCK:
+        db = _DATABASES.get(str(path))
+        if db is None:
+            db = _DATABASES[str(path)] = _Database(path)
+        return db
+
+
+class SqliteCollection:
+    def __init__(self, db: _Database, name: str) -> None:
+        self.db = db
+        self.name = name
+        ddl = [f'CREATE TABLE IF NOT EXISTS "{name}" (id TEXT PRIMARY KEY, data TEXT NOT NULL)']
+        for field in INDEXED_FIELDS.get(name, ()):
+            ddl.append(
+                f'CREATE INDEX IF NOT EXISTS "{name}_{field}" ON "{name}" (json_extract(data, \'$.{field}\'))'
+            )
+        db.ensure(name, ddl)
+
+    def transaction(self):
+        return self.db.transaction()
+
+    def _rows(self, where: str = "", params: tuple = ()) -> List[Dict[str, Any]]:
+        sql = f'SELECT data FROM "{self.name}" {where} ORDER BY rowid'
+        return [json.loads(row[0]) for row in self.db.conn().execute(sql, params)]
+
+    def all(self) -> List[Dict[str, Any]]:
+        return self._rows()
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.conn().execute(f'SELECT data FROM "{self.name}" WHERE id = ?', (item_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, **fields: Any) -> List[Dict[str, Any]]:
+        if not fields:
+            return self.all()
+        where = " AND ".join(f"json_extract(data, '$.{field}') IS ?" for field in fields)
+        return self._rows(f"WHERE {where}", tuple(fields.values()))
+
+    def ids_starting_with(self, prefixes: Tuple[str, ...]) -> List[str]:
+        # Range scan on the primary key, as in SqliteMapping.items
+        sql = f'SELECT id FROM "{self.name}" WHERE id >= ? AND id < ?'
+        conn = self.db.conn()
+        return [row[0] for p in prefixes for row in conn.execute(sql, (p, p + "\U0010ffff"))]
+
+    def insert(self, item: Dict[str, Any]) -> None:
+        with self.db.transaction() as conn:
+            conn.execute(
+                f'INSERT INTO "{self.name}" (id, data) VALUES (?, ?)',
+                (str(item.get("id")), json.dumps(item, ensure_ascii=False)),
+            )
+            self.db.bump(conn, self.name)
+
+    def update(self, item_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.db.transaction() as conn:
+            item = self.get(item_id)
+            if item is None:
+                return None
+            _apply(item, changes)
+            conn.execute(
+                f'UPDATE "{self.name}" SET data = ? WHERE id = ?', (json.dumps(item, ensure_ascii=False), item_id)
+            )
+            self.db.bump(conn, self.name)
+            return item
+
+    def delete(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self.db.transaction() as conn:
+            item = self.get(item_id)
+            if item is None:
+                return None
+            conn.execute(f'DELETE FROM "{self.name}" WHERE id = ?', (item_id,))
+            self.db.bump(conn, self.name)
+            return item
+
+    def stamp(self) -> Stamp:
+        """Changes with every write: [revision, row count]."""
+        conn = self.db.conn()
+        row = conn.execute("SELECT revision FROM _revisions WHERE name = ?", (self.name,)).fetchone()
+        count = conn.execute(f'SELECT COUNT(*) FROM "{self.name}"').fetchone()[0]
+        return [row[0] if row else 0, count]
+
+
+class SqliteMapping:
+    def __init__(self, db: _Database, name: str) -> None:
+        self.db = db
+        self.name = name
+        db.ensure(name, [f'CREATE TABLE IF NOT EXISTS "{name}" (key TEXT PRIMARY KEY, value TEXT NOT NULL)'])
+
+    def transaction(self):
+        return self.db.transaction()
+
+    def get(self, key: str) -> Any:
+        row = self.db.conn().execute(f'SELECT value FROM "{self.name}" WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def items(self, prefix: str = "") -> Dict[str, Any]:
+        # Range scan on the primary key instead of LIKE (no escaping, uses the index)
+        rows = self.db.conn().execute(
+            f'SELECT key, value FROM "{self.name}" WHERE key >= ? AND key < ? ORDER BY rowid',
+            (prefix, prefix + "\U0010ffff"),
+        )
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, key: str, value: Any) -> None:
+        with self.db.transaction() as conn:
+            if value is None:
+                conn.execute(f'DELETE FROM "{self.name}" WHERE key = ?', (key,))
+            else:
+                conn.execute(
+                    f'INSERT INTO "{self.name}" (key, value) VALUES (?, ?) '
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (key, json.dumps(value, ensure_ascii=False)),
+                )
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                f'DELETE FROM "{self.name}" WHERE key >= ? AND key < ?', (prefix, prefix + "\U0010ffff")
+            )
+            return cur.rowcount
+
+
+# --- Migration ----------------------------------------------------------------
+
+
+def migrate(workspace: Path) -> Dict[str, int]:
+    """Import every existing data/<name>.json (and its journal) into data/aide.db, once.
+
+    Imported files are renamed to <name>.json.migrated so they are neither
+    read again nor mistaken for live data. Returns records imported per store.
+    """
+    db = _database(db_path(workspace))
+    imported: Dict[str, int] = {}
+    for name in COLLECTIONS + MAPS:
+        with _journal_held(workspace, name):
+            path = json_path(workspace, name)
+            if not path.exists():
+                continue
+            with file_lock(path):
+                data = load_json(path, None)
+                if name in COLLECTIONS:
+                    store: Any = SqliteCollection(db, name)
+                    records = [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+                    with store.transaction():
+                        for item in records:
+                            if store.get(str(item.get("id"))) is None:
+                                store.insert(item)
+                else:
+                    store = SqliteMapping(db, name)
+                    records = list(data.items()) if isinstance(data, dict) else []
+                    with store.transaction():
+                        for key, value in records:
+                            store.set(str(key), value)
+                path.replace(path.with_name(path.name + ".migrated"))
+        imported[name] = len(records)
+    return imported
+
+
+def export(workspace: Path) -> Dict[str, int]:
+    """Write every store in data/aide.db back to data/<name>.json (for AIDE_STORAGE=json or journal).
+
+    Journals left over from before the migration are removed, so they cannot
+    replay over the exported data if the journal backend is used again.
+    """
+    if not db_path(workspace).exists():
+        raise RuntimeError(f"No database at {db_path(workspace)}")
+    db = _database(db_path(workspace))
+    exported: Dict[str, int] = {}
+    for name in COLLECTIONS + MAPS:
+        with _journal_held(workspace, name):
+            if name in COLLECTIONS:
+                data: Any = SqliteCollection(db, name).all()
+            else:
+                data = SqliteMapping(db, name).items()
+            atomic_write_json(json_path(workspace, name), data)
+        exported[name] = len(data)
+    return exported
+
+
+def checkpoint(workspace: Path) -> None:
+    """Fold the WAL into aide.db (e.g. before a file-level backup)."""
+    if db_path(workspace).exists():
+        _database(db_path(workspace)).conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
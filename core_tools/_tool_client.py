@@ -0,0 +1,95 @@
+"""Forward a core tool call to the workspace tool server, if one is running.
+
+Imported by the tool scripts before anything heavy: when data/tools.sock
+answers, the server runs the call with its modules and stores already
+loaded and this process only relays the output. Without a server (or
+with ``AIDE_TOOL_SERVER=0``) ``forward`` returns and the script runs
+in-process as before. Only modules the interpreter loads anyway plus
+json and socket, so the forwarding path stays cheap.
+"""
+
+import io
+import json
+import os
+import socket
+import sys
+from typing import Optional
+
+SOCKET_NAME = "tools.sock"
+# A call waits this long for the server before reporting an error
+TIMEOUT_S = 60.0
+# Subcommands that read their input from stdin; it is sent along with the call
+STDIN_COMMANDS = ("batch",)
+
+
+def socket_path(workspace: str) -> str:
+    return os.path.join(workspace, "data", SOCKET_NAME)
+
+
+def _workspace() -> Optional[str]:
+    # Same lookup as _utils.resolve_workspace, without importing it (or pathlib)
+    env = os.environ.get("AIDE_WORKSPACE")
+    if env:
+        return os.path.realpath(os.path.expanduser(env))
+    cwd = os.getcwd()
+    if os.path.exists(os.path.join(cwd, ".env")) or os.path.exists(os.path.join(cwd, "data")):
+        return os.path.realpath(cwd)
+    return None
+
+
+def _disabled() -> bool:
+    return os.environ.get("AIDE_TOOL_SERVER", "").strip().lower() in ("0", "false", "no", "off")
+
+
+def call(workspace: str, tool: str, argv: list, stdin: str = "") -> Optional[dict]:
+    """The server's reply ({exit, stdout, stderr}); None when no server is listening."""
+    path = socket_path(workspace)
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except OSError:
+            return None  # stale socket: nothing was sent, running in-process is safe
+        sock.settimeout(TIMEOUT_S)
+        env = {k: v for k, v in os.environ.items() if k.startswith("AIDE_")}
+        request = {"tool": tool, "argv": argv, "env": env, "stdin": stdin}
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    try:
+        return json.loads(b"".join(chunks))
+    except ValueError:
+        # The call may already have been applied: do not run it again here
+        return {"exit": 1, "stdout": json.dumps({"success": False, "error": "Tool server gave no reply"}) + "\n"}
+
+
+def forward(script: str) -> None:
+    """Run this tool call on the server and exit with its result, or return."""
+    if _disabled():
+        return
+    workspace = _workspace()
+    if workspace is None:
+        return
+    argv = sys.argv[1:]
+    stdin = sys.stdin.read() if argv[:1] and argv[0] in STDIN_COMMANDS else ""
+    try:
+        reply = call(workspace, os.path.splitext(os.path.basename(script))[0], argv, stdin)
+    except OSError as exc:
+        reply = {"exit": 1, "stdout": json.dumps({"success": False, "error": f"Tool server: {exc}"}) + "\n"}
+    if reply is None:
+        if stdin:
+            sys.stdin = io.StringIO(stdin)  # already consumed: hand it to the in-process run
+        return
+    sys.stdout.write(reply.get("stdout", ""))
+    sys.stderr.write(reply.get("stderr", ""))
+    sys.stdout.flush()
+    sys.exit(int(reply.get("exit", 1)))
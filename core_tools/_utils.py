@@ -2,9 +2,7 @@ import json
 import os
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Iterator, Optional
-
-from dotenv import load_dotenv
+from typing import Any, Dict, Iterator, List, Optional, TextIO
 
 
 @contextmanager
@@ -35,6 +33,9 @@ def resolve_workspace() -> Path:
 def load_workspace_env(workspace: Path) -> None:
     env_path = workspace / ".env"
     if env_path.exists():
+        # Imported only when there is a file to load: tools start on every agent call
+        from dotenv import load_dotenv
+
         load_dotenv(env_path, override=True)
 
 
@@ -71,3 +72,35 @@ def parse_dt(value: Optional[str]):
         return datetime.fromisoformat(value)
     except Exception:
         return None
+
+
+def read_operations(stream: TextIO) -> List[Dict[str, Any]]:
+    """Operations for a ``batch`` subcommand: a JSON list of objects or one object per line."""
+    text = stream.read()
+    if not text.strip():
+        return []
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                data.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Invalid JSON on line {number}") from None
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not all(isinstance(op, dict) for op in data):
+        raise ValueError("Batch input must be a JSON list of objects or one JSON object per line")
+    return data
+
+
+def batch_result(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-operation results in input order; successful only if every operation was."""
+    failed = sum(1 for r in results if not r.get("success"))
+    out: Dict[str, Any] = {"success": not failed, "data": {"results": results}}
+    if failed:
+        out["error"] = f"{failed} of {len(results)} operations failed"
+    return out
@@ -0,0 +1,227 @@
+"""Offline semantic recall: hashed character n-gram vectors of memory items.
+
+Each item becomes an L2-normalized float32 vector of ``DIM`` buckets filled
+with sublinear counts of its folded character 3- and 4-grams (signed
+feature hashing, crc32 so every process agrees). That catches paraphrases
+and inflections keyword matching misses, with no model and no network.
+
+The matrix lives in data/memory_vectors.npy (rows preallocated, grown by a
+quarter) next to data/memory_vectors.json (row ids, capacity and the
+memory store stamp). Bot processes map it read-only; a query is one dot
+product over the used rows. ``memory_manage.py add/forget`` append a row or
+move the last row into the freed one. Needs numpy; without it every
+function here is a no-op and recall stays keyword-only. numpy is imported
+on first use, so keyword-only callers never pay for it.
+"""
+
+import math
+import os
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from ._ranking import fold
+    from ._utils import atomic_write_json, load_json
+except ImportError:  # loaded by a script run from core_tools/
+    from _ranking import fold
+    from _utils import atomic_write_json, load_json
+
+
+VECTORS_VERSION = 1
+DIM = 512
+NGRAM_SIZES = (3, 4)
+MIN_CAPACITY = 64
+
+Stamp = Optional[List[int]]
+
+# npy path -> (stamps, (meta, matrix)): mapping reused while files are unchanged
+_CACHE: Dict[str, Tuple[Any, Any]] = {}
+
+# numpy module once ``available()`` has imported it; False when not installed
+np: Any = None
+
+
+def available() -> bool:
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        np = numpy
+    return np is not False
+
+
+def recall_mode() -> str:
+    """``keyword`` (default), ``hybrid`` or ``vector``; vectors need numpy."""
+    mode = os.environ.get("AIDE_MEMORY_RECALL", "keyword").strip().lower()
+    if mode not in ("hybrid", "vector") or not available():
+        return "keyword"
+    return mode
+
+
+def matrix_path(workspace: Path) -> Path:
+    return workspace / "data" / "memory_vectors.npy"
+
+
+def meta_path(workspace: Path) -> Path:
+    return workspace / "data" / "memory_vectors.json"
+
+
+def _stamp(path: Path) -> Stamp:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def embed(text: str) -> "np.ndarray":
+    vec = np.zeros(DIM, dtype=np.float32)
+    counts: Dict[int, float] = {}
+    for word in fold(text).split():
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                h = zlib.crc32(padded[i : i + n].encode("utf-8"))
+                bucket = h % DIM
+                sign = 1.0 if (h >> 31) & 1 else -1.0
+                counts[bucket] = counts.get(bucket, 0.0) + sign
+    for bucket, count in counts.items():
+        # Sublinear: a repeated n-gram should not dominate the item
+        vec[bucket] = math.copysign(1.0 + math.log(abs(count)), count) if count else 0.0
+    norm = float(np.linalg.norm(vec))
+    if norm:
+        vec /= norm
+    return vec
+
+
+def _capacity(rows: int) -> int:
+    return rows + max(MIN_CAPACITY, rows // 4)
+
+
+def _write_matrix(path: Path, rows: "np.ndarray", capacity: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".npy.tmp")
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(capacity, DIM))
+    out[: len(rows)] = rows
+    out.flush()
+    del out
+    tmp.replace(path)
+
+
+def _meta(ids: List[str], capacity: int, memory_stamp: Stamp) -> Dict[str, Any]:
+    return {
+        "version": VECTORS_VERSION,
+        "dim": DIM,
+        "ids": ids,
+        "capacity": capacity,
+        "memory_stamp": memory_stamp,
+    }
+
+
+def _valid(meta: Any, memory_stamp: Stamp) -> bool:
+    return (
+        isinstance(meta, dict)
+        and meta.get("version") == VECTORS_VERSION
+        and meta.get("dim") == DIM
+        and memory_stamp is not None
+        and meta.get("memory_stamp") == memory_stamp
+    )
+
+
+def build_vectors(workspace: Path, items: Iterable[Dict[str, Any]], memory_stamp: Stamp) -> None:
+    items = [item for item in items if item.get("id")]
+    ids = [str(item["id"]) for item in items]
+    if items:
+        rows = np.stack([embed(str(item.get("text", ""))) for item in items])
+    else:
+        rows = np.zeros((0, DIM), dtype=np.float32)
+    capacity = _capacity(len(ids))
+    _write_matrix(matrix_path(workspace), rows, capacity)
+    atomic_write_json(meta_path(workspace), _meta(ids, capacity, memory_stamp))
+
+
+def update_vectors(
+    workspace: Path,
+    before: Stamp,
+    after: Stamp,
+    store: Any,
+    added: Iterable[Dict[str, Any]] = (),
+    removed: Iterable[Dict[str, Any]] = (),
+) -> None:
+    """Apply an add/forget that just changed the memory store (stamps around the write)."""
+    if recall_mode() == "keyword":
+        return
+    meta = load_json(meta_path(workspace), None)
+    path = matrix_path(workspace)
+    if not _valid(meta, before) or not path.exists():
+        build_vectors(workspace, store.all(), after)
+        return
+
+    ids: List[str] = meta["ids"]
+    capacity: int = meta["capacity"]
+    added = [item for item in added if item.get("id")]
+    if len(ids) + len(added) > capacity:
+        current = np.load(path, mmap_mode="r")
+        capacity = _capacity(len(ids) + len(added))
+        _write_matrix(path, np.array(current[: len(ids)]), capacity)
+        del current
+
+    mat = np.load(path, mmap_mode="r+")
+    for item in removed:
+        mem_id = str(item.get("id", ""))
+        if mem_id not in ids:
+            continue
+        row = ids.index(mem_id)
+        last = len(ids) - 1
+        # Keep rows dense: the last row takes the freed slot
+        mat[row] = mat[last]
+        ids[row] = ids[last]
+        ids.pop()
+    for item in added:
+        mat[len(ids)] = embed(str(item.get("text", "")))
+        ids.append(str(item["id"]))
+    mat.flush()
+    del mat
+    atomic_write_json(meta_path(workspace), _meta(ids, capacity, after))
+
+
+def _load(workspace: Path, items: Dict[str, Dict[str, Any]], memory_stamp: Stamp) -> Tuple[Dict[str, Any], Any]:
+    path, mpath = matrix_path(workspace), meta_path(workspace)
+    stamps = (_stamp(path), _stamp(mpath))
+    hit = _CACHE.get(str(path))
+    if hit is not None and hit[0] == stamps and _valid(hit[1][0], memory_stamp):
+        return hit[1]
+    meta = load_json(mpath, None)
+    if not _valid(meta, memory_stamp) or not path.exists():
+        build_vectors(workspace, items.values(), memory_stamp)
+        stamps = (_stamp(path), _stamp(mpath))
+        meta = load_json(mpath, None)
+    # Read-only mapping: pages are shared between all bot processes
+    loaded = (meta, np.load(path, mmap_mode="r"))
+    _CACHE[str(path)] = (stamps, loaded)
+    return loaded
+
+
+def vector_rank(
+    workspace: Path,
+    items: Dict[str, Dict[str, Any]],
+    memory_stamp: Stamp,
+    query: str,
+    limit: int = 10,
+    min_score: float = 0.0,
+) -> List[Tuple[str, float]]:
+    """(memory id, cosine similarity) of the ``limit`` nearest items."""
+    if not available() or not items or not query.strip():
+        return []
+    meta, mat = _load(workspace, items, memory_stamp)
+    ids = meta["ids"]
+    if not ids:
+        return []
+    sims = mat[: len(ids)] @ embed(query)
+    k = min(limit, len(ids))
+    top = np.argpartition(-sims, k - 1)[:k]
+    ranked = sorted(((ids[i], float(sims[i])) for i in top), key=lambda pair: (-pair[1], pair[0]))
+    return [(mem_id, score) for mem_id, score in ranked if score > min_score]
@@ -1,96 +1,108 @@
-import argparse
-import json
+import os
 import sys
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+if __name__ == "__main__":
+    # Hand the call to the tool server when one runs (exits), else run here
+    from _tool_client import forward
+
+    forward(__file__)
+
+import argparse
 import uuid
-from pathlib import Path
 from typing import Any, Dict, List
 
-sys.path.insert(0, str(Path(__file__).resolve().parent))
-
-from _utils import atomic_write_json, file_lock, iso_now, load_json, resolve_workspace
-
-
-def _cron_path(workspace):
-    return workspace / "data" / "cron.json"
-
-
-def list_jobs(workspace) -> None:
-    jobs: List[Dict[str, Any]] = load_json(_cron_path(workspace), [])
-    print(json.dumps({"success": True, "data": jobs}, ensure_ascii=False))
-
-
-def add_job(workspace, schedule: str, prompt: str) -> None:
-    path = _cron_path(workspace)
-    with file_lock(path):
-        jobs: List[Dict[str, Any]] = load_json(path, [])
-        job_id = str(uuid.uuid4())
-        jobs.append(
-            {
-                "id": job_id,
-                "schedule": schedule,
-                "prompt": prompt,
-                "enabled": True,
-                "created": iso_now(),
-                "last_run": None,
-            }
-        )
-        atomic_write_json(path, jobs)
-
-    print(json.dumps({"success": True, "data": {"id": job_id}}, ensure_ascii=False))
-
-
-def remove_job(workspace, job_id: str) -> None:
-    path = _cron_path(workspace)
-    with file_lock(path):
-        jobs = load_json(path, [])
-        new_jobs = [j for j in jobs if j.get("id") != job_id]
-        if len(new_jobs) == len(jobs):
-            print(json.dumps({"success": False, "error": "Cron job not found"}, ensure_ascii=False))
-            sys.exit(1)
-        atomic_write_json(path, new_jobs)
-    print(json.dumps({"success": True, "data": {"id": job_id}}, ensure_ascii=False))
-
-
-def enable_job(workspace, job_id: str, enabled: bool) -> None:
-    path = _cron_path(workspace)
-    with file_lock(path):
-        jobs = load_json(path, [])
-        found = False
-        for j in jobs:
-            if j.get("id") == job_id:
-                j["enabled"] = enabled
-                found = True
-        if not found:
-            print(json.dumps({"success": False, "error": "Cron job not found"}, ensure_ascii=False))
-            sys.exit(1)
-        atomic_write_json(path, jobs)
-    print(json.dumps({"success": True, "data": {"id": job_id, "enabled": enabled}}, ensure_ascii=False))
-
-
-def update_job(workspace, job_id: str, schedule: str | None, prompt: str | None) -> None:
-    path = _cron_path(workspace)
-    with file_lock(path):
-        jobs = load_json(path, [])
-        found = False
-        for j in jobs:
-            if j.get("id") == job_id:
-                if schedule:
-                    j["schedule"] = schedule
-                if prompt:
-                    j["prompt"] = prompt
-                found = True
-        if not found:
-            print(json.dumps({"success": False, "error": "Cron job not found"}, ensure_ascii=False))
-            sys.exit(1)
-        atomic_write_json(path, jobs)
-    print(json.dumps({"success": True, "data": {"id": job_id}}, ensure_ascii=False))
+from _listing import add_arguments as add_list_arguments, select
+from _output import add_format_argument, emit
+from _storage import collection, resolve_id
+from _utils import batch_result, iso_now, read_operations, resolve_workspace
+
+
+def list_jobs(workspace, args) -> Dict[str, Any]:
+    store = collection(workspace, "cron")
+    jobs: List[Dict[str, Any]] = store.find(enabled=args.enabled) if args.enabled is not None else store.all()
+    return select(jobs, args, ("prompt", "schedule"))
+
+
+def _add(store, fields: Dict[str, Any]) -> Dict[str, Any]:
+    if not fields.get("schedule") or not fields.get("prompt"):
+        return {"success": False, "error": "Missing schedule or prompt"}
+    job_id = str(uuid.uuid4())
+    store.insert(
+        {
+            "id": job_id,
+            "schedule": fields["schedule"],
+            "prompt": fields["prompt"],
+            "enabled": True,
+            "created": iso_now(),
+            "last_run": None,
+        }
+    )
+    return {"success": True, "data": {"id": job_id}}
+
+
+def _remove(store, fields: Dict[str, Any]) -> Dict[str, Any]:
+    job_id = resolve_id(store, fields.get("id"))
+    if job_id is None or store.delete(job_id) is None:
+        return {"success": False, "error": "Cron job not found"}
+    return {"success": True, "data": {"id": job_id}}
+
+
+def _set_enabled(store, fields: Dict[str, Any], enabled: bool) -> Dict[str, Any]:
+    job_id = resolve_id(store, fields.get("id"))
+    if job_id is None or store.update(job_id, {"enabled": enabled}) is None:
+        return {"success": False, "error": "Cron job not found"}
+    return {"success": True, "data": {"id": job_id, "enabled": enabled}}
+
+
+def _update(store, fields: Dict[str, Any]) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {}
+    if fields.get("schedule"):
+        changes["schedule"] = fields["schedule"]
+    if fields.get("prompt"):
+        changes["prompt"] = fields["prompt"]
+    job_id = resolve_id(store, fields.get("id"))
+    if job_id is None or store.update(job_id, changes) is None:
+        return {"success": False, "error": "Cron job not found"}
+    return {"success": True, "data": {"id": job_id}}
+
+
+OPERATIONS = {
+    "add": _add,
+    "remove": _remove,
+    "enable": lambda store, fields: _set_enabled(store, fields, True),
+    "disable": lambda store, fields: _set_enabled(store, fields, False),
+    "update": _update,
+}
+
+
+def apply(workspace, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run ``{"op": "add"|"remove"|"enable"|"disable"|"update", ...}`` items under one store lock."""
+    store = collection(workspace, "cron")
+    results = []
+    with store.transaction():
+        for op in operations:
+            handler = OPERATIONS.get(str(op.get("op")))
+            if handler is None:
+                results.append({"success": False, "error": f"Unknown op: {op.get('op')}"})
+                continue
+            try:
+                results.append(handler(store, op))
+            except Exception as exc:
+                results.append({"success": False, "error": str(exc)})
+    return results
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Manage cron jobs")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("list")
+    list_p = sub.add_parser("list")
+    state = list_p.add_mutually_exclusive_group()
+    state.add_argument("--enabled", dest="enabled", action="store_const", const=True, default=None)
+    state.add_argument("--disabled", dest="enabled", action="store_const", const=False)
+    add_list_arguments(list_p)
 
     add_p = sub.add_parser("add")
     add_p.add_argument("--schedule", required=True)
@@ -110,25 +122,22 @@ def main() -> None:
     up_p.add_argument("--schedule")
     up_p.add_argument("--prompt")
 
+    sub.add_parser("batch", help="Read add/remove/enable/disable/update operations (JSON list or NDJSON) from stdin")
+
+    add_format_argument(parser, sub)
     args = parser.parse_args()
     workspace = resolve_workspace()
 
     try:
+        store = collection(workspace, "cron")
         if args.cmd == "list":
-            list_jobs(workspace)
-        elif args.cmd == "add":
-            add_job(workspace, args.schedule, args.prompt)
-        elif args.cmd == "remove":
-            remove_job(workspace, args.id)
-        elif args.cmd == "enable":
-            enable_job(workspace, args.id, True)
-        elif args.cmd == "disable":
-            enable_job(workspace, args.id, False)
-        elif args.cmd == "update":
-            update_job(workspace, args.id, args.schedule, args.prompt)
+            emit(list_jobs(workspace, args), args, store)
+        elif args.cmd == "batch":
+            emit(batch_result(apply(workspace, read_operations(sys.stdin))), args, store)
+        else:
+            emit(apply(workspace, [{**vars(args), "op": args.cmd}])[0], args, store)
     except Exception as exc:
-        print(json.dumps({"success": False, "error": str(exc)}))
-        sys.exit(1)
+        emit({"success": False, "error": str(exc)}, args)
 
 
 if __name__ == "__main__":
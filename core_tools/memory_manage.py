@@ -1,83 +1,131 @@
-import argparse
-import json
+import os
 import sys
-import uuid
-from pathlib import Path
-from typing import Any, Dict, List
-
-sys.path.insert(0, str(Path(__file__).resolve().parent))
-
-from _utils import atomic_write_json, file_lock, iso_now, load_json, resolve_workspace
-
-
-def _memory_path(workspace):
-    return workspace / "data" / "memory.json"
-
 
-def list_mem(workspace) -> None:
-    items: List[Dict[str, Any]] = load_json(_memory_path(workspace), [])
-    print(json.dumps({"success": True, "data": items}, ensure_ascii=False))
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
 
+if __name__ == "__main__":
+    # Hand the call to the tool server when one runs (exits), else run here
+    from _tool_client import forward
 
-def add_mem(workspace, text: str) -> None:
-    path = _memory_path(workspace)
-    with file_lock(path):
-        items = load_json(path, [])
-        mem_id = str(uuid.uuid4())
-        items.append({"id": mem_id, "text": text, "created": iso_now()})
-        atomic_write_json(path, items)
-    print(json.dumps({"success": True, "data": {"id": mem_id}}, ensure_ascii=False))
-
-
-def search_mem(workspace, query: str) -> None:
-    items = load_json(_memory_path(workspace), [])
-    q = query.lower()
-    results = [i for i in items if q in str(i.get("text", "")).lower()]
-    print(json.dumps({"success": True, "data": results}, ensure_ascii=False))
-
+    forward(__file__)
 
-def forget_mem(workspace, mem_id: str) -> None:
-    path = _memory_path(workspace)
-    with file_lock(path):
-        items = load_json(path, [])
-        new_items = [i for i in items if i.get("id") != mem_id]
-        if len(new_items) == len(items):
-            print(json.dumps({"success": False, "error": "Memory item not found"}, ensure_ascii=False))
-            sys.exit(1)
-        atomic_write_json(path, new_items)
-    print(json.dumps({"success": True, "data": {"id": mem_id}}, ensure_ascii=False))
+import argparse
+import uuid
+from typing import Any, Dict, List, Optional
+
+from _listing import add_arguments as add_list_arguments, select
+from _memory_index import load_memory, update_index
+from _ranking import fold, rank
+from _output import add_format_argument, emit
+from _storage import collection, resolve_id
+from _utils import batch_result, iso_now, read_operations, resolve_workspace
+from _vectors import update_vectors
+
+
+def list_mem(workspace, args) -> Dict[str, Any]:
+    items: List[Dict[str, Any]] = collection(workspace, "memory").all()
+    return select(items, args, ("text",))
+
+
+def search_mem(workspace, query: str, limit: Optional[int] = None) -> Dict[str, Any]:
+    items, index = load_memory(workspace)
+    ranked = [items[mem_id] for mem_id, _score in rank(index, query) if mem_id in items]
+    if not ranked:
+        # Nothing term-like in the query (e.g. "+420"): plain folded substring match
+        q = fold(query)
+        ranked = [i for i in items.values() if q and q in fold(str(i.get("text", "")))]
+    return {"success": True, "data": ranked if limit is None else ranked[: max(0, limit)]}
+
+
+Changes = Dict[str, List[Dict[str, Any]]]
+
+
+def _add(store, fields: Dict[str, Any], changes: Changes) -> Dict[str, Any]:
+    if not fields.get("text"):
+        return {"success": False, "error": "Missing text"}
+    item = {"id": str(uuid.uuid4()), "text": fields["text"], "created": iso_now()}
+    store.insert(item)
+    changes["added"].append(item)
+    return {"success": True, "data": {"id": item["id"]}}
+
+
+def _forget(store, fields: Dict[str, Any], changes: Changes) -> Dict[str, Any]:
+    mem_id = resolve_id(store, fields.get("id"))
+    item = store.delete(mem_id) if mem_id else None
+    if item is None:
+        return {"success": False, "error": "Memory item not found"}
+    changes["removed"].append(item)
+    return {"success": True, "data": {"id": mem_id}}
+
+
+OPERATIONS = {"add": _add, "forget": _forget}
+
+
+def apply(workspace, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run ``{"op": "add"|"forget", ...}`` items under one store lock; results in order."""
+    store = collection(workspace, "memory")
+    changes: Changes = {"added": [], "removed": []}
+    results = []
+    with store.transaction():
+        before = store.stamp()
+        for op in operations:
+            handler = OPERATIONS.get(str(op.get("op")))
+            if handler is None:
+                results.append({"success": False, "error": f"Unknown op: {op.get('op')}"})
+                continue
+            try:
+                results.append(handler(store, op, changes))
+            except Exception as exc:
+                results.append({"success": False, "error": str(exc)})
+
+    # Added and forgotten within the same batch: the index never saw it
+    both = {item["id"] for item in changes["added"]} & {item.get("id") for item in changes["removed"]}
+    added = [item for item in changes["added"] if item["id"] not in both]
+    removed = [item for item in changes["removed"] if item.get("id") not in both]
+    if added or removed:
+        # Index and vectors follow outside the store lock; they are patched only
+        # when still matching ``before``, otherwise rebuilt from the store
+        after = store.stamp()
+        update_index(workspace, before, after, store, added=added, removed=removed)
+        update_vectors(workspace, before, after, store, added=added, removed=removed)
+    return results
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Manage memory items")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("list")
+    list_p = sub.add_parser("list")
+    add_list_arguments(list_p)
 
     add_p = sub.add_parser("add")
     add_p.add_argument("--text", required=True)
 
     search_p = sub.add_parser("search")
     search_p.add_argument("--query", required=True)
+    search_p.add_argument("--limit", type=int, default=None, help="Return at most this many best matches (default all)")
 
     forget_p = sub.add_parser("forget")
     forget_p.add_argument("--id", required=True)
 
+    sub.add_parser("batch", help="Read add/forget operations (JSON list or NDJSON) from stdin")
+
+    add_format_argument(parser, sub)
     args = parser.parse_args()
     workspace = resolve_workspace()
 
     try:
+        store = collection(workspace, "memory")
         if args.cmd == "list":
-            list_mem(workspace)
-        elif args.cmd == "add":
-            add_mem(workspace, args.text)
+            emit(list_mem(workspace, args), args, store)
         elif args.cmd == "search":
-            search_mem(workspace, args.query)
-        elif args.cmd == "forget":
-            forget_mem(workspace, args.id)
+            emit(search_mem(workspace, args.query, args.limit), args, store)
+        elif args.cmd == "batch":
+            emit(batch_result(apply(workspace, read_operations(sys.stdin))), args, store)
+        else:
+            emit(apply(workspace, [{**vars(args), "op": args.cmd}])[0], args, store)
     except Exception as exc:
-        print(json.dumps({"success": False, "error": str(exc)}))
-        sys.exit(1)
+        emit({"success": False, "error": str(exc)}, args)
 
 
 if __name__ == "__main__":
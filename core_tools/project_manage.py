@@ -1,17 +1,22 @@
-import argparse
-import json
+import os
 import sys
-import uuid
-from pathlib import Path
-from typing import Any, Dict, List
 
-sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+if __name__ == "__main__":
+    # Hand the call to the tool server when one runs (exits), else run here
+    from _tool_client import forward
 
-from _utils import atomic_write_json, file_lock, iso_now, load_json, resolve_workspace
+    forward(__file__)
 
+import argparse
+import uuid
+from typing import Any, Dict, List
 
-def _projects_path(workspace):
-    return workspace / "data" / "projects.json"
+from _listing import add_arguments as add_list_arguments, select
+from _output import add_format_argument, emit
+from _storage import collection
+from _utils import iso_now, resolve_workspace
 
 
 def _projects_dir(workspace):
@@ -30,25 +35,24 @@ def _slugify(text: str) -> str:
     return slug or "project"
 
 
-def list_projects(workspace) -> None:
-    items: List[Dict[str, Any]] = load_json(_projects_path(workspace), [])
-    print(json.dumps({"success": True, "data": items}, ensure_ascii=False))
+def list_projects(workspace, args) -> Dict[str, Any]:
+    store = collection(workspace, "projects")
+    items: List[Dict[str, Any]] = store.find(status=args.status) if args.status else store.all()
+    return select(items, args, ("name", "id"))
 
 
-def add_project(workspace, name: str) -> None:
-    path = _projects_path(workspace)
-    with file_lock(path):
-        items = load_json(path, [])
+def add_project(workspace, name: str) -> Dict[str, Any]:
+    store = collection(workspace, "projects")
+    with store.transaction():
         base = _slugify(name)
-        existing_ids = {i.get("id") for i in items}
         project_id = base
-        if project_id in existing_ids:
+        if store.get(project_id) is not None:
             project_id = f"{base}-{str(uuid.uuid4())[:8]}"
         md_path = _projects_dir(workspace) / f"{project_id}.md"
         _projects_dir(workspace).mkdir(parents=True, exist_ok=True)
         if not md_path.exists():
             md_path.write_text(f"# {name}\n\n", encoding="utf-8")
-        items.append(
+        store.insert(
             {
                 "id": project_id,
                 "name": name,
@@ -57,38 +61,31 @@ def add_project(workspace, name: str) -> None:
                 "created": iso_now(),
             }
         )
-        atomic_write_json(path, items)
-    print(json.dumps({"success": True, "data": {"id": project_id}}, ensure_ascii=False))
+    return {"success": True, "data": {"id": project_id}}
 
 
-def update_project(workspace, project_id: str, name: str | None, status: str | None) -> None:
-    path = _projects_path(workspace)
-    with file_lock(path):
-        items = load_json(path, [])
-        found = False
-        for item in items:
-            if item.get("id") == project_id:
-                if name:
-                    item["name"] = name
-                if status:
-                    item["status"] = status
-                found = True
-        if not found:
-            print(json.dumps({"success": False, "error": "Project not found"}, ensure_ascii=False))
-            sys.exit(1)
-        atomic_write_json(path, items)
-    print(json.dumps({"success": True, "data": {"id": project_id}}, ensure_ascii=False))
+def update_project(workspace, project_id: str, name: str | None, status: str | None) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {}
+    if name:
+        changes["name"] = name
+    if status:
+        changes["status"] = status
+    if collection(workspace, "projects").update(project_id, changes) is None:
+        return {"success": False, "error": "Project not found"}
+    return {"success": True, "data": {"id": project_id}}
 
 
-def archive_project(workspace, project_id: str) -> None:
-    update_project(workspace, project_id, None, "archived")
+def archive_project(workspace, project_id: str) -> Dict[str, Any]:
+    return update_project(workspace, project_id, None, "archived")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Manage projects")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("list")
+    list_p = sub.add_parser("list")
+    list_p.add_argument("--status", default=None)
+    add_list_arguments(list_p)
 
     add_p = sub.add_parser("add")
     add_p.add_argument("--name", required=True)
@@ -101,21 +98,21 @@ def main() -> None:
     arch_p = sub.add_parser("archive")
     arch_p.add_argument("--id", required=True)
 
+    add_format_argument(parser, sub)
     args = parser.parse_args()
     workspace = resolve_workspace()
 
     try:
         if args.cmd == "list":
-            list_projects(workspace)
+            emit(list_projects(workspace, args), args)
         elif args.cmd == "add":
-            add_project(workspace, args.name)
+            emit(add_project(workspace, args.name), args)
         elif args.cmd == "update":
-            update_project(workspace, args.id, args.name, args.status)
+            emit(update_project(workspace, args.id, args.name, args.status), args)
         elif args.cmd == "archive":
-            archive_project(workspace, args.id)
+            emit(archive_project(workspace, args.id), args)
     except Exception as exc:
-        print(json.dumps({"success": False, "error": str(exc)}))
-        sys.exit(1)
+        emit({"success": False, "error": str(exc)}, args)
 
 
 if __name__ == "__main__":
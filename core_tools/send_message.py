@@ -3,7 +3,6 @@ import json
 import os
 import sys
 from pathlib import Path
-from urllib import request
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
@@ -11,6 +10,8 @@ from _utils import load_workspace_env, resolve_workspace
 
 
 def _send_telegram(text: str, chat_id: str | None = None) -> None:
+    from urllib import request
+
     token = os.environ.get("TELEGRAM_TOKEN")
     if not token:
         raise RuntimeError("Missing TELEGRAM_TOKEN")
@@ -0,0 +1,64 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from _storage import (
+    COLLECTIONS,
+    MAPS,
+    backend,
+    checkpoint,
+    collection,
+    compact_journals,
+    db_path,
+    export,
+    mapping,
+    migrate,
+)
+from _utils import resolve_workspace
+
+
+def status(workspace) -> None:
+    counts = {name: len(collection(workspace, name).all()) for name in COLLECTIONS}
+    counts.update({name: len(mapping(workspace, name).items()) for name in MAPS})
+    data = {"backend": backend(workspace), "database": str(db_path(workspace)), "records": counts}
+    print(json.dumps({"success": True, "data": data}, ensure_ascii=False))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage workspace storage (JSON files / journal / SQLite)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    sub.add_parser("status")
+    sub.add_parser(
+        "migrate", help="Import data/*.json and their journals into data/aide.db (files renamed to *.json.migrated)"
+    )
+    sub.add_parser("export", help="Write data/aide.db back to data/*.json (removes leftover journals)")
+    sub.add_parser("checkpoint", help="Fold the SQLite WAL into data/aide.db")
+    sub.add_parser("compact", help="Fold data/*.journal.jsonl into the JSON snapshots")
+
+    args = parser.parse_args()
+    workspace = resolve_workspace()
+
+    try:
+        if args.cmd == "status":
+            status(workspace)
+        elif args.cmd == "migrate":
+            print(json.dumps({"success": True, "data": {"imported": migrate(workspace)}}, ensure_ascii=False))
+        elif args.cmd == "export":
+            print(json.dumps({"success": True, "data": {"exported": export(workspace)}}, ensure_ascii=False))
+        elif args.cmd == "checkpoint":
+            checkpoint(workspace)
+            print(json.dumps({"success": True, "data": {}}, ensure_ascii=False))
+        elif args.cmd == "compact":
+            compacted = compact_journals(workspace, force=True)
+            print(json.dumps({"success": True, "data": {"compacted": compacted}}, ensure_ascii=False))
+    except Exception as exc:
+        print(json.dumps({"success": False, "error": str(exc)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
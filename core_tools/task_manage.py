@@ -1,20 +1,23 @@
-import argparse
-import json
+import os
 import sys
-import uuid
-from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
 
-from croniter import croniter
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
 
-sys.path.insert(0, str(Path(__file__).resolve().parent))
+if __name__ == "__main__":
+    # Hand the call to the tool server when one runs (exits), else run here
+    from _tool_client import forward
 
-from _utils import atomic_write_json, file_lock, iso_now, load_json, parse_dt, resolve_workspace
+    forward(__file__)
 
+import argparse
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
 
-def _tasks_path(workspace):
-    return workspace / "data" / "tasks.json"
+from _listing import add_arguments as add_list_arguments, select
+from _output import add_format_argument, emit
+from _storage import collection, resolve_id
+from _utils import batch_result, iso_now, parse_dt, read_operations, resolve_workspace
 
 
 def _advance_due(due: Optional[str], recurrence: str) -> Optional[str]:
@@ -41,103 +44,134 @@ def _advance_due(due: Optional[str], recurrence: str) -> Optional[str]:
 
     # Cron expression
     if len(rec.split()) >= 5:
+        from croniter import croniter
+
         itr = croniter(rec, base)
         return itr.get_next(datetime).isoformat()
 
     return None
 
 
-def list_tasks(workspace, status: Optional[str]) -> None:
-    tasks: List[Dict[str, Any]] = load_json(_tasks_path(workspace), [])
-    if status:
-        tasks = [t for t in tasks if t.get("status") == status]
-    print(json.dumps({"success": True, "data": tasks}, ensure_ascii=False))
-
-
-def add_task(workspace, args) -> None:
-    path = _tasks_path(workspace)
-    with file_lock(path):
-        tasks = load_json(path, [])
-        task_id = str(uuid.uuid4())
-        task = {
-            "id": task_id,
-            "title": args.title,
-            "project": args.project,
-            "status": "open",
-            "priority": args.priority,
-            "context": args.context,
-            "created": iso_now(),
-            "due": args.due,
-            "remind": args.remind,
-            "recurrence": args.recurrence,
-        }
-        tasks.append(task)
-        atomic_write_json(path, tasks)
-    print(json.dumps({"success": True, "data": {"id": task_id}}, ensure_ascii=False))
-
-
-def update_task(workspace, args) -> None:
-    path = _tasks_path(workspace)
-    with file_lock(path):
-        tasks = load_json(path, [])
-        found = False
-        for task in tasks:
-            if task.get("id") == args.id:
-                if args.remind is not None:
-                    task.pop("remind_sent_at", None)
-                for field in ("title", "project", "status", "priority", "context", "due", "remind", "recurrence"):
-                    value = getattr(args, field)
-                    if value is not None:
-                        task[field] = value
-                found = True
-        if not found:
-            print(json.dumps({"success": False, "error": "Task not found"}, ensure_ascii=False))
-            sys.exit(1)
-        atomic_write_json(path, tasks)
-    print(json.dumps({"success": True, "data": {"id": args.id}}, ensure_ascii=False))
-
-
-def complete_task(workspace, task_id: str) -> None:
-    path = _tasks_path(workspace)
-    with file_lock(path):
-        tasks = load_json(path, [])
-        new_task = None
-        found = False
+FIELDS = ("title", "project", "status", "priority", "context", "due", "remind", "recurrence")
+# Searched by list --match
+TEXT_FIELDS = ("title", "context", "project")
+
+
+def _naive(value: Optional[str]) -> Optional[datetime]:
+    dt = parse_dt(value)
+    return dt.replace(tzinfo=None) if dt is not None and dt.tzinfo is not None else dt
+
+
+def list_tasks(workspace, args) -> Dict[str, Any]:
+    store = collection(workspace, "tasks")
+    equal = {field: getattr(args, field) for field in ("status", "project", "priority") if getattr(args, field)}
+    tasks: List[Dict[str, Any]] = store.find(**equal) if equal else store.all()
+
+    # Due range is half-open: after <= due < before
+    after, before = _naive(args.due_after), _naive(args.due_before)
+    now = datetime.now()
+    if after or before or args.overdue:
+        kept = []
         for task in tasks:
-            if task.get("id") == task_id:
-                task["status"] = "completed"
-                task["completed"] = iso_now()
-                found = True
-                rec = task.get("recurrence")
-                if rec:
-                    new_due = _advance_due(task.get("due"), rec)
-                    new_remind = None
-                    due_dt = parse_dt(task.get("due"))
-                    remind_dt = parse_dt(task.get("remind"))
-                    if new_due and due_dt and remind_dt:
-                        delta = due_dt - remind_dt
-                        new_due_dt = parse_dt(new_due)
-                        if new_due_dt:
-                            new_remind = (new_due_dt - delta).isoformat()
-                    new_task = {
-                        "id": str(uuid.uuid4()),
-                        "title": task.get("title"),
-                        "project": task.get("project"),
-                        "status": "open",
-                        "priority": task.get("priority"),
-                        "context": task.get("context"),
-                        "created": iso_now(),
-                        "due": new_due,
-                        "remind": new_remind,
-                        "recurrence": rec,
-                    }
-        if not found:
-            print(json.dumps({"success": False, "error": "Task not found"}, ensure_ascii=False))
-            sys.exit(1)
-        if new_task:
-            tasks.append(new_task)
-        atomic_write_json(path, tasks)
-    print(json.dumps({"success": True, "data": {"id": task_id}}, ensure_ascii=False))
+            due = _naive(task.get("due"))
+            if due is None:
+                continue
+            if (after and due < after) or (before and due >= before):
+                continue
+            if args.overdue and (due >= now or task.get("status") == "completed"):
+                continue
+            kept.append(task)
+        tasks = kept
+    return select(tasks, args, TEXT_FIELDS)
+
+
+def _add(store, fields: Dict[str, Any]) -> Dict[str, Any]:
+    if not fields.get("title"):
+        return {"success": False, "error": "Missing title"}
+    task_id = str(uuid.uuid4())
+    task = {
+        "id": task_id,
+        "title": fields["title"],
+        "project": fields.get("project"),
+        "status": "open",
+        "priority": fields.get("priority"),
+        "context": fields.get("context"),
+        "created": iso_now(),
+        "due": fields.get("due"),
+        "remind": fields.get("remind"),
+        "recurrence": fields.get("recurrence"),
+    }
+    store.insert(task)
+    return {"success": True, "data": {"id": task_id}}
+
+
+def _update(store, fields: Dict[str, Any]) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {}
+    if fields.get("remind") is not None:
+        # New reminder time: let it fire again
+        changes["remind_sent_at"] = None
+    for field in FIELDS:
+        value = fields.get(field)
+        if value is not None:
+            changes[field] = value
+    task_id = resolve_id(store, fields.get("id"))
+    if task_id is None or store.update(task_id, changes) is None:
+        return {"success": False, "error": "Task not found"}
+    return {"success": True, "data": {"id": task_id}}
+
+
+def _complete(store, fields: Dict[str, Any]) -> Dict[str, Any]:
+    with store.transaction():
+        task_id = resolve_id(store, fields.get("id"))
+        task = store.update(task_id, {"status": "completed", "completed": iso_now()}) if task_id else None
+        rec = task.get("recurrence") if task else None
+        if rec:
+            new_due = _advance_due(task.get("due"), rec)
+            new_remind = None
+            due_dt = parse_dt(task.get("due"))
+            remind_dt = parse_dt(task.get("remind"))
+            if new_due and due_dt and remind_dt:
+                delta = due_dt - remind_dt
+                new_due_dt = parse_dt(new_due)
+                if new_due_dt:
+                    new_remind = (new_due_dt - delta).isoformat()
+            store.insert(
+                {
+                    "id": str(uuid.uuid4()),
+                    "title": task.get("title"),
+                    "project": task.get("project"),
+                    "status": "open",
+                    "priority": task.get("priority"),
+                    "context": task.get("context"),
+                    "created": iso_now(),
+                    "due": new_due,
+                    "remind": new_remind,
+                    "recurrence": rec,
+                }
+            )
+    if task is None:
+        return {"success": False, "error": "Task not found"}
+    return {"success": True, "data": {"id": task_id}}
+
+
+OPERATIONS = {"add": _add, "update": _update, "complete": _complete}
+
+
+def apply(workspace, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run ``{"op": "add"|"update"|"complete", ...}`` items under one store lock; results in order."""
+    store = collection(workspace, "tasks")
+    results = []
+    with store.transaction():
+        for op in operations:
+            handler = OPERATIONS.get(str(op.get("op")))
+            if handler is None:
+                results.append({"success": False, "error": f"Unknown op: {op.get('op')}"})
+                continue
+            try:
+                results.append(handler(store, op))
+            except Exception as exc:
+                results.append({"success": False, "error": str(exc)})
+    return results
 
 
 def main() -> None:
@@ -146,6 +180,12 @@ def main() -> None:
 
     list_p = sub.add_parser("list")
     list_p.add_argument("--status", default=None)
+    list_p.add_argument("--project", default=None)
+    list_p.add_argument("--priority", default=None)
+    list_p.add_argument("--due-after", default=None, help="Due at or after this ISO date/time")
+    list_p.add_argument("--due-before", default=None, help="Due before this ISO date/time")
+    list_p.add_argument("--overdue", action="store_true", help="Past due and not completed")
+    add_list_arguments(list_p)
 
     add_p = sub.add_parser("add")
     add_p.add_argument("--title", required=True)
@@ -170,21 +210,22 @@ def main() -> None:
     comp_p = sub.add_parser("complete")
     comp_p.add_argument("--id", required=True)
 
+    sub.add_parser("batch", help="Read add/update/complete operations (JSON list or NDJSON) from stdin")
+
+    add_format_argument(parser, sub)
     args = parser.parse_args()
     workspace = resolve_workspace()
 
     try:
+        store = collection(workspace, "tasks")
         if args.cmd == "list":
-            list_tasks(workspace, args.status)
-        elif args.cmd == "add":
-            add_task(workspace, args)
-        elif args.cmd == "update":
-            update_task(workspace, args)
-        elif args.cmd == "complete":
-            complete_task(workspace, args.id)
+            emit(list_tasks(workspace, args), args, store)
+        elif args.cmd == "batch":
+            emit(batch_result(apply(workspace, read_operations(sys.stdin))), args, store)
+        else:
+            emit(apply(workspace, [{**vars(args), "op": args.cmd}])[0], args, store)
     except Exception as exc:
-        print(json.dumps({"success": False, "error": str(exc)}))
-        sys.exit(1)
+        emit({"success": False, "error": str(exc)}, args)
 
 
 if __name__ == "__main__":
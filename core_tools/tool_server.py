@@ -0,0 +1,136 @@
+"""Resident tool server: runs core tool calls without a new interpreter each time.
+
+Listens on data/tools.sock of one workspace. Each connection carries one
+call, ``{"tool", "argv", "env", "stdin"}`` as a JSON line, and gets back
+``{"exit", "stdout", "stderr"}``. The tool's own ``main()`` runs exactly
+as from the command line, so arguments and output are identical; what
+stays warm between calls are the imports, the memory index, journal
+replays and SQLite connections. Calls run one at a time.
+
+Started by the scheduler when ``AIDE_TOOL_SERVER=1``, or by hand:
+``python core_tools/tool_server.py [--workspace PATH]``.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from _tool_client import call, socket_path
+from _utils import load_workspace_env, resolve_workspace
+
+# Tools served here; the rest (send_message, storage_manage) always run in-process
+TOOLS = ("memory_manage", "task_manage", "cron_manage", "project_manage")
+REQUEST_TIMEOUT_S = 10.0
+
+
+def run_tool(workspace: Path, tool: str, argv: list, env: Dict[str, str], stdin: str = "") -> Dict[str, Any]:
+    """Run ``tool``'s main() with ``argv`` and the caller's AIDE_* variables."""
+    if tool not in TOOLS:
+        return {"exit": 1, "stdout": json.dumps({"success": False, "error": f"Unknown tool: {tool}"}) + "\n"}
+    module = importlib.import_module(tool)
+
+    saved_env = {k: v for k, v in os.environ.items() if k.startswith("AIDE_")}
+    saved_argv, saved_stdin = sys.argv, sys.stdin
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    try:
+        for key in saved_env:
+            os.environ.pop(key, None)
+        os.environ.update({k: str(v) for k, v in env.items() if k.startswith("AIDE_")})
+        os.environ["AIDE_WORKSPACE"] = str(workspace)
+        sys.argv = [f"{tool}.py"] + [str(a) for a in argv]
+        sys.stdin = io.StringIO(stdin)
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                module.main()
+            except SystemExit as exc:
+                code = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+                if isinstance(exc.code, str):
+                    print(exc.code, file=sys.stderr)
+            except Exception as exc:
+                # main() reports its own errors; this is argument handling etc.
+                print(json.dumps({"success": False, "error": str(exc)}))
+                code = 1
+    finally:
+        sys.argv, sys.stdin = saved_argv, saved_stdin
+        for key in [k for k in os.environ if k.startswith("AIDE_")]:
+            del os.environ[key]
+        os.environ.update(saved_env)
+    return {"exit": code, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    timeout = REQUEST_TIMEOUT_S
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            reply = run_tool(
+                self.server.workspace,
+                str(request["tool"]),
+                list(request.get("argv") or []),
+                dict(request.get("env") or {}),
+                str(request.get("stdin") or ""),
+            )
+        except Exception as exc:
+            reply = {"exit": 1, "stdout": json.dumps({"success": False, "error": str(exc)}) + "\n"}
+        self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8"))
+
+
+class ToolServer(socketserver.UnixStreamServer):
+    def __init__(self, workspace: Path) -> None:
+        self.workspace = workspace
+        super().__init__(socket_path(str(workspace)), _Handler)
+        os.chmod(self.server_address, 0o600)
+
+
+def serve(workspace: Path) -> None:
+    path = Path(socket_path(str(workspace)))
+    if path.exists():
+        try:
+            # Probe with a real call: a live server answers, a stale socket refuses
+            if call(str(workspace), "", []) is not None:
+                print(f"[INFO] Tool server already running on {path}")
+                return
+        except OSError:
+            pass
+        path.unlink(missing_ok=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    for tool in TOOLS:
+        importlib.import_module(tool)
+    server = ToolServer(workspace)
+    # Stopping the scheduler (or kill) must not leave a stale socket behind
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"[INFO] Tool server listening on {path}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve core tool calls over a unix socket")
+    parser.add_argument("--workspace", default=None)
+    args = parser.parse_args()
+
+    if args.workspace:
+        os.environ["AIDE_WORKSPACE"] = args.workspace
+    workspace = resolve_workspace()
+    load_workspace_env(workspace)
+    serve(workspace)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@ import argparse
 import asyncio
 import os
 import time
-from functools import partial
 from pathlib import Path
 from typing import Any, Dict, Optional
 
@@ -11,13 +10,18 @@ from telegram.constants import ParseMode
 from telegram.error import BadRequest
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
 
-from agent import run_agent
+from agent import needs_rollover, rollover_session_async, run_agent_async, warm_worker_pool
 from config import get_allowed_users, load_workspace_env, resolve_workspace
-from context import recall_memory
-from core_tools._utils import atomic_write_json, file_lock, load_json
+from context import build_prompt, message_text
+from core_tools._storage import mapping
+from process_tree import kill_tree
 
 
 RUNNING: Dict[int, Any] = {}
+# chat id -> session rollover still running after a reply (cancelled by /stop)
+ROLLOVERS: Dict[int, asyncio.Task] = {}
+# Messages are handled concurrently (block=False); this keeps one turn at a time per chat, in order
+CHAT_LOCKS: Dict[int, asyncio.Lock] = {}
 
 
 def _escape_markdown_v2(text: str) -> str:
@@ -29,27 +33,12 @@ def _escape_markdown_v2(text: str) -> str:
     return text
 
 
-def _sessions_path(workspace: Path) -> Path:
-    return workspace / "data" / "sessions.json"
-
-
 def _get_session_id(workspace: Path, chat_id: int) -> Optional[str]:
-    path = _sessions_path(workspace)
-    with file_lock(path):
-        data = load_json(path, {})
-        return data.get(str(chat_id))
+    return mapping(workspace, "sessions").get(str(chat_id))
 
 
 def _set_session_id(workspace: Path, chat_id: int, session_id: Optional[str]) -> None:
-    path = _sessions_path(workspace)
-    with file_lock(path):
-        data = load_json(path, {})
-        key = str(chat_id)
-        if session_id:
-            data[key] = session_id
-        else:
-            data.pop(key, None)
-        atomic_write_json(path, data)
+    mapping(workspace, "sessions").set(str(chat_id), session_id or None)
 
 
 def _is_allowed(user_id: Optional[int], allowed: list[int]) -> bool:
@@ -66,16 +55,6 @@ def _ensure_inbox(workspace: Path) -> Path:
     return inbox
 
 
-def _build_prompt(text: Optional[str], attachment_paths: list[str]) -> str:
-    base = text.strip() if text else ""
-    if attachment_paths:
-        attachments = "\n".join(f"- {p}" for p in attachment_paths)
-        if base:
-            return f"{base}\n\nAttachments:\n{attachments}"
-        return f"Attachment received:\n{attachments}"
-    return base
-
-
 def _split_text(text: str, limit: int = 3800) -> list[str]:
     if len(text) <= limit:
         return [text]
@@ -177,19 +156,50 @@ async def cmd_new(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
     proc = RUNNING.get(chat_id)
-    if not proc:
+    rollover = ROLLOVERS.get(chat_id)
+    if not proc and not rollover:
         await update.message.reply_text("No session running.")
         return
-    proc.terminate()
-    try:
-        proc.wait(timeout=2)
-    except Exception:
-        proc.kill()
+    if proc:
+        kill_tree(proc)
+    if rollover:
+        rollover.cancel()
     RUNNING.pop(chat_id, None)
+    ROLLOVERS.pop(chat_id, None)
     await update.message.reply_text("Session stopped.")
 
 
+async def _rollover(workspace: Path, chat_id: int, session_id: str) -> None:
+    """Continue the chat in a fresh session seeded with a summary (in the background)."""
+
+    def _process_cb(proc):
+        RUNNING[chat_id] = proc
+
+    try:
+        rolled_id = await rollover_session_async(
+            session_id,
+            working_dir=workspace,
+            process_cb=_process_cb,
+            session_key=f"telegram:{chat_id}",
+            caller="telegram",
+        )
+        if rolled_id and _get_session_id(workspace, chat_id) == session_id:
+            _set_session_id(workspace, chat_id, rolled_id)
+    except Exception:
+        pass  # the chat simply keeps its old session
+    finally:
+        RUNNING.pop(chat_id, None)
+        ROLLOVERS.pop(chat_id, None)
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Taken before the first await, so a chat's messages run in arrival order
+    chat_lock = CHAT_LOCKS.setdefault(update.effective_chat.id, asyncio.Lock())
+    async with chat_lock:
+        await _handle_message(update, context)
+
+
+async def _handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     workspace = resolve_workspace(context.application.bot_data.get("workspace"))
     load_workspace_env(workspace)
 
@@ -230,7 +240,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             await file.download_to_drive(custom_path=str(target))
             attachment_paths.append(str(target))
 
-    prompt = _build_prompt(message.text or message.caption, attachment_paths)
+    prompt = message_text(message.text or message.caption, attachment_paths)
     if oversize:
         warning = f"Attachment too large (max {int(max_mb)} MB), not downloaded."
         if not prompt:
@@ -245,16 +255,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     session_id = _get_session_id(workspace, update.effective_chat.id)
 
-    # Auto-recall memory context for new sessions
-    if not session_id:
-        memory_context = recall_memory(workspace, prompt)
-        if memory_context:
-            prompt = f"{memory_context}\n\n{prompt}"
+    # Memory and open tasks are recalled for new sessions only; recall uses the
+    # text, attachment paths are random and would make the selection vary
+    prompt = build_prompt(workspace, message.text or message.caption, attachment_paths, recall=not session_id)
 
     def _process_cb(proc):
         RUNNING[update.effective_chat.id] = proc
 
-    loop = asyncio.get_running_loop()
     progress_queue: Optional[asyncio.Queue] = None
     progress_task: Optional[asyncio.Task] = None
 
@@ -264,26 +271,24 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             _progress_worker(context.bot, update.effective_chat.id, thinking.message_id, progress_queue)
         )
 
-        def _tool_cb(name: str) -> None:
+        # run_agent_async invokes callbacks on the event loop thread
+        def _tool_cb(name: str, inp: Dict[str, Any]) -> None:
             if not progress_queue:
                 return
-            msg = _progress_text(name)
-            loop.call_soon_threadsafe(progress_queue.put_nowait, msg)
+            progress_queue.put_nowait(_progress_text(name))
     else:
-        def _tool_cb(name: str) -> None:
+        def _tool_cb(name: str, inp: Dict[str, Any]) -> None:
             return
 
     try:
-        answer, new_session_id, _tool_log = await loop.run_in_executor(
-            None,
-            partial(
-                run_agent,
-                prompt,
-                session_id=session_id,
-                working_dir=workspace,
-                process_cb=_process_cb,
-                tool_cb=_tool_cb,
-            ),
+        answer, new_session_id, _tool_log = await run_agent_async(
+            prompt,
+            session_id=session_id,
+            working_dir=workspace,
+            process_cb=_process_cb,
+            tool_cb=_tool_cb,
+            session_key=f"telegram:{update.effective_chat.id}",
+            caller="telegram",
         )
     except Exception as exc:
         RUNNING.pop(update.effective_chat.id, None)
@@ -351,6 +356,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 text=chunk,
             )
 
+    # Context is getting full: roll over after the reply is out. Only this chat's
+    # next message waits (on the chat lock) and resumes the new session
+    if new_session_id and needs_rollover(new_session_id, workspace):
+        chat_id = update.effective_chat.id
+        rollover = ROLLOVERS[chat_id] = asyncio.create_task(_rollover(workspace, chat_id, new_session_id))
+        await asyncio.wait({rollover})
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Aide Telegram bot")
@@ -369,6 +381,7 @@ def main() -> None:
         raise RuntimeError("Missing TELEGRAM_TOKEN in workspace .env")
 
     allowed = get_allowed_users()
+    warm_worker_pool(workspace)
 
     app = ApplicationBuilder().token(token).build()
     app.bot_data["workspace"] = str(workspace)
@@ -376,7 +389,8 @@ def main() -> None:
 
     app.add_handler(CommandHandler("new", cmd_new))
     app.add_handler(CommandHandler("stop", cmd_stop))
-    app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_message))
+    # block=False: a long turn or rollover in one chat must not hold up other chats, /new or /stop
+    app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_message, block=False))
 
     app.run_polling()
 
@@ -0,0 +1,133 @@
+"""Spawning and killing Claude CLI processes together with their tool children.
+
+Every CLI process starts in its own session (and so its own process group),
+so stopping a run signals the whole tree: Bash commands and python tools
+the agent started die with it instead of lingering as orphans. Optional
+resource limits are applied to the CLI and inherited by everything it runs:
+
+- ``AIDE_AGENT_RLIMIT_AS_MB``: address space per process (node reserves a
+  lot of virtual memory, keep this generous)
+- ``AIDE_AGENT_RLIMIT_CPU_S``: CPU seconds per process over its lifetime
+  (a pooled worker counts all of its turns)
+- ``AIDE_AGENT_RLIMIT_NOFILE``: open files per process
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Any, Callable, List, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not on POSIX
+    resource = None
+
+
+KILL_GRACE_S = 2.0
+
+
+def _env_limit(name: str) -> int:
+    raw = os.environ.get(name, "").strip()
+    try:
+        return max(0, int(raw)) if raw else 0
+    except ValueError:
+        return 0
+
+
+def resource_limits() -> List[Tuple[int, int]]:
+    """(resource, soft limit) pairs configured for agent runs."""
+    if resource is None:
+        return []
+    limits = []
+    as_mb = _env_limit("AIDE_AGENT_RLIMIT_AS_MB")
+    if as_mb:
+        limits.append((resource.RLIMIT_AS, as_mb * 1024 * 1024))
+    cpu_s = _env_limit("AIDE_AGENT_RLIMIT_CPU_S")
+    if cpu_s:
+        limits.append((resource.RLIMIT_CPU, cpu_s))
+    nofile = _env_limit("AIDE_AGENT_RLIMIT_NOFILE")
+    if nofile:
+        limits.append((resource.RLIMIT_NOFILE, nofile))
+    return limits
+
+
+def _clamp(res: int, soft: int, current: Tuple[int, int]) -> Tuple[int, int]:
+    """Never raise above the current hard limit (that needs privileges)."""
+    hard = current[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    # RLIMIT_CPU sends SIGXCPU at the soft limit; leave room for SIGKILL at the hard one
+    if res == resource.RLIMIT_CPU:
+        return soft, soft + 5 if hard == resource.RLIM_INFINITY else hard
+    return soft, hard
+
+
+def _preexec(limits: List[Tuple[int, int]]) -> Callable[[], None]:
+    def _apply() -> None:
+        for res, soft in limits:
+            resource.setrlimit(res, _clamp(res, soft, resource.getrlimit(res)))
+
+    return _apply
+
+
+def spawn(cmd: List[str], **kwargs: Any) -> subprocess.Popen:
+    """``subprocess.Popen`` in a new session with the configured limits applied."""
+    limits = resource_limits()
+    if limits and not hasattr(resource, "prlimit"):
+        # preexec_fn is not thread-safe; only used where prlimit is missing
+        kwargs["preexec_fn"] = _preexec(limits)
+    proc = subprocess.Popen(cmd, start_new_session=True, **kwargs)
+    if limits and hasattr(resource, "prlimit"):
+        try:
+            for res, soft in limits:
+                resource.prlimit(proc.pid, res, _clamp(res, soft, resource.prlimit(proc.pid, res)))
+        except (OSError, ValueError):
+            pass
+    return proc
+
+
+def _signal_group(proc: subprocess.Popen, sig: int) -> bool:
+    """Signal the run's process group; False once nothing is left in it."""
+    try:
+        os.killpg(proc.pid, sig)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Group id reused by someone else's process: only touch our child
+        if proc.poll() is None:
+            proc.send_signal(sig)
+            return True
+        return False
+
+
+def _reap(proc: subprocess.Popen, grace_s: float) -> None:
+    deadline = time.monotonic() + grace_s
+    while time.monotonic() < deadline:
+        proc.poll()
+        if proc.returncode is not None and not _signal_group(proc, 0):
+            return
+        time.sleep(0.05)
+    _signal_group(proc, signal.SIGKILL)
+    try:
+        proc.wait(timeout=grace_s)
+    except subprocess.TimeoutExpired:
+        pass
+
+
+def kill_tree(proc: subprocess.Popen, grace_s: float = KILL_GRACE_S, wait: bool = False) -> None:
+    """SIGTERM the whole process group, SIGKILL whatever survives ``grace_s``.
+
+    The escalation and reaping run on a background thread unless ``wait``
+    is set, so callers on an event loop are never blocked.
+    """
+    if not _signal_group(proc, signal.SIGTERM):
+        proc.poll()
+        return
+    if wait:
+        _reap(proc, grace_s)
+        return
+    threading.Thread(target=_reap, args=(proc, grace_s), daemon=True).start()
+
@@ -1,7 +1,12 @@
 import argparse
+import atexit
 import hashlib
 import json
 import os
+import shutil
+import signal
+import subprocess
+import sys
 import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
@@ -10,14 +15,19 @@ from typing import Any, Dict, List, Optional
 
 from croniter import croniter
 
-from agent import run_agent
+from agent import run_agent, warm_worker_pool
 from config import load_workspace_env, resolve_workspace
-from core_tools._utils import atomic_write_json, file_lock, load_json, parse_dt
+from core_tools._storage import backend, collection, compact_journals
+from core_tools._tool_client import call as call_tool_server
+from core_tools._utils import parse_dt
 from core_tools.send_message import send_message
 
 
 POLL_INTERVAL_S = 60
 GRACE_WINDOW_S = 61
+TOOL_SERVER_SCRIPT = Path(__file__).resolve().parent / "core_tools" / "tool_server.py"
+
+_tool_server: Optional[subprocess.Popen] = None
 
 
 def _get_worker_count() -> int:
@@ -76,6 +86,78 @@ def _cleanup_logs(workspace: Path, days: int = 14) -> None:
             continue
 
 
+def _cleanup_transcripts(workspace: Path, days: int = 7) -> None:
+    transcript_dir = workspace / "data" / "transcripts"
+    if not transcript_dir.exists():
+        return
+    cutoff = datetime.now().date() - timedelta(days=days)
+    for day_dir in transcript_dir.iterdir():
+        try:
+            date = datetime.fromisoformat(day_dir.name).date()
+            if date < cutoff:
+                shutil.rmtree(day_dir, ignore_errors=True)
+        except Exception:
+            continue
+
+
+def _compact_journals(workspace: Path) -> None:
+    if backend(workspace) != "journal":
+        return
+    compacted = compact_journals(workspace)
+    if compacted:
+        _log_line(workspace, f"Compacted journals: {', '.join(compacted)}")
+
+
+def _tool_server_enabled() -> bool:
+    return os.environ.get("AIDE_TOOL_SERVER", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _tool_server_answers(workspace: Path) -> bool:
+    try:
+        return call_tool_server(str(workspace), "", []) is not None
+    except OSError:
+        return False
+
+
+def _ensure_tool_server(workspace: Path) -> None:
+    """Keep the resident tool server running (restarted if it died)."""
+    global _tool_server
+    if not _tool_server_enabled():
+        return
+    if _tool_server is not None and _tool_server.poll() is None:
+        return
+    if _tool_server is not None and _tool_server.returncode:
+        _log_line(workspace, f"Tool server exited ({_tool_server.returncode}), restarting")
+    # One started by hand (or left behind) already serves the socket: a new one would just exit
+    if _tool_server_answers(workspace):
+        return
+    log_dir = workspace / "data" / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    with (log_dir / "tools.log").open("a", encoding="utf-8") as log:
+        _tool_server = subprocess.Popen(
+            [sys.executable, str(TOOL_SERVER_SCRIPT), "--workspace", str(workspace)],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+
+
+def _stop_tool_server() -> None:
+    if _tool_server is None or _tool_server.poll() is not None:
+        return
+    _tool_server.terminate()
+    try:
+        _tool_server.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        _tool_server.kill()
+
+
+def _on_sigterm(signum, frame) -> None:
+    # Stop the tool server, then die from SIGTERM as before (running jobs are not waited for)
+    _stop_tool_server()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
 def _heartbeat_soon_hours() -> int:
     raw = os.environ.get("AIDE_HEARTBEAT_SOON_HOURS", "24").strip().lower()
     try:
@@ -116,7 +198,6 @@ def _execute_heartbeat_job(workspace: Path) -> None:
         _log_line(workspace, f"Heartbeat: outside working hours ({start_hour}-{end_hour}), skipping")
         return
 
-    tasks_path = workspace / "data" / "tasks.json"
     heartbeat_path = workspace / "data" / "last_heartbeat.json"
     overdue: List[Dict[str, Any]] = []
     upcoming: List[Dict[str, Any]] = []
@@ -124,18 +205,17 @@ def _execute_heartbeat_job(workspace: Path) -> None:
     soon_hours = _heartbeat_soon_hours()
     soon_cutoff = now + timedelta(hours=soon_hours)
 
-    with file_lock(tasks_path):
-        tasks: List[Dict[str, Any]] = load_json(tasks_path, [])
-        for task in tasks:
-            if task.get("status") == "completed":
-                continue
-            due_dt = parse_dt(task.get("due"))
-            if not due_dt:
-                continue
-            if due_dt <= now:
-                overdue.append({"due": due_dt, "task": task})
-            elif due_dt <= soon_cutoff:
-                upcoming.append({"due": due_dt, "task": task})
+    tasks: List[Dict[str, Any]] = collection(workspace, "tasks").all()
+    for task in tasks:
+        if task.get("status") == "completed":
+            continue
+        due_dt = parse_dt(task.get("due"))
+        if not due_dt:
+            continue
+        if due_dt <= now:
+            overdue.append({"due": due_dt, "task": task})
+        elif due_dt <= soon_cutoff:
+            upcoming.append({"due": due_dt, "task": task})
 
     if not overdue and not upcoming:
         _log_line(workspace, "Heartbeat: nothing to report")
@@ -185,18 +265,22 @@ def _execute_cron_job(workspace: Path, job_id: Optional[str], prompt: str) -> No
         if job_id == "heartbeat":
             _execute_heartbeat_job(workspace)
             return
-        answer, _sid, _tool_log = run_agent(prompt, working_dir=workspace)
+        answer, _sid, _tool_log = run_agent(
+            prompt,
+            working_dir=workspace,
+            session_key=f"cron:{job_id}",
+            caller="scheduler",
+        )
         send_message(answer)
     except Exception as exc:
         _log_line(workspace, f"Cron job failed ({job_id}): {exc}")
 
 
 def _run_cron_jobs(workspace: Path, now: datetime, executor: ThreadPoolExecutor) -> None:
-    cron_path = workspace / "data" / "cron.json"
+    store = collection(workspace, "cron")
     due_jobs: List[Dict[str, Any]] = []
-    with file_lock(cron_path):
-        jobs: List[Dict[str, Any]] = load_json(cron_path, [])
-        changed = False
+    with store.transaction():
+        jobs: List[Dict[str, Any]] = store.all()
 
         for job in jobs:
             if not job.get("enabled", True):
@@ -214,12 +298,8 @@ def _run_cron_jobs(workspace: Path, now: datetime, executor: ThreadPoolExecutor)
                 _log_line(workspace, f"Invalid cron schedule ({job.get('id')}): {schedule} ({exc})")
                 continue
 
-            job["last_run"] = now.isoformat()
+            store.update(job.get("id"), {"last_run": now.isoformat()})
             due_jobs.append({"id": job.get("id"), "prompt": prompt})
-            changed = True
-
-        if changed:
-            atomic_write_json(cron_path, jobs)
 
     for job in due_jobs:
         _log_line(workspace, f"Scheduling cron job {job.get('id')}")
@@ -227,27 +307,24 @@ def _run_cron_jobs(workspace: Path, now: datetime, executor: ThreadPoolExecutor)
 
 
 def _run_task_reminders(workspace: Path, now: datetime) -> None:
-    tasks_path = workspace / "data" / "tasks.json"
+    store = collection(workspace, "tasks")
     due: List[Dict[str, Any]] = []
-    with file_lock(tasks_path):
-        tasks: List[Dict[str, Any]] = load_json(tasks_path, [])
-
-        for task in tasks:
-            if task.get("status") == "completed":
-                continue
-            remind_at = parse_dt(task.get("remind"))
-            if not remind_at:
-                continue
-            sent_at = parse_dt(task.get("remind_sent_at"))
-            if sent_at and sent_at >= remind_at:
-                continue
-            if remind_at <= now:
-                title = task.get("title", "(untitled)")
-                project = task.get("project")
-                message = f"Reminder: {title}"
-                if project:
-                    message += f" (project: {project})"
-                due.append({"id": task.get("id"), "message": message})
+    for task in store.all():
+        if task.get("status") == "completed":
+            continue
+        remind_at = parse_dt(task.get("remind"))
+        if not remind_at:
+            continue
+        sent_at = parse_dt(task.get("remind_sent_at"))
+        if sent_at and sent_at >= remind_at:
+            continue
+        if remind_at <= now:
+            title = task.get("title", "(untitled)")
+            project = task.get("project")
+            message = f"Reminder: {title}"
+            if project:
+                message += f" (project: {project})"
+            due.append({"id": task.get("id"), "message": message})
 
     if not due:
         return
@@ -264,15 +341,9 @@ def _run_task_reminders(workspace: Path, now: datetime) -> None:
     if not sent_ids:
         return
 
-    with file_lock(tasks_path):
-        tasks = load_json(tasks_path, [])
-        changed = False
-        for task in tasks:
-            if task.get("id") in sent_ids:
-                task["remind_sent_at"] = now.isoformat()
-                changed = True
-        if changed:
-            atomic_write_json(tasks_path, tasks)
+    with store.transaction():
+        for task_id in sent_ids:
+            store.update(task_id, {"remind_sent_at": now.isoformat()})
 
 
 def main() -> None:
@@ -284,14 +355,21 @@ def main() -> None:
     load_workspace_env(workspace)
 
     _log_line(workspace, "Scheduler started")
+    # The tool server is our child: it must not outlive us and serve stale code after an update
+    atexit.register(_stop_tool_server)
+    signal.signal(signal.SIGTERM, _on_sigterm)
+    warm_worker_pool(workspace)
     executor = ThreadPoolExecutor(max_workers=_get_worker_count())
 
     while True:
         now = datetime.now()
         try:
+            _ensure_tool_server(workspace)
             _run_cron_jobs(workspace, now, executor)
             _run_task_reminders(workspace, now)
             _cleanup_logs(workspace)
+            _cleanup_transcripts(workspace)
+            _compact_journals(workspace)
         except Exception as exc:
             _log_line(workspace, f"Scheduler error: {exc}")
         time.sleep(POLL_INTERVAL_S)
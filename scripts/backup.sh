@@ -20,6 +20,12 @@ fi
 push_flag=${2:-}
 timestamp=$(date +"%Y-%m-%d %H:%M:%S")
 
+# SQLite storage: fold the write-ahead log into aide.db so the commit is complete
+if [[ -f "$WORKSPACE/data/aide.db" ]]; then
+  $PYTHON_BIN -c "import sqlite3, sys; sqlite3.connect(sys.argv[1]).execute('PRAGMA wal_checkpoint(TRUNCATE)')" \
+    "$WORKSPACE/data/aide.db" || echo "WAL checkpoint failed, backing up the last checkpoint." >&2
+fi
+
 git -C "$WORKSPACE" add -A
 
 if git -C "$WORKSPACE" diff --cached --quiet; then
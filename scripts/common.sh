@@ -64,7 +64,7 @@ telegram_configured () {
 kill_stray_aide_processes () {
   # Kill any orphan Aide Python processes not managed by systemd.
   # This prevents duplicate processes after manual runs from terminal.
-  local scripts=("main.py" "slack_bot.py" "scheduler.py")
+  local scripts=("main.py" "slack_bot.py" "scheduler.py" "tool_server.py")
   local killed=0
   for script in "${scripts[@]}"; do
     local pids
@@ -78,6 +78,8 @@ kill_stray_aide_processes () {
         main.py)       service_pid=$(systemctl show aide-bot --property=MainPID --value 2>/dev/null || echo "0") ;;
         slack_bot.py)  service_pid=$(systemctl show aide-slack --property=MainPID --value 2>/dev/null || echo "0") ;;
         scheduler.py)  service_pid=$(systemctl show aide-scheduler --property=MainPID --value 2>/dev/null || echo "0") ;;
+        # Never a service: a child of the scheduler, which starts a fresh one (with current code)
+        tool_server.py) service_pid=0 ;;
       esac
       if [[ "$pid" != "$service_pid" ]]; then
         echo "Killing stray $script (pid $pid)"
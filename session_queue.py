@@ -0,0 +1,103 @@
+"""Bounded worker pool that runs jobs one at a time per session key.
+
+Jobs for the same key run in arrival order and never overlap, so two quick
+messages in one Slack thread cannot resume the same Claude session twice.
+Consecutive mergeable jobs that piled up for a key behind a running turn
+are handed to the handler as a single batch. An idle key starts at once;
+with ``merge_window_s`` > 0 it first waits that long after its latest job
+so a quick follow-up joins the batch (opt-in: it delays every turn).
+"""
+
+import collections
+import threading
+import time
+import traceback
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+
+Handler = Callable[[str, List[Any]], None]
+
+
+class SessionQueue:
+    def __init__(
+        self,
+        handler: Handler,
+        workers: int = 4,
+        merge_window_s: float = 0.0,
+        max_pending: int = 20,
+    ) -> None:
+        self.handler = handler
+        self.merge_window_s = merge_window_s
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        # Insertion order = order in which keys got work: oldest is served first
+        self._pending: Dict[str, Deque[Tuple[Any, bool]]] = collections.OrderedDict()
+        self._last_arrival: Dict[str, float] = {}
+        self._active: Set[str] = set()
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, name=f"session-queue-{i}", daemon=True).start()
+
+    def submit(self, key: str, item: Any, mergeable: bool = True) -> bool:
+        """Queue ``item`` behind earlier work of ``key``; False when the key's queue is full."""
+        with self._cond:
+            pending = self._pending.setdefault(key, collections.deque())
+            if len(pending) >= self.max_pending:
+                return False
+            pending.append((item, mergeable))
+            self._last_arrival[key] = time.monotonic()
+            self._cond.notify_all()
+            return True
+
+    def cancel(self, key: str) -> int:
+        """Drop work queued (not running) for ``key``; returns how many items."""
+        with self._cond:
+            pending = self._pending.pop(key, None)
+            return len(pending) if pending else 0
+
+    def keys(self) -> List[str]:
+        """Keys with running or queued work."""
+        with self._cond:
+            return list(dict.fromkeys(list(self._active) + list(self._pending)))
+
+    def depth(self, key: Optional[str] = None) -> int:
+        with self._cond:
+            if key is not None:
+                return len(self._pending.get(key, ()))
+            return sum(len(p) for p in self._pending.values())
+
+    def _take_locked(self, now: float) -> Tuple[Optional[str], List[Any], Optional[float]]:
+        """Oldest ready key and its batch, else how long until one is ready."""
+        wait: Optional[float] = None
+        for key, pending in self._pending.items():
+            if key in self._active:
+                continue
+            remaining = self.merge_window_s - (now - self._last_arrival.get(key, 0.0))
+            if remaining > 0:
+                wait = remaining if wait is None else min(wait, remaining)
+                continue
+            item, mergeable = pending.popleft()
+            batch = [item]
+            while mergeable and pending and pending[0][1]:
+                batch.append(pending.popleft()[0])
+            if not pending:
+                del self._pending[key]
+            return key, batch, None
+        return None, [], wait
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    key, batch, wait = self._take_locked(time.monotonic())
+                    if key is not None:
+                        self._active.add(key)
+                        break
+                    self._cond.wait(timeout=wait)
+            try:
+                self.handler(key, batch)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._active.discard(key)
+                    self._cond.notify_all()
@@ -0,0 +1,88 @@
+"""Token usage of agent sessions, recorded from each run's result event.
+
+Stored in data/session_usage.json keyed by session id, so status commands
+can answer instantly instead of resuming the session for an extra model
+call (``agent.get_session_usage`` is still there for an explicit refresh).
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from core_tools._utils import atomic_write_json, file_lock, iso_now, load_json
+
+
+MAX_SESSIONS = 500
+DEFAULT_CONTEXT_WINDOW = 200000
+
+
+def usage_path(workspace: Path) -> Path:
+    return workspace / "data" / "session_usage.json"
+
+
+def record_usage(
+    workspace: Path,
+    session_id: str,
+    result: Dict[str, Any],
+    session_key: Optional[str] = None,
+) -> None:
+    """Store usage from a ``result`` event (or a ``get_session_usage`` answer)."""
+    path = usage_path(workspace)
+    with file_lock(path):
+        data = load_json(path, {})
+        prev = data.get(session_id) or {}
+        cost = result.get("cost_usd") or 0
+        data[session_id] = {
+            "session_id": session_id,
+            "session_key": session_key or prev.get("session_key"),
+            "usage": result.get("usage") or {},
+            "model_usage": result.get("model_usage") or {},
+            "context_usage": result.get("context_usage") or {},
+            "cost_usd": cost,
+            "total_cost_usd": round((prev.get("total_cost_usd") or 0) + cost, 6),
+            "runs": (prev.get("runs") or 0) + 1,
+            "updated": iso_now(),
+        }
+        if len(data) > MAX_SESSIONS:
+            newest = sorted(data.values(), key=lambda item: item.get("updated") or "", reverse=True)
+            data = {item["session_id"]: item for item in newest[:MAX_SESSIONS]}
+        atomic_write_json(path, data)
+
+
+def get_usage(workspace: Path, session_id: str) -> Optional[Dict[str, Any]]:
+    path = usage_path(workspace)
+    with file_lock(path):
+        data = load_json(path, {})
+    return data.get(session_id)
+
+
+def context_stats(usage_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Context fill of a session: model, window, tokens used, percent, remaining.
+
+    Prefers the usage of the last model call (``context_usage``); the
+    per-model totals of a run add up every call and overstate the context.
+    """
+    model_usage = usage_info.get("model_usage") or {}
+    model_name = list(model_usage.keys())[0] if model_usage else "unknown"
+    model_data = model_usage.get(model_name, {})
+    context_window = model_data.get("contextWindow") or DEFAULT_CONTEXT_WINDOW
+
+    last_call = usage_info.get("context_usage") or {}
+    if last_call:
+        total_context = (
+            last_call.get("cache_read_input_tokens", 0)
+            + last_call.get("cache_creation_input_tokens", 0)
+            + last_call.get("input_tokens", 0)
+        )
+    else:
+        total_context = (
+            model_data.get("cacheReadInputTokens", 0)
+            + model_data.get("cacheCreationInputTokens", 0)
+            + model_data.get("inputTokens", 0)
+        )
+    return {
+        "model": model_name,
+        "context_window": context_window,
+        "total_context": total_context,
+        "usage_percent": (total_context / context_window) * 100 if context_window else 0,
+        "remaining": context_window - total_context,
+    }
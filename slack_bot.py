@@ -1,4 +1,5 @@
 import argparse
+import collections
 import os
 import queue
 import re
@@ -14,11 +15,15 @@ from slack_bolt.adapter.socket_mode import SocketModeHandler
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
-from agent import run_agent, get_session_usage
+from agent import get_session_usage, needs_rollover, rollover_session, run_agent, warm_worker_pool
 from config import load_workspace_env, resolve_workspace
-from core_tools._utils import atomic_write_json, file_lock, load_json
+from core_tools._storage import mapping
 from markdown_to_mrkdwn import SlackMarkdownConverter
-from context import recall_memory
+from context import build_prompt, message_text
+from process_tree import kill_tree
+from session_queue import SessionQueue
+from session_usage import context_stats, get_usage
+from thread_cache import ThreadCache
 
 _mrkdwn_converter = SlackMarkdownConverter()
 
@@ -59,10 +64,13 @@ def _tables_to_codeblocks(text: str) -> str:
 
 
 RUNNING: Dict[str, Any] = {}
-
-
-def _sessions_path(workspace: Path) -> Path:
-    return workspace / "data" / "sessions_slack.json"
+_QUEUE: Optional[SessionQueue] = None
+_QUEUE_LOCK = threading.Lock()
+_THREADS: Optional[ThreadCache] = None
+# Thread messages kept for context; the prompt token budget decides how many are used
+HISTORY_FETCH_LIMIT = 100
+# conversations.replies page size (Slack allows up to 1000, recommends 200)
+REPLIES_PAGE_SIZE = 200
 
 
 def _session_key(channel_id: str, thread_ts: Optional[str]) -> str:
@@ -70,25 +78,27 @@ def _session_key(channel_id: str, thread_ts: Optional[str]) -> str:
 
 
 def _get_session_id(workspace: Path, channel_id: str, thread_ts: Optional[str]) -> Optional[str]:
-    path = _sessions_path(workspace)
-    key = _session_key(channel_id, thread_ts)
-    with file_lock(path):
-        data = load_json(path, {})
-        return data.get(key)
+    return mapping(workspace, "sessions_slack").get(_session_key(channel_id, thread_ts))
 
 
 def _set_session_id(
     workspace: Path, channel_id: str, thread_ts: Optional[str], session_id: Optional[str]
 ) -> None:
-    path = _sessions_path(workspace)
-    key = _session_key(channel_id, thread_ts)
-    with file_lock(path):
-        data = load_json(path, {})
-        if session_id:
-            data[key] = session_id
-        else:
-            data.pop(key, None)
-        atomic_write_json(path, data)
+    mapping(workspace, "sessions_slack").set(_session_key(channel_id, thread_ts), session_id or None)
+
+
+def _get_seen_ts(workspace: Path, key: str, session_id: Optional[str]) -> Optional[str]:
+    """Latest thread ts already part of ``session_id``; None for another or a new session."""
+    if not session_id:
+        return None
+    entry = mapping(workspace, "slack_thread_seen").get(key)
+    if not isinstance(entry, dict) or entry.get("session_id") != session_id:
+        return None
+    return entry.get("ts")
+
+
+def _set_seen_ts(workspace: Path, key: str, session_id: str, ts: str) -> None:
+    mapping(workspace, "slack_thread_seen").set(key, {"session_id": session_id, "ts": ts})
 
 
 def _get_allowed_users() -> list[str]:
@@ -137,6 +147,42 @@ def _auto_thread_enabled() -> bool:
     return raw not in ("0", "false", "no", "off")
 
 
+def _env_number(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    try:
+        value = float(raw) if raw else default
+    except ValueError:
+        value = default
+    return value if value >= 0 else default
+
+
+def _session_queue() -> SessionQueue:
+    """Per-thread FIFO: one turn at a time per session, bounded worker threads."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = SessionQueue(
+                _process_batch,
+                workers=int(_env_number("AIDE_SLACK_WORKERS", 4)),
+                merge_window_s=_env_number("AIDE_SLACK_MERGE_WINDOW_S", 0.0),
+                max_pending=int(_env_number("AIDE_SLACK_QUEUE_MAX", 20)),
+            )
+        return _QUEUE
+
+
+def _thread_cache() -> ThreadCache:
+    """Recent messages of active threads, kept current from incoming events."""
+    global _THREADS
+    with _QUEUE_LOCK:
+        if _THREADS is None:
+            _THREADS = ThreadCache(
+                max_threads=int(_env_number("AIDE_SLACK_HISTORY_THREADS", 256)),
+                ttl_s=_env_number("AIDE_SLACK_HISTORY_TTL_S", 3600),
+                max_messages=HISTORY_FETCH_LIMIT,
+            )
+        return _THREADS
+
+
 def _max_file_bytes() -> tuple[int, float]:
     raw = os.environ.get("AIDE_SLACK_MAX_FILE_MB", "10").strip().lower()
     try:
@@ -148,14 +194,27 @@ def _max_file_bytes() -> tuple[int, float]:
     return int(mb * 1024 * 1024), mb
 
 
-def _build_prompt(text: Optional[str], attachment_paths: list[str]) -> str:
-    base = text.strip() if text else ""
-    if attachment_paths:
-        attachments = "\n".join(f"- {p}" for p in attachment_paths)
-        if base:
-            return f"{base}\n\nAttachments:\n{attachments}"
-        return f"Attachment received:\n{attachments}"
-    return base
+def _fetch_thread_messages(client: WebClient, channel_id: str, thread_ts: str) -> Optional[list[Dict[str, Any]]]:
+    """All pages of a thread's replies (oldest first); only the newest are kept."""
+    messages: collections.deque = collections.deque(maxlen=HISTORY_FETCH_LIMIT)
+    parent = None
+    kwargs: Dict[str, Any] = {"channel": channel_id, "ts": thread_ts, "limit": REPLIES_PAGE_SIZE}
+    try:
+        while True:
+            result = client.conversations_replies(**kwargs)
+            for msg in result.get("messages", []):
+                if msg.get("ts") == thread_ts:
+                    parent = msg
+                else:
+                    messages.append(msg)
+            cursor = (result.get("response_metadata") or {}).get("next_cursor")
+            if not result.get("has_more") or not cursor:
+                break
+            kwargs["cursor"] = cursor
+    except SlackApiError as e:
+        print(f"[WARN] Failed to fetch thread history: {e.response.get('error', str(e))}")
+        return None
+    return ([parent] if parent else []) + list(messages)
 
 
 def _fetch_thread_history(
@@ -163,19 +222,15 @@ def _fetch_thread_history(
     channel_id: str,
     thread_ts: str,
     bot_user_id: Optional[str],
-    limit: int = 20,
+    limit: int = HISTORY_FETCH_LIMIT,
 ) -> list[Dict[str, str]]:
-    """Fetch thread history from Slack API. Returns list of {role, content} dicts."""
-    try:
-        result = client.conversations_replies(
-            channel=channel_id,
-            ts=thread_ts,
-            limit=limit,
-        )
-        messages = result.get("messages", [])
-    except SlackApiError as e:
-        print(f"[WARN] Failed to fetch thread history: {e.response.get('error', str(e))}")
-        return []
+    """Thread history from the cache (backfilled from the Slack API on a miss).
+
+    Returns list of {role, content, ts} dicts, the last ``limit`` messages.
+    """
+    messages = _thread_cache().get(
+        channel_id, thread_ts, lambda: _fetch_thread_messages(client, channel_id, thread_ts)
+    )
 
     history = []
     for msg in messages:
@@ -198,29 +253,16 @@ def _fetch_thread_history(
                 text = re.sub(rf"<@{re.escape(bot_user_id)}>", "", text).strip()
 
         if text:
-            history.append({"role": role, "content": text})
+            history.append({"role": role, "content": text, "ts": msg.get("ts", "")})
 
-    return history
+    return history[-limit:]
 
 
-def _format_thread_context(history: list[Dict[str, str]]) -> str:
-    """Format thread history as context for Claude."""
-    if not history:
-        return ""
-
-    lines = ["Previous thread conversation:"]
-    lines.append("---")
-    for msg in history:
-        role_label = "User" if msg["role"] == "user" else "Aide"
-        # Truncate very long messages
-        content = msg["content"]
-        if len(content) > 500:
-            content = content[:500] + "..."
-        lines.append(f"{role_label}: {content}")
-    lines.append("---")
-    lines.append("")
-
-    return "\n".join(lines)
+def _ts_after(ts: str, other: str) -> bool:
+    try:
+        return float(ts) > float(other)
+    except ValueError:
+        return True
 
 
 def _truncate(text: str, max_len: int = 60) -> str:
@@ -382,9 +424,18 @@ def _handle_command(text: str) -> Optional[str]:
         return "stop"
     if cmd in ("session", "status"):
         return "session"
+    if cmd in ("session refresh", "status refresh"):
+        return "session_refresh"
     return None
 
 
+def _session_usage(workspace: Path, session_id: str, refresh: bool = False) -> Optional[Dict[str, Any]]:
+    """Stored usage of the last run; ``refresh`` asks the model (costs a call)."""
+    if refresh:
+        return get_session_usage(session_id, working_dir=workspace)
+    return get_usage(workspace, session_id)
+
+
 def _post_message(
     client: WebClient,
     channel_id: str,
@@ -394,6 +445,8 @@ def _post_message(
     try:
         if thread_ts:
             resp = client.chat_postMessage(channel=channel_id, thread_ts=thread_ts, text=text)
+            if resp.get("ts"):
+                _thread_cache().remember(channel_id, thread_ts, resp.get("message") or {"ts": resp["ts"], "text": text})
         else:
             resp = client.chat_postMessage(channel=channel_id, text=text)
         return resp.get("ts")
@@ -401,11 +454,15 @@ def _post_message(
         return None
 
 
-def _update_message(client: WebClient, channel_id: str, message_ts: str, text: str) -> None:
+def _update_message(
+    client: WebClient, channel_id: str, message_ts: str, text: str, thread_ts: Optional[str] = None
+) -> None:
     try:
         client.chat_update(channel=channel_id, ts=message_ts, text=text)
     except SlackApiError:
         return
+    if thread_ts:
+        _thread_cache().remember(channel_id, thread_ts, {"ts": message_ts, "text": text})
 
 
 def _process_message(
@@ -416,6 +473,7 @@ def _process_message(
     text: str,
     files: list[Dict[str, Any]],
     bot_user_id: Optional[str] = None,
+    merged: int = 1,
 ) -> None:
     cmd = _handle_command(text)
     if cmd == "new":
@@ -424,44 +482,38 @@ def _process_message(
         return
     if cmd == "stop":
         key = _session_key(channel_id, thread_root)
+        dropped = _session_queue().cancel(key)
         proc = RUNNING.get(key)
         if not proc:
-            _post_message(client, channel_id, "No session running.", thread_root)
+            msg = f"Dropped {dropped} queued message(s)." if dropped else "No session running."
+            _post_message(client, channel_id, msg, thread_root)
             return
-        proc.terminate()
-        try:
-            proc.wait(timeout=2)
-        except Exception:
-            proc.kill()
+        kill_tree(proc, wait=True)
         RUNNING.pop(key, None)
         _post_message(client, channel_id, "Session stopped.", thread_root)
         return
-    if cmd == "session":
+    if cmd in ("session", "session_refresh"):
         session_id = _get_session_id(workspace, channel_id, thread_root)
         if not session_id:
             _post_message(client, channel_id, "No active session.", thread_root)
             return
-        _post_message(client, channel_id, "Checking status...", thread_root)
-        usage_info = get_session_usage(session_id, working_dir=workspace)
+        refresh = cmd == "session_refresh"
+        if refresh:
+            _post_message(client, channel_id, "Checking status...", thread_root)
+        usage_info = _session_usage(workspace, session_id, refresh)
         if not usage_info:
-            _post_message(client, channel_id, f"Session: `{session_id[:8]}...` - cannot get info", thread_root)
+            hint = "cannot get info" if refresh else "no usage recorded yet (try `session refresh`)"
+            _post_message(client, channel_id, f"Session: `{session_id[:8]}...` - {hint}", thread_root)
             return
-        model_usage = usage_info.get("model_usage", {})
-        model_name = list(model_usage.keys())[0] if model_usage else "unknown"
-        model_data = model_usage.get(model_name, {})
-        context_window = model_data.get("contextWindow", 200000)
-        cache_read = model_data.get("cacheReadInputTokens", 0)
-        cache_create = model_data.get("cacheCreationInputTokens", 0)
-        input_tokens = model_data.get("inputTokens", 0)
-        total_context = cache_read + cache_create + input_tokens
-        usage_percent = (total_context / context_window) * 100 if context_window else 0
-        remaining = context_window - total_context
+        stats = context_stats(usage_info)
         msg = (
             f"*Session:* `{session_id[:8]}...`\n"
-            f"*Model:* {model_name}\n"
-            f"*Context:* {total_context:,} / {context_window:,} ({usage_percent:.1f}%)\n"
-            f"*Remaining:* ~{remaining:,} tokens"
+            f"*Model:* {stats['model']}\n"
+            f"*Context:* {stats['total_context']:,} / {stats['context_window']:,} ({stats['usage_percent']:.1f}%)\n"
+            f"*Remaining:* ~{stats['remaining']:,} tokens"
         )
+        if usage_info.get("total_cost_usd"):
+            msg += f"\n*Cost:* ${usage_info['total_cost_usd']:.2f}"
         _post_message(client, channel_id, msg, thread_root)
         return
 
@@ -486,7 +538,7 @@ def _process_message(
         except Exception:
             continue
 
-    prompt = _build_prompt(text, attachment_paths)
+    prompt = message_text(text, attachment_paths)
     if oversize:
         warning = f"Attachment too large (max {int(max_mb)} MB), not downloaded."
         if not prompt:
@@ -497,29 +549,32 @@ def _process_message(
         _post_message(client, channel_id, "No text or attachment received.", thread_root)
         return
 
+    key = _session_key(channel_id, thread_root)
+    session_id = _get_session_id(workspace, channel_id, thread_root)
+
     # Fetch thread history for context (exclude the last message which is current prompt)
+    history: list[Dict[str, str]] = []
     if thread_root:
-        history = _fetch_thread_history(client, channel_id, thread_root, bot_user_id, limit=20)
-        # Remove last message if it matches current prompt (avoid duplication)
-        if history and history[-1]["role"] == "user":
+        history = _fetch_thread_history(client, channel_id, thread_root, bot_user_id, limit=HISTORY_FETCH_LIMIT)
+        seen_ts = _get_seen_ts(workspace, key, session_id)
+        if seen_ts:
+            # A resumed session already has the thread up to its last turn; only
+            # replies posted since (e.g. ones that did not mention the bot) are new.
+            # Our own answers after that point are in the session too.
+            history = [msg for msg in history if msg["role"] == "user" and _ts_after(msg["ts"], seen_ts)]
+        # Drop the trailing user messages that make up the current prompt (avoid duplication)
+        for _ in range(merged):
+            if not history or history[-1]["role"] != "user":
+                break
             history = history[:-1]
-        thread_context = _format_thread_context(history)
-        if thread_context:
-            prompt = f"{thread_context}\nCurrent message:\n{prompt}"
 
     thinking_ts = _post_message(client, channel_id, "Thinking...", thread_root)
     if not thinking_ts:
         return
 
-    session_id = _get_session_id(workspace, channel_id, thread_root)
-
-    # Auto-recall memory context for new sessions
-    if not session_id:
-        memory_context = recall_memory(workspace, text)
-        if memory_context:
-            prompt = f"{memory_context}\n\n{prompt}"
-
-    key = _session_key(channel_id, thread_root)
+    # Thread history always, memory and open tasks for new sessions; all
+    # packed into the prompt token budget
+    prompt = build_prompt(workspace, text, attachment_paths, history, recall=not session_id)
 
     def _process_cb(proc):
         RUNNING[key] = proc
@@ -552,6 +607,8 @@ def _process_message(
             working_dir=workspace,
             process_cb=_process_cb,
             tool_cb=_tool_cb,
+            session_key=f"slack:{key}",
+            caller="slack",
         )
     except Exception as exc:
         RUNNING.pop(key, None)
@@ -571,17 +628,29 @@ def _process_message(
 
     if new_session_id:
         _set_session_id(workspace, channel_id, thread_root, new_session_id)
+        if thread_root:
+            _set_seen_ts(workspace, key, new_session_id, thinking_ts)
 
     # Convert tables to code blocks, then Markdown to Slack mrkdwn
     answer = _tables_to_codeblocks(answer)
     answer = _mrkdwn_converter.convert(answer)
 
     chunks = _split_text(answer)
-    _update_message(client, channel_id, thinking_ts, chunks[0])
+    _update_message(client, channel_id, thinking_ts, chunks[0], thread_root)
 
     for chunk in chunks[1:]:
         _post_message(client, channel_id, chunk, thread_root)
 
+    # Context is getting full: continue in a fresh session seeded with a summary.
+    # Runs inside this thread's queue slot, so the next message waits for it.
+    if new_session_id and needs_rollover(new_session_id, workspace):
+        rolled_id = rollover_session(new_session_id, working_dir=workspace, session_key=f"slack:{key}", caller="slack")
+        if rolled_id and _get_session_id(workspace, channel_id, thread_root) == new_session_id:
+            _set_session_id(workspace, channel_id, thread_root, rolled_id)
+            # The summary covers the thread so far
+            if thread_root:
+                _set_seen_ts(workspace, key, rolled_id, thinking_ts)
+
 
 def _handle_event(
     client: WebClient,
@@ -598,13 +667,41 @@ def _handle_event(
         return
 
     cleaned = _strip_mention(text, bot_user_id)
+    cmd = _handle_command(cleaned)
+    if cmd == "stop":
+        # Must not wait behind the turn it is supposed to stop
+        _process_message(client, workspace, channel_id, thread_root, cleaned, files, bot_user_id)
+        return
 
-    thread = threading.Thread(
-        target=_process_message,
-        args=(client, workspace, channel_id, thread_root, cleaned, files, bot_user_id),
-        daemon=True,
+    item = {
+        "client": client,
+        "workspace": workspace,
+        "channel_id": channel_id,
+        "thread_root": thread_root,
+        "text": cleaned,
+        "files": files,
+        "bot_user_id": bot_user_id,
+    }
+    key = _session_key(channel_id, thread_root)
+    if not _session_queue().submit(key, item, mergeable=cmd is None):
+        _post_message(client, channel_id, "Too many queued messages here, wait for the current reply.", thread_root)
+
+
+def _process_batch(key: str, batch: list[Dict[str, Any]]) -> None:
+    """Run one turn for messages of a thread that arrived while it was busy."""
+    first = batch[0]
+    text = "\n\n".join(item["text"] for item in batch if item["text"].strip())
+    files = [f for item in batch for f in item["files"]]
+    _process_message(
+        first["client"],
+        first["workspace"],
+        first["channel_id"],
+        first["thread_root"],
+        text,
+        files,
+        first["bot_user_id"],
+        merged=len(batch),
     )
-    thread.start()
 
 
 def main() -> None:
@@ -625,6 +722,8 @@ def main() -> None:
         raise RuntimeError("Missing SLACK_BOT_TOKEN or SLACK_APP_TOKEN in workspace .env")
 
     allowed = _get_allowed_users()
+    warm_worker_pool(workspace)
+    _session_queue()
 
     app = App(token=bot_token)
     client = app.client
@@ -640,6 +739,7 @@ def main() -> None:
         channel_id = event.get("channel")
         if not channel_id:
             return
+        _thread_cache().observe(channel_id, event)
         thread_root = event.get("thread_ts") or event.get("ts")
         _handle_event(
             client,
@@ -655,6 +755,9 @@ def main() -> None:
 
     @app.event("message")
     def handle_message(body, event, logger):
+        if event.get("channel"):
+            # Every thread message, including our own and edits, keeps the history cache current
+            _thread_cache().observe(event["channel"], event)
         if event.get("subtype") and event.get("subtype") != "file_share":
             return
         if event.get("bot_id"):
@@ -708,13 +811,7 @@ def main() -> None:
         if not _is_allowed(user_id, allowed):
             return
         # Clear all sessions for this channel
-        path = _sessions_path(workspace)
-        with file_lock(path):
-            data = load_json(path, {})
-            to_remove = [k for k in data if k.startswith(f"{channel_id}:")]
-            for k in to_remove:
-                data.pop(k, None)
-            atomic_write_json(path, data)
+        mapping(workspace, "sessions_slack").delete_prefix(f"{channel_id}:")
         _post_message(client, channel_id, "Session reset. Starting fresh.")
 
     @app.command("/stop")
@@ -724,11 +821,15 @@ def main() -> None:
         channel_id = body.get("channel_id")
         if not _is_allowed(user_id, allowed):
             return
-        # Kill any running agent process for this channel
+        # Kill any running agent process for this channel and drop its queued messages
         stopped = False
+        queue = _session_queue()
+        for key in queue.keys():
+            if key.startswith(f"{channel_id}:") and queue.cancel(key):
+                stopped = True
         for key, proc in list(RUNNING.items()):
             if key.startswith(f"{channel_id}:") and proc.poll() is None:
-                proc.terminate()
+                kill_tree(proc)
                 RUNNING.pop(key, None)
                 stopped = True
         if stopped:
@@ -745,43 +846,31 @@ def main() -> None:
             return
 
         # Get ALL sessions for this channel (root + threads)
-        path = _sessions_path(workspace)
-        with file_lock(path):
-            data = load_json(path, {})
-
-        channel_sessions = {k: v for k, v in data.items() if k.startswith(f"{channel_id}:")}
+        channel_sessions = mapping(workspace, "sessions_slack").items(f"{channel_id}:")
 
         if not channel_sessions:
             _post_message(client, channel_id, "No active session in this channel.")
             return
 
-        _post_message(client, channel_id, f"Checking {len(channel_sessions)} session(s)...")
+        refresh = (body.get("text") or "").strip().lower() == "refresh"
+        if refresh:
+            _post_message(client, channel_id, f"Checking {len(channel_sessions)} session(s)...")
 
         messages = []
         for key, session_id in channel_sessions.items():
             thread_ts = key.split(":", 1)[1] if ":" in key else "root"
             thread_label = "channel" if thread_ts == "root" else "thread"
 
-            usage_info = get_session_usage(session_id, working_dir=workspace)
+            usage_info = _session_usage(workspace, session_id, refresh)
             if not usage_info:
-                messages.append(f"*{thread_label}:* `{session_id[:8]}...` - cannot get info")
+                hint = "cannot get info" if refresh else "no usage recorded yet"
+                messages.append(f"*{thread_label}:* `{session_id[:8]}...` - {hint}")
                 continue
 
-            model_usage = usage_info.get("model_usage", {})
-            model_name = list(model_usage.keys())[0] if model_usage else "unknown"
-            model_data = model_usage.get(model_name, {})
-
-            context_window = model_data.get("contextWindow", 200000)
-            cache_read = model_data.get("cacheReadInputTokens", 0)
-            cache_create = model_data.get("cacheCreationInputTokens", 0)
-            input_tokens = model_data.get("inputTokens", 0)
-
-            total_context = cache_read + cache_create + input_tokens
-            usage_percent = (total_context / context_window) * 100 if context_window else 0
-
+            stats = context_stats(usage_info)
             messages.append(
                 f"*{thread_label}:* `{session_id[:8]}...`\n"
-                f"  Context: {total_context:,} / {context_window:,} ({usage_percent:.1f}%)"
+                f"  Context: {stats['total_context']:,} / {stats['context_window']:,} ({stats['usage_percent']:.1f}%)"
             )
 
         _post_message(client, channel_id, "\n\n".join(messages))
@@ -0,0 +1,207 @@
+"""Non-blocking line readers for Claude CLI subprocess pipes.
+
+``read_lines`` (selectors) and ``aread_lines`` (asyncio event loop) drain
+stdout and stderr at the same time, so a chatty stderr can never fill its
+pipe and stall the CLI, and both enforce a wall-clock and an idle timeout
+even while the process is completely silent.
+"""
+
+import asyncio
+import collections
+import os
+import selectors
+import subprocess
+import time
+from typing import AsyncIterator, BinaryIO, Deque, Iterator, List, Optional
+
+
+READ_CHUNK = 65536
+STDERR_TAIL_BYTES = 64 * 1024
+
+
+class LineBuffer:
+    """Splits raw stdout chunks into lines and keeps a bounded stderr tail.
+
+    With ``max_line_bytes`` only the head of an oversized line is kept in
+    memory (the rest is dropped as it arrives); with ``sink`` every stdout
+    byte is also written there untouched, so the full transcript survives.
+    """
+
+    def __init__(self, max_line_bytes: Optional[int] = None, sink: Optional[BinaryIO] = None) -> None:
+        self.max_line_bytes = max_line_bytes
+        self.sink = sink
+        self.truncated_lines = 0
+        self._pending = bytearray()
+        self._overflow = False
+        self._stderr: Deque[bytes] = collections.deque()
+        self._stderr_size = 0
+
+    def _append(self, data: bytes) -> None:
+        if self.max_line_bytes is None:
+            self._pending.extend(data)
+            return
+        room = self.max_line_bytes - len(self._pending)
+        if len(data) > room:
+            if room > 0:
+                self._pending.extend(data[:room])
+            self._overflow = True
+            return
+        self._pending.extend(data)
+
+    def _take(self) -> str:
+        line = self._pending.decode("utf-8", "replace")
+        self._pending.clear()
+        if self._overflow:
+            self.truncated_lines += 1
+            self._overflow = False
+        return line
+
+    def feed(self, chunk: bytes) -> List[str]:
+        if self.sink is not None:
+            self.sink.write(chunk)
+        lines: List[str] = []
+        start = 0
+        while True:
+            idx = chunk.find(b"\n", start)
+            if idx < 0:
+                self._append(chunk[start:])
+                break
+            self._append(chunk[start:idx])
+            lines.append(self._take())
+            start = idx + 1
+        return lines
+
+    def flush(self) -> List[str]:
+        if self.sink is not None:
+            self.sink.flush()
+        if not self._pending:
+            return []
+        return [self._take()]
+
+    def feed_stderr(self, chunk: bytes) -> None:
+        self._stderr.append(chunk)
+        self._stderr_size += len(chunk)
+        while self._stderr_size > STDERR_TAIL_BYTES:
+            first = self._stderr.popleft()
+            excess = self._stderr_size - STDERR_TAIL_BYTES
+            if len(first) > excess:
+                self._stderr.appendleft(first[excess:])
+                self._stderr_size -= excess
+            else:
+                self._stderr_size -= len(first)
+
+    def stderr_text(self) -> str:
+        return b"".join(self._stderr).decode("utf-8", "replace")
+
+
+def _deadline_wait(
+    start: float, last_activity: float, timeout_s: Optional[float], idle_timeout_s: Optional[float]
+) -> Optional[float]:
+    """Seconds until the nearest deadline; raises TimeoutError once one passed."""
+    now = time.monotonic()
+    waits = []
+    if timeout_s:
+        remaining = timeout_s - (now - start)
+        if remaining <= 0:
+            raise TimeoutError("Claude Code CLI timed out.")
+        waits.append(remaining)
+    if idle_timeout_s:
+        remaining = idle_timeout_s - (now - last_activity)
+        if remaining <= 0:
+            raise TimeoutError(f"Claude Code CLI produced no output for {idle_timeout_s:g}s.")
+        waits.append(remaining)
+    return min(waits) if waits else None
+
+
+def read_lines(
+    proc: subprocess.Popen,
+    buf: LineBuffer,
+    timeout_s: Optional[float] = None,
+    idle_timeout_s: Optional[float] = None,
+    drain_stderr: bool = True,
+) -> Iterator[str]:
+    """Yield stdout lines until EOF (or until the caller stops iterating)."""
+    sel = selectors.DefaultSelector()
+    if proc.stdout:
+        sel.register(proc.stdout, selectors.EVENT_READ, "stdout")
+    if drain_stderr and proc.stderr:
+        sel.register(proc.stderr, selectors.EVENT_READ, "stderr")
+
+    start = last_activity = time.monotonic()
+    try:
+        while sel.get_map():
+            wait = _deadline_wait(start, last_activity, timeout_s, idle_timeout_s)
+            for key, _mask in sel.select(timeout=wait):
+                try:
+                    chunk = os.read(key.fd, READ_CHUNK)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    continue
+                last_activity = time.monotonic()
+                if key.data == "stderr":
+                    buf.feed_stderr(chunk)
+                    continue
+                yield from buf.feed(chunk)
+        yield from buf.flush()
+    finally:
+        sel.close()
+
+
+async def aread_lines(
+    proc: subprocess.Popen,
+    buf: LineBuffer,
+    timeout_s: Optional[float] = None,
+    idle_timeout_s: Optional[float] = None,
+    drain_stderr: bool = True,
+) -> AsyncIterator[str]:
+    """Async counterpart of ``read_lines`` driven by ``loop.add_reader``."""
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+    open_fds = {}
+
+    def _on_readable(fd: int, name: str) -> None:
+        try:
+            chunk = os.read(fd, READ_CHUNK)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+        if not chunk:
+            loop.remove_reader(fd)
+            open_fds.pop(fd, None)
+        chunks.put_nowait((name, chunk))
+
+    streams = [(proc.stdout, "stdout")]
+    if drain_stderr:
+        streams.append((proc.stderr, "stderr"))
+    for stream, name in streams:
+        if stream is None:
+            continue
+        fd = stream.fileno()
+        os.set_blocking(fd, False)
+        open_fds[fd] = name
+        loop.add_reader(fd, _on_readable, fd, name)
+
+    start = last_activity = time.monotonic()
+    try:
+        while open_fds or not chunks.empty():
+            wait = _deadline_wait(start, last_activity, timeout_s, idle_timeout_s)
+            try:
+                name, chunk = await asyncio.wait_for(chunks.get(), timeout=wait)
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                continue
+            last_activity = time.monotonic()
+            if name == "stderr":
+                buf.feed_stderr(chunk)
+                continue
+            for line in buf.feed(chunk):
+                yield line
+        for line in buf.flush():
+            yield line
+    finally:
+        for fd in list(open_fds):
+            loop.remove_reader(fd)
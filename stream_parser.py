@@ -0,0 +1,323 @@
+"""Parsing of Claude CLI stream-json lines.
+
+``parse_line`` is the hot path: it peeks at the event type, dispatches to
+one handler that walks ``message.content`` a single time, and never
+decodes huge ``user`` lines (tool results) whose only interesting part
+is the ``tool_use_id``. orjson is used when installed.
+
+The ``_extract_*`` helpers are the generic, format-agnostic fallback for
+event shapes the fast path does not know.
+"""
+
+import json
+import re
+from typing import Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+Event = Dict[str, object]
+
+
+def _parse_json_line(line: str) -> Optional[Event]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return None
+
+
+def _event_type(evt: Event) -> Optional[str]:
+    for key in ("type", "event"):
+        if key in evt and isinstance(evt[key], str):
+            return evt[key]
+    return None
+
+
+def _extract_text(evt: Event) -> Optional[str]:
+    # Common fields
+    text = evt.get("text")
+    if isinstance(text, str):
+        return text
+
+    # Result field (Claude CLI result event)
+    result = evt.get("result")
+    if isinstance(result, str):
+        return result
+
+    # Delta-based streaming
+    delta = evt.get("delta")
+    if isinstance(delta, dict):
+        dt = delta.get("text")
+        if isinstance(dt, str):
+            return dt
+        if isinstance(delta.get("text_delta"), str):
+            return delta.get("text_delta")
+        if isinstance(delta.get("value"), str):
+            return delta.get("value")
+
+    # Content arrays
+    content = evt.get("content")
+    if isinstance(content, list):
+        parts = []
+        for item in content:
+            if isinstance(item, dict) and item.get("type") == "text" and isinstance(item.get("text"), str):
+                parts.append(item["text"])
+        if parts:
+            return "".join(parts)
+
+    # Message wrapper
+    message = evt.get("message")
+    if isinstance(message, dict):
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for item in content:
+                if isinstance(item, dict) and item.get("type") == "text" and isinstance(item.get("text"), str):
+                    parts.append(item["text"])
+            if parts:
+                return "".join(parts)
+
+    return None
+
+
+ToolInfo = Dict[str, object]
+
+
+def _extract_tool_info(block: Dict) -> Optional[ToolInfo]:
+    """Extract tool name and input from a tool_use block."""
+    name = block.get("name") or block.get("tool_name") or block.get("tool")
+    if not isinstance(name, str):
+        return None
+    return {"id": block.get("id"), "name": name, "input": block.get("input", {})}
+
+
+def _tool_key(info: ToolInfo) -> object:
+    # Parallel calls of the same tool differ only by id
+    return info.get("id") or info["name"]
+
+
+def _extract_tools_from_event(evt: Event) -> List[ToolInfo]:
+    """Extract all tool info from an event."""
+    tools: List[ToolInfo] = []
+    seen: set = set()
+
+    # Check message.content for tool_use blocks (Claude CLI format)
+    message = evt.get("message")
+    if isinstance(message, dict):
+        content = message.get("content")
+        if isinstance(content, list):
+            for block in content:
+                if isinstance(block, dict) and block.get("type") == "tool_use":
+                    info = _extract_tool_info(block)
+                    if info and _tool_key(info) not in seen:
+                        tools.append(info)
+                        seen.add(_tool_key(info))
+
+    # Check for tool_use key directly
+    tool_use = evt.get("tool_use")
+    if isinstance(tool_use, dict):
+        info = _extract_tool_info(tool_use)
+        if info and _tool_key(info) not in seen:
+            tools.append(info)
+            seen.add(_tool_key(info))
+    elif isinstance(tool_use, list):
+        for item in tool_use:
+            if isinstance(item, dict):
+                info = _extract_tool_info(item)
+                if info and _tool_key(info) not in seen:
+                    tools.append(info)
+                    seen.add(_tool_key(info))
+
+    # Check for content blocks with tool_use type at top level
+    content = evt.get("content")
+    if isinstance(content, list):
+        for block in content:
+            if isinstance(block, dict) and block.get("type") == "tool_use":
+                info = _extract_tool_info(block)
+                if info and _tool_key(info) not in seen:
+                    tools.append(info)
+                    seen.add(_tool_key(info))
+
+    return tools
+
+
+def _extract_tool_results(evt: Event) -> List[Dict[str, object]]:
+    """Extract tool_result blocks (tool finished) from a user event."""
+    message = evt.get("message")
+    content = message.get("content") if isinstance(message, dict) else None
+    if not isinstance(content, list):
+        return []
+    results = []
+    for block in content:
+        if isinstance(block, dict) and block.get("type") == "tool_result":
+            results.append({"id": block.get("tool_use_id"), "is_error": bool(block.get("is_error"))})
+    return results
+
+
+
+ParsedEvent = Dict[str, object]
+
+# Lines above this size that only carry tool results are scanned, not decoded
+SKIP_DECODE_BYTES = 2048
+
+_TYPE_RE = re.compile(r'\s*\{\s*"type"\s*:\s*"([A-Za-z_]+)"')
+_TOOL_USE_ID_RE = re.compile(r'"tool_use_id"\s*:\s*"([^"\\]+)"')
+# Inside a string value the quotes are escaped, so this only matches a real key
+_IS_ERROR_RE = re.compile(r'"is_error"\s*:\s*(true|false)')
+_TOOL_USE_RE = re.compile(r'"type"\s*:\s*"tool_use"\s*,\s*"id"\s*:\s*"([^"\\]+)"\s*,\s*"name"\s*:\s*"([^"\\]+)"')
+
+
+def _loads(line: str) -> object:
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def _parsed(etype: Optional[str], evt: Optional[Event] = None) -> ParsedEvent:
+    return {
+        "type": etype,
+        "event": evt,
+        "session_id": None,
+        "text": None,
+        "tools": [],
+        "tool_results": [],
+    }
+
+
+def _session_of(evt: Event) -> Optional[str]:
+    sid = evt.get("session_id") or evt.get("session")
+    return sid if isinstance(sid, str) else None
+
+
+def _parse_assistant(evt: Event) -> ParsedEvent:
+    message = evt.get("message")
+    if not isinstance(message, dict):
+        return _parse_generic(evt)
+    out = _parsed("assistant", evt)
+    content = message.get("content")
+    if isinstance(content, list):
+        parts: List[str] = []
+        seen: set = set()
+        for block in content:
+            if not isinstance(block, dict):
+                continue
+            btype = block.get("type")
+            if btype == "text":
+                if isinstance(block.get("text"), str):
+                    parts.append(block["text"])
+            elif btype == "tool_use":
+                info = _extract_tool_info(block)
+                if info and _tool_key(info) not in seen:
+                    out["tools"].append(info)
+                    seen.add(_tool_key(info))
+        if parts:
+            out["text"] = "".join(parts)
+    return out
+
+
+def _parse_user(evt: Event) -> ParsedEvent:
+    out = _parsed("user", evt)
+    out["tool_results"] = _extract_tool_results(evt)
+    return out
+
+
+def _parse_system(evt: Event) -> ParsedEvent:
+    out = _parsed(_event_type(evt), evt)
+    out["session_id"] = _session_of(evt)
+    return out
+
+
+def _parse_result(evt: Event) -> ParsedEvent:
+    out = _parsed("result", evt)
+    out["session_id"] = _session_of(evt)
+    result = evt.get("result")
+    out["text"] = result if isinstance(result, str) else _extract_text(evt)
+    return out
+
+
+def _parse_generic(evt: Event) -> ParsedEvent:
+    etype = _event_type(evt)
+    out = _parsed(etype, evt)
+    if etype in ("system", "session", "result"):
+        out["session_id"] = _session_of(evt)
+    out["text"] = _extract_text(evt)
+    out["tools"] = _extract_tools_from_event(evt)
+    if etype == "user":
+        out["tool_results"] = _extract_tool_results(evt)
+    return out
+
+
+_HANDLERS: Dict[str, Callable[[Event], ParsedEvent]] = {
+    "assistant": _parse_assistant,
+    "user": _parse_user,
+    "system": _parse_system,
+    "result": _parse_result,
+}
+
+
+def _scan_tool_results(line: str, complete: bool) -> List[Dict[str, object]]:
+    """tool_result ids and error flags of a user line, found without decoding it.
+
+    The CLI writes ``tool_use_id`` before a result's content and ``is_error``
+    after it, so each flag belongs to the id before it. Only the last result
+    of a truncated line can have lost its flag; that one stays None.
+    """
+    ids = list(_TOOL_USE_ID_RE.finditer(line))
+    results: List[Dict[str, object]] = []
+    for n, match in enumerate(ids):
+        last = n + 1 == len(ids)
+        # The flag follows the content, so look back from the segment end (str.rfind beats a regex scan)
+        pos = line.rfind('"is_error"', match.end(), len(line) if last else ids[n + 1].start())
+        flag = _IS_ERROR_RE.match(line, pos) if pos >= 0 else None
+        if flag:
+            is_error: Optional[bool] = flag.group(1) == "true"
+        else:
+            is_error = None if last and not complete else False
+        results.append({"id": match.group(1), "is_error": is_error})
+    return results
+
+
+def _parse_truncated(etype: str, line: str) -> Optional[ParsedEvent]:
+    """Salvage what matters from the head of a line cut off by a size cap."""
+    out = _parsed(etype)
+    if etype == "user":
+        out["tool_results"] = _scan_tool_results(line, complete=False)
+        return out
+    if etype == "assistant":
+        out["tools"] = [{"id": tid, "name": name, "input": {}} for tid, name in _TOOL_USE_RE.findall(line)]
+        return out
+    return None
+
+
+def parse_line(line: str) -> Optional[ParsedEvent]:
+    """Parse one stdout line; None for blank or non-JSON lines."""
+    line = line.strip()
+    if not line:
+        return None
+
+    if len(line) > SKIP_DECODE_BYTES:
+        match = _TYPE_RE.match(line)
+        if match and match.group(1) == "user":
+            out = _parsed("user")
+            # A line cut off by LineBuffer.max_line_bytes lacks the closing brace
+            out["tool_results"] = _scan_tool_results(line, complete=line.endswith("}"))
+            return out
+
+    try:
+        evt = _loads(line)
+    except ValueError:
+        # Possibly the head of a line truncated by LineBuffer.max_line_bytes
+        match = _TYPE_RE.match(line)
+        return _parse_truncated(match.group(1), line) if match else None
+    if not isinstance(evt, dict):
+        return None
+
+    etype = evt.get("type")
+    handler = _HANDLERS.get(etype) if isinstance(etype, str) else None
+    return (handler or _parse_generic)(evt)
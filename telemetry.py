@@ -0,0 +1,127 @@
+"""Per-run agent telemetry appended to data/metrics/agent_runs.jsonl."""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from core_tools._utils import file_lock
+
+
+def metrics_enabled() -> bool:
+    raw = os.environ.get("AIDE_AGENT_METRICS", "1").strip().lower()
+    return raw not in ("0", "false", "no", "off")
+
+
+def metrics_dir(workspace: Path) -> Path:
+    return workspace / "data" / "metrics"
+
+
+def append_record(workspace: Path, name: str, record: Dict[str, Any]) -> None:
+    """Append one JSON line to data/metrics/<name>.jsonl (shared by all processes)."""
+    path = metrics_dir(workspace) / f"{name}.jsonl"
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with file_lock(path):
+        with path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _ms(seconds: float) -> int:
+    return int(seconds * 1000)
+
+
+class RunMetrics:
+    """Latency breakdown, tool durations and token/cost numbers of one run.
+
+    spawn_ms, first_event_ms and first_text_ms count from admission, so the
+    queue wait shows up only in admission_wait_ms; wall_ms includes it.
+    """
+
+    def __init__(self, caller: Optional[str], session_key: Optional[str], session_id: Optional[str]) -> None:
+        self._t0 = time.monotonic()
+        self._run_t0 = self._t0
+        self._tool_starts: Dict[object, Any] = {}
+        self.record: Dict[str, Any] = {
+            "ts": datetime.now().isoformat(),
+            "caller": caller,
+            "session_key": session_key,
+            "resumed": bool(session_id),
+            "session_id": session_id,
+            "pooled": False,
+            "admission_wait_ms": None,
+            "queue_depth": None,
+            "spawn_ms": None,
+            "first_event_ms": None,
+            "first_text_ms": None,
+            "tools": [],
+            "wall_ms": None,
+            "exit_code": None,
+            "error": None,
+        }
+
+    def _elapsed_ms(self) -> int:
+        return _ms(time.monotonic() - self._run_t0)
+
+    def admitted(self, wait_ms: int, queue_depth: int) -> None:
+        self._run_t0 = time.monotonic()
+        self.record["admission_wait_ms"] = wait_ms
+        self.record["queue_depth"] = queue_depth
+
+    def spawned(self, pooled: bool) -> None:
+        self.record["spawn_ms"] = self._elapsed_ms()
+        self.record["pooled"] = pooled
+
+    def observe(self, evt: Dict[str, Any]) -> None:
+        kind = evt.get("kind")
+        if self.record["first_event_ms"] is None:
+            self.record["first_event_ms"] = self._elapsed_ms()
+
+        if kind == "text" and self.record["first_text_ms"] is None:
+            self.record["first_text_ms"] = self._elapsed_ms()
+        elif kind == "session":
+            self.record["session_id"] = evt.get("session_id")
+        elif kind == "tool_start":
+            self._tool_starts[evt.get("id")] = (evt.get("name"), time.monotonic())
+        elif kind == "tool_end":
+            name, started = self._tool_starts.pop(evt.get("id"), (evt.get("name"), None))
+            self.record["tools"].append(
+                {
+                    "name": name,
+                    "ms": _ms(time.monotonic() - started) if started is not None else None,
+                    "is_error": evt.get("is_error"),
+                }
+            )
+        elif kind == "result":
+            usage = evt.get("usage") or {}
+            self.record.update(
+                {
+                    "is_error": evt.get("is_error"),
+                    "num_turns": evt.get("num_turns"),
+                    "api_duration_ms": evt.get("duration_ms"),
+                    "input_tokens": usage.get("input_tokens"),
+                    "output_tokens": usage.get("output_tokens"),
+                    "cache_read_tokens": usage.get("cache_read_input_tokens"),
+                    "cache_creation_tokens": usage.get("cache_creation_input_tokens"),
+                    "cost_usd": evt.get("cost_usd"),
+                    "models": sorted((evt.get("model_usage") or {}).keys()),
+                }
+            )
+        elif kind == "done":
+            self.record["exit_code"] = evt.get("returncode")
+
+    def finish(self, workspace: Path, error: Optional[BaseException] = None) -> None:
+        self.record["wall_ms"] = _ms(time.monotonic() - self._t0)
+        if error is not None:
+            self.record["error"] = f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+        # Tools still running when the run ended (timeout, /stop)
+        for name, started in self._tool_starts.values():
+            self.record["tools"].append({"name": name, "ms": _ms(time.monotonic() - started), "is_error": None})
+        self._tool_starts.clear()
+        if not metrics_enabled():
+            return
+        try:
+            append_record(workspace, "agent_runs", self.record)
+        except OSError:
+            pass
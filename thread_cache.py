@@ -0,0 +1,132 @@
+"""In-memory cache of recent Slack thread messages.
+
+A thread is loaded once through ``loader`` (the caller paginates
+``conversations.replies``) and from then on kept current from the message
+events the bot receives anyway, so building a prompt in an active thread
+needs no API call. Threads are evicted least recently used beyond
+``max_threads`` and after ``ttl_s`` without activity; the next turn then
+backfills again, which also repairs any event the bot missed.
+"""
+
+import collections
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Message = Dict[str, Any]
+Loader = Callable[[], Optional[List[Message]]]
+
+
+def _ts_key(msg: Message) -> float:
+    try:
+        return float(msg.get("ts") or 0)
+    except ValueError:
+        return 0.0
+
+
+class _Thread:
+    __slots__ = ("messages", "loaded", "touched")
+
+    def __init__(self) -> None:
+        self.messages: Dict[str, Message] = {}
+        self.loaded = False
+        self.touched = time.monotonic()
+
+
+class ThreadCache:
+    def __init__(self, max_threads: int = 256, ttl_s: float = 3600.0, max_messages: int = 100) -> None:
+        self.max_threads = max(1, max_threads)
+        self.ttl_s = ttl_s
+        self.max_messages = max(1, max_messages)
+        self._lock = threading.Lock()
+        # (channel, thread ts) -> thread; least recently used first
+        self._threads: Dict[Tuple[str, str], _Thread] = collections.OrderedDict()
+
+    def get(self, channel: str, thread_ts: str, loader: Loader) -> List[Message]:
+        """Latest ``max_messages`` of the thread, oldest first; loads it on a miss."""
+        key = (channel, thread_ts)
+        with self._lock:
+            entry = self._entry_locked(key)
+            if entry is not None and entry.loaded:
+                return self._sorted(entry)
+            if entry is None:
+                # Registered before loading so events arriving meanwhile are kept
+                entry = self._threads[key] = _Thread()
+                self._evict_locked()
+
+        fetched = loader()
+        with self._lock:
+            if fetched is None:
+                self._threads.pop(key, None)
+                return []
+            for msg in fetched:
+                # Events seen during the load are newer (e.g. edits): they win
+                entry.messages.setdefault(str(msg.get("ts")), msg)
+            entry.loaded = True
+            self._trim(entry, thread_ts)
+            return self._sorted(entry)
+
+    def observe(self, channel: str, event: Message) -> None:
+        """Apply a Slack message event (new, edited or deleted) to a cached thread."""
+        subtype = event.get("subtype")
+        if subtype == "message_changed":
+            msg = event.get("message") or {}
+            self._put(channel, msg.get("thread_ts"), msg, replace_only=True)
+        elif subtype == "message_deleted":
+            previous = event.get("previous_message") or {}
+            with self._lock:
+                entry = self._entry_locked((channel, str(previous.get("thread_ts"))))
+                if entry is not None:
+                    entry.messages.pop(str(event.get("deleted_ts")), None)
+        elif event.get("thread_ts") and event.get("ts"):
+            self._put(channel, event.get("thread_ts"), event)
+
+    def remember(self, channel: str, thread_ts: str, msg: Message) -> None:
+        """Record a message the bot posted or edited itself."""
+        self._put(channel, thread_ts, msg)
+
+    def _put(self, channel: str, thread_ts: Optional[str], msg: Message, replace_only: bool = False) -> None:
+        if not thread_ts or not msg.get("ts"):
+            return
+        ts = str(msg["ts"])
+        with self._lock:
+            # Only threads already cached: a partial thread must not look complete
+            entry = self._entry_locked((channel, str(thread_ts)))
+            if entry is None or (replace_only and ts not in entry.messages):
+                return
+            entry.messages[ts] = {**entry.messages.get(ts, {}), **msg}
+            self._trim(entry, str(thread_ts))
+
+    def _entry_locked(self, key: Tuple[str, str]) -> Optional[_Thread]:
+        entry = self._threads.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if entry.loaded and now - entry.touched > self.ttl_s:
+            del self._threads[key]
+            return None
+        entry.touched = now
+        self._threads.move_to_end(key)
+        return entry
+
+    def _evict_locked(self) -> None:
+        while len(self._threads) > self.max_threads:
+            self._threads.pop(next(iter(self._threads)))
+
+    def _trim(self, entry: _Thread, thread_ts: str) -> None:
+        """Drop the oldest replies beyond ``max_messages``; the parent message stays."""
+        excess = len(entry.messages) - self.max_messages
+        if excess <= 0:
+            return
+        for msg in sorted(entry.messages.values(), key=_ts_key):
+            if excess <= 0:
+                break
+            ts = str(msg.get("ts"))
+            if ts == thread_ts:
+                continue
+            del entry.messages[ts]
+            excess -= 1
+
+    @staticmethod
+    def _sorted(entry: _Thread) -> List[Message]:
+        return sorted(entry.messages.values(), key=_ts_key)
@@ -0,0 +1,233 @@
+"""Pool of long-lived Claude CLI processes reused across agent turns.
+
+Each worker runs ``claude -p --input-format stream-json`` and keeps reading
+user messages from stdin, so a turn only pays for writing one JSON line
+instead of CLI startup, auth and workspace loading.
+"""
+
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from process_tree import kill_tree, spawn
+from stream_io import LineBuffer
+
+
+SpawnCmd = Callable[[Optional[str]], List[str]]
+
+REAP_INTERVAL_S = 30
+
+
+class ClaudeWorker:
+    """One persistent CLI process bound to (at most) one session."""
+
+    def __init__(self, cmd: List[str], working_dir: Path, session_id: Optional[str] = None) -> None:
+        self.proc = spawn(
+            cmd,
+            cwd=str(working_dir),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=os.environ.copy(),
+        )
+        self.session_id = session_id
+        self.key: Optional[str] = None
+        self.busy = False
+        self.last_used = time.time()
+        # Kept across turns; stdout is read per turn, stderr continuously
+        self.buf = LineBuffer()
+        # total_cost_usd of the last result: the CLI reports it summed over the process
+        self.cost_usd = 0.0
+        # Long-lived process: stderr must be drained or the pipe fills up
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+
+    def _drain_stderr(self) -> None:
+        if not self.proc.stderr:
+            return
+        while True:
+            chunk = self.proc.stderr.read1(4096)
+            if not chunk:
+                return
+            self.buf.feed_stderr(chunk)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def send(self, prompt: str) -> None:
+        msg = {"type": "user", "message": {"role": "user", "content": [{"type": "text", "text": prompt}]}}
+        if not self.proc.stdin:
+            raise RuntimeError("Worker stdin closed.")
+        self.proc.stdin.write((json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+
+    def close(self) -> None:
+        try:
+            if self.proc.stdin:
+                self.proc.stdin.close()
+        except OSError:
+            pass
+        # Also takes down tool processes left behind by a stopped turn
+        kill_tree(self.proc)
+
+
+class WorkerPool:
+    """Per-workspace pool: workers keyed by session key plus pre-spawned spares.
+
+    - a key whose worker still holds the requested session reuses it
+    - a new session (no session id) takes a pre-spawned spare
+    - an unknown resumed session spawns a worker with ``--resume``
+    - when the pool is full and nothing idle can be evicted, ``acquire``
+      returns None and the caller falls back to a one-shot spawn
+    """
+
+    def __init__(
+        self,
+        working_dir: Path,
+        spawn_cmd: SpawnCmd,
+        max_size: int = 4,
+        warm: int = 1,
+        idle_s: int = 600,
+    ) -> None:
+        self.working_dir = working_dir
+        self.spawn_cmd = spawn_cmd
+        self.max_size = max_size
+        self.warm = min(warm, max_size)
+        self.idle_s = idle_s
+        self._lock = threading.Lock()
+        self._workers: Dict[str, ClaudeWorker] = {}
+        self._spares: List[ClaudeWorker] = []
+        # Keys whose worker is being spawned (outside the lock); each holds a slot
+        self._spawning: Set[str] = set()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _size(self) -> int:
+        return len(self._workers) + len(self._spares) + len(self._spawning)
+
+    def _spawn(self, session_id: Optional[str]) -> Optional[ClaudeWorker]:
+        try:
+            return ClaudeWorker(self.spawn_cmd(session_id), self.working_dir, session_id)
+        except OSError:
+            return None
+
+    def _evict_locked(self, now: float) -> None:
+        for key, worker in list(self._workers.items()):
+            if worker.busy:
+                continue
+            if not worker.alive() or now - worker.last_used > self.idle_s:
+                worker.close()
+                self._workers.pop(key, None)
+        for worker in list(self._spares):
+            if not worker.alive():
+                self._spares.remove(worker)
+
+    def _evict_lru_locked(self) -> bool:
+        idle = [(w.last_used, k) for k, w in self._workers.items() if not w.busy]
+        if not idle:
+            return False
+        _last_used, key = min(idle)
+        self._workers.pop(key).close()
+        return True
+
+    def _start_reaper(self) -> None:
+        if self._reaper is not None:
+            return
+
+        def _loop() -> None:
+            while True:
+                time.sleep(REAP_INTERVAL_S)
+                with self._lock:
+                    self._evict_locked(time.time())
+
+        self._reaper = threading.Thread(target=_loop, daemon=True)
+        self._reaper.start()
+
+    def warm_up(self) -> None:
+        """Top up pre-spawned spares (spawning happens outside the lock)."""
+        with self._lock:
+            self._start_reaper()
+            self._evict_locked(time.time())
+            missing = min(self.warm - len(self._spares), self.max_size - self._size())
+        for _ in range(max(0, missing)):
+            worker = self._spawn(None)
+            if worker is None:
+                return
+            with self._lock:
+                if self._size() < self.max_size:
+                    self._spares.append(worker)
+                    continue
+            worker.close()
+
+    def _refill_async(self) -> None:
+        if self.warm:
+            threading.Thread(target=self.warm_up, daemon=True).start()
+
+    def acquire(self, key: str, session_id: Optional[str]) -> Optional[ClaudeWorker]:
+        """Reserve a worker for one turn of ``key``; None means fall back.
+
+        A new worker is spawned outside the lock (CLI startup can be slow);
+        its slot and key are reserved first so other sessions are not held up.
+        """
+        with self._lock:
+            self._start_reaper()
+            self._evict_locked(time.time())
+            if key in self._spawning:
+                return None
+
+            worker = self._workers.get(key)
+            if worker is not None:
+                if worker.busy:
+                    return None
+                if session_id and worker.session_id == session_id:
+                    worker.busy = True
+                    return worker
+                # Session was reset or swapped underneath us
+                self._workers.pop(key).close()
+
+            worker = None
+            if not session_id:
+                while self._spares and worker is None:
+                    candidate = self._spares.pop(0)
+                    if candidate.alive():
+                        worker = candidate
+                    else:
+                        candidate.close()
+            if worker is None:
+                if self._size() >= self.max_size and not self._evict_lru_locked():
+                    return None
+                self._spawning.add(key)
+            else:
+                self._claim_locked(key, worker)
+
+        if worker is None:
+            worker = self._spawn(session_id)
+            with self._lock:
+                self._spawning.discard(key)
+                if worker is None:
+                    return None
+                self._claim_locked(key, worker)
+
+        self._refill_async()
+        return worker
+
+    def _claim_locked(self, key: str, worker: ClaudeWorker) -> None:
+        worker.key = key
+        worker.busy = True
+        self._workers[key] = worker
+
+    def release(self, worker: ClaudeWorker) -> None:
+        with self._lock:
+            worker.busy = False
+            worker.last_used = time.time()
+            if not worker.alive() and worker.key and self._workers.get(worker.key) is worker:
+                self._workers.pop(worker.key, None)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for worker in list(self._workers.values()) + self._spares:
+                worker.close()
+            self._workers.clear()
+            self._spares.clear()